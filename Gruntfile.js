@@ -56,6 +56,41 @@ module.exports = function (grunt) {
                 }
             }
         },
+        compress: {
+            // precompressed siblings are served to browsers which accept them
+            gzip: {
+                options: {
+                    mode: 'gzip'
+                },
+                files: [
+                    {
+                        expand: true,
+                        cwd: 'webapp/',
+                        src: ['**/*.js', '**/*.css', '**/*.html', '**/*.svg', 'favicon.ico'],
+                        dest: 'webapp/',
+                        rename: function (dest, src) {
+                            return dest + src + '.gz';
+                        }
+                    }
+                ]
+            },
+            brotli: {
+                options: {
+                    mode: 'brotli'
+                },
+                files: [
+                    {
+                        expand: true,
+                        cwd: 'webapp/',
+                        src: ['**/*.js', '**/*.css', '**/*.html', '**/*.svg', 'favicon.ico'],
+                        dest: 'webapp/',
+                        rename: function (dest, src) {
+                            return dest + src + '.br';
+                        }
+                    }
+                ]
+            }
+        },
         less: {
             development: {
                 options: {
@@ -102,10 +137,42 @@ module.exports = function (grunt) {
     grunt.loadNpmTasks('grunt-contrib-copy');
     grunt.loadNpmTasks('grunt-targethtml');
     grunt.loadNpmTasks('grunt-contrib-less');
+    grunt.loadNpmTasks('grunt-contrib-compress');
     // grunt.loadNpmTasks('grunt-contrib-uglify');
 
+    // Writes manifest of static files (size, mtime, sha1 and sizes of precompressed siblings),
+    // so server doesn't have to hash them on start
+    grunt.registerTask('manifest', function () {
+        var crypto = require('crypto');
+        var fs = require('fs');
+        var encodings = {br: '.br', gzip: '.gz'};
+        var manifest = {};
+        grunt.file.recurse('webapp', function (abspath, rootdir, subdir, filename) {
+            if (filename === '.manifest.json' || /\.(br|gz)$/.test(filename)) {
+                return;
+            }
+            var stat = fs.statSync(abspath);
+            var encoded = {};
+            Object.keys(encodings).forEach(function (encoding) {
+                var encodedPath = abspath + encodings[encoding];
+                if (grunt.file.isFile(encodedPath)) {
+                    encoded[encoding] = fs.statSync(encodedPath).size;
+                }
+            });
+            manifest[subdir ? subdir + '/' + filename : filename] = {
+                size: stat.size,
+                mtime: Math.floor(stat.mtime.getTime() / 1000),
+                hash: crypto.createHash('sha1').update(fs.readFileSync(abspath)).digest('hex'),
+                mime: null,
+                encoded: encoded
+            };
+        });
+        grunt.file.write('webapp/.manifest.json', JSON.stringify(manifest, null, 2));
+    });
+
     // Default task(s).
-    grunt.registerTask('default', ['jshint', 'concat', 'less:development', 'copy', 'targethtml:dist']);
+    grunt.registerTask('default', ['jshint', 'concat', 'less:development', 'copy', 'targethtml:dist', 'compress',
+                                   'manifest']);
     grunt.registerTask('dev', ['default', 'watch']);
 
 };
@@ -0,0 +1,60 @@
+"""
+Compares topics list read through ORM objects with TrackersManager.get_watching_torrents
+
+    python benchmarks/get_watching_torrents.py [count ...]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from monitorrent.db import init_db_engine, create_db, close_db, upgrade, DBSession, row2dict
+from monitorrent.plugins import Topic
+from monitorrent.plugin_managers import load_plugins, get_all_plugins, upgrades, TrackersManager
+from monitorrent.plugins.trackers.lostfilm import LostFilmTVSeries
+from monitorrent.plugins.trackers.rutor import RutorOrgTopic
+
+
+def fill(count):
+    with DBSession() as db:
+        for i in range(count):
+            if i % 2:
+                db.add(RutorOrgTopic(url='http://rutor.org/torrent/%d' % i, display_name='rutor %d' % i))
+            else:
+                db.add(LostFilmTVSeries(url='http://www.lostfilm.tv/browse.php?cat=%d' % i,
+                                        display_name='lostfilm %d' % i, search_name='lostfilm %d' % i,
+                                        season=i % 10, episode=i % 20))
+
+
+def get_watching_torrents_orm(trackers_manager):
+    watching_torrents = []
+    with DBSession() as db:
+        for dbtopic in db.query(Topic).all():
+            tracker = trackers_manager.trackers.get(dbtopic.type)
+            if not tracker:
+                continue
+            topic = row2dict(dbtopic, None, ['id', 'url', 'display_name', 'last_update'])
+            topic['info'] = tracker.get_topic_info(dbtopic)
+            topic['tracker'] = dbtopic.type
+            watching_torrents.append(topic)
+    return watching_torrents
+
+
+def main(counts):
+    load_plugins()
+    for count in counts:
+        init_db_engine('sqlite:///:memory:')
+        upgrade(get_all_plugins(), upgrades)
+        create_db()
+        fill(count)
+        trackers_manager = TrackersManager()
+        number = max(1, 10000 / count)
+        orm = min(timeit.repeat(lambda: get_watching_torrents_orm(trackers_manager), repeat=3, number=number))
+        core = min(timeit.repeat(trackers_manager.get_watching_torrents, repeat=3, number=number))
+        print('{0:>6} topics: orm {1:8.2f} ms, core {2:8.2f} ms'
+              .format(count, orm * 1000 / number, core * 1000 / number))
+        close_db()
+
+
+if __name__ == '__main__':
+    main([int(c) for c in sys.argv[1:]] or [1000, 10000, 50000])
@@ -0,0 +1,43 @@
+"""
+Measures per-request overhead of AuthMiddleware.validate_auth with and without verified cookies cache
+
+    python benchmarks/validate_auth.py [count]
+"""
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), '..'))
+
+from monitorrent.rest import AuthMiddleware
+from monitorrent.utils.lru_cache import LRUCache
+
+
+class Request(object):
+    def __init__(self, cookies):
+        self.cookies = cookies
+
+
+class NoCache(LRUCache):
+    def get(self, key, default=None):
+        return default
+
+    def set(self, key, value):
+        pass
+
+
+def main(count):
+    AuthMiddleware.init('secret!', 'monitorrent')
+    req = Request({AuthMiddleware.cookie_name: AuthMiddleware.serializer.dumps(AuthMiddleware.token)})
+    cache = AuthMiddleware.auth_cache
+    try:
+        for name, auth_cache in [('without cache', NoCache()), ('with cache', cache)]:
+            AuthMiddleware.auth_cache = auth_cache
+            auth_cache.clear()
+            elapsed = min(timeit.repeat(lambda: AuthMiddleware.validate_auth(req), repeat=3, number=count))
+            print('{0:>14}: {1:8.2f} us per request'.format(name, elapsed * 1000000 / count))
+    finally:
+        AuthMiddleware.auth_cache = cache
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000)
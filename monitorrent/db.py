@@ -1,4 +1,7 @@
-from sqlalchemy import create_engine, event, Column, String, Integer, Table, MetaData
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from sqlalchemy import create_engine, event, bindparam, select, Column, String, Integer, Table, MetaData
 import sqlalchemy.orm
 from sqlalchemy.orm import sessionmaker, scoped_session
 from sqlalchemy.ext.declarative import declarative_base
@@ -33,14 +36,45 @@ def get_engine():
     return engine
 
 
-def DBSession():
+# opt-in sqlite settings for concurrent access: WAL lets REST API reads go on while engine writes,
+# writers started by DBSession(immediate=True) take write lock at BEGIN and wait busy_timeout for it.
+# Only engine, topics, trackers credentials and execute settings writers use it, other sessions start
+# by deferred BEGIN, so their rare writes (e.g. clients settings) can fail with 'database is locked'
+# if they are made during concurrent write
+performance_profile = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 64 * 1024 * 1024,
+    'cache_size': -16 * 1024,
+    'busy_timeout': 10000,
+    'begin_immediate': True,
+}
+
+_pragmas = ['journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'busy_timeout']
+
+
+def DBSession(immediate=False):
+    """
+    :param immediate: session is going to write, so transaction is started by BEGIN IMMEDIATE
+                      if performance profile enables it
+    """
     global _DBSession
-    return _DBSession()
+    session = _DBSession()
+    if immediate:
+        session.connection(execution_options={'immediate': True})
+    return session
 
 
-def init_db_engine(connection_string, echo=False):
+def init_db_engine(connection_string, echo=False, profile=None):
+    """
+    :param profile: sqlite settings, see :data:`performance_profile`
+    :type profile: dict | None
+    """
     global engine, _DBSession
     engine = create_engine(connection_string, echo=echo)
+    profile = profile or dict()
+    pragmas = [(name, profile[name]) for name in _pragmas if profile.get(name) is not None]
+    begin_immediate = profile.get('begin_immediate', False)
 
     # workaround for migrations on sqlite:
     # http://docs.sqlalchemy.org/en/latest/dialects/sqlite.html#pysqlite-serializable
@@ -49,11 +83,19 @@ def init_db_engine(connection_string, echo=False):
         # disable pysqlite's emitting of the BEGIN statement entirely.
         # also stops it from emitting COMMIT before any DDL.
         dbapi_connection.isolation_level = None
+        if pragmas:
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas:
+                cursor.execute("PRAGMA {0}={1}".format(name, value))
+            cursor.close()
 
     @event.listens_for(engine, "begin")
     def do_begin(conn):
         # emit our own BEGIN
-        conn.execute("BEGIN")
+        if begin_immediate and conn._execution_options.get('immediate', False):
+            conn.execute("BEGIN IMMEDIATE")
+        else:
+            conn.execute("BEGIN")
 
     session_factory = sessionmaker(class_=ContextSession, bind=engine)
     _DBSession = scoped_session(session_factory)
@@ -92,6 +134,93 @@ def dict2row(row, data, fields=None):
         if hasattr(row, k) and (fields is None or k in fields):
             setattr(row, k, v)
 
+
+class UpdateBuffer(object):
+    """
+    Collects updates of mapped objects and writes them in one transaction
+    by one executemany UPDATE per table and set of columns.
+
+    Buffer is flushed when it contains max_size updated rows or its oldest update waits for max_delay seconds,
+    so a crash loses only few updates. Age of updates is checked on every update and by :meth:`flush_expired`,
+    which has to be called periodically by long running writers.
+
+    Can be used as context manager, rest of updates are flushed on exit. Updates are flushed on exit by error too,
+    because they are made for already done work, but error of this flush doesn't replace original error.
+    """
+    def __init__(self, max_size=100, max_delay=30):
+        self.max_size = max_size
+        self.max_delay = max_delay
+        # {table: {id: {column name: value}}}
+        self._updates = OrderedDict()
+        self._count = 0
+        self._first_update_time = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+            return
+        try:
+            self.flush()
+        except Exception:
+            pass
+
+    def __len__(self):
+        return self._count
+
+    def update(self, cls, id, values):
+        """
+        :param cls: mapped class, columns of inherited classes are written to their own tables
+        :param id: primary key of updated object
+        :param values: new values by attribute names
+        :type values: dict
+        """
+        mapper = sqlalchemy.orm.class_mapper(cls)
+        for key, value in values.items():
+            column = mapper.columns[key]
+            table_updates = self._updates.setdefault(column.table, OrderedDict())
+            if id not in table_updates:
+                table_updates[id] = dict()
+                self._count += 1
+            table_updates[id][column.name] = value
+        if self._first_update_time is None:
+            self._first_update_time = time.time()
+        if self._count >= self.max_size or self._is_expired():
+            self.flush()
+
+    def flush_expired(self):
+        """
+        Flushes updates if the oldest of them waits for max_delay seconds
+        """
+        if self._is_expired():
+            self.flush()
+
+    def _is_expired(self):
+        return self._first_update_time is not None and time.time() - self._first_update_time >= self.max_delay
+
+    def flush(self):
+        updates, self._updates = self._updates, OrderedDict()
+        self._count = 0
+        self._first_update_time = None
+        if not updates:
+            return
+        with DBSession(immediate=True) as db:
+            for table, table_updates in updates.items():
+                primary_key = table.primary_key.columns.values()[0]
+                # executemany requires the same columns for all rows
+                groups = OrderedDict()
+                for id, values in table_updates.items():
+                    row = dict(('_' + name, value) for name, value in values.items())
+                    row['_id'] = id
+                    groups.setdefault(tuple(sorted(values.keys())), []).append(row)
+                for names, rows in groups.items():
+                    statement = table.update()\
+                        .where(primary_key == bindparam('_id'))\
+                        .values({name: bindparam('_' + name) for name in names})
+                    db.execute(statement, rows)
+
 CoreBase = declarative_base()
 
 
@@ -106,6 +235,44 @@ def core_upgrade(engine, operation_factory):
     with operation_factory() as op:
         if op.has_table('plugin_versions'):
             op.drop_table('plugin_versions')
+    upgrade_topics(engine, operation_factory)
+
+
+def upgrade_topics(engine, operation_factory, check_interval=timedelta(seconds=7200)):
+    """
+    Adds new nullable columns of base topic to existing topics table
+
+    :param check_interval: checks of existing topics are spread over this interval, so they aren't due at once
+    :type check_interval: timedelta
+    """
+    from plugins import Topic
+
+    with engine.connect() as connection:
+        if not engine.dialect.has_table(connection, Topic.__tablename__):
+            return
+    m = MetaData(engine)
+    topics = Table(Topic.__tablename__, m, autoload=True)
+    new_columns = [c for c in Topic.__table__.columns if c.name not in topics.columns and c.nullable]
+    if not new_columns:
+        return
+    with operation_factory() as op:
+        for column in new_columns:
+            op.add_column(Topic.__tablename__, column.copy())
+        if any(c.name == 'next_check' for c in new_columns):
+            _seed_next_check(op.db, Topic.__table__, check_interval)
+
+
+def _seed_next_check(db, topics, check_interval):
+    ids = [topic_id for topic_id, in db.execute(select([topics.c.id]).order_by(topics.c.id))]
+    if not ids:
+        return
+    now = datetime.now()
+    step = check_interval.total_seconds() / len(ids)
+    db.execute(topics.update()
+               .where(topics.c.id == bindparam('topic_id'))
+               .values(next_check=bindparam('next_check')),
+               [{'topic_id': topic_id, 'next_check': now + timedelta(seconds=step * i)}
+                for i, topic_id in enumerate(ids)])
 
 
 def upgrade(plugins, upgrades):
@@ -1,7 +1,11 @@
 import threading
-from datetime import datetime
+import time
+from datetime import datetime, timedelta
 from sqlalchemy import Column, Integer, DateTime
 from monitorrent.db import Base, DBSession
+from monitorrent.scheduler import TopicScheduler
+from monitorrent.utils.sessions import sessions
+from monitorrent.utils.settings_cache import SettingsCache
 
 
 class Logger(object):
@@ -13,19 +17,67 @@ class Logger(object):
         """
         """
 
-    def info(self, message):
+    def info(self, message, topic_id=None):
         """
         """
 
-    def failed(self, message):
+    def failed(self, message, topic_id=None):
         """
         """
 
-    def downloaded(self, message, torrent):
+    def downloaded(self, message, torrent, topic_id=None):
         """
         """
 
 
+class BufferedLogger(Logger):
+    """
+    Collects log messages and passes them to wrapped logger by groups of one topic,
+    so messages of one topic stay together when trackers are executed concurrently.
+
+    Group is flushed as soon as message of other topic is logged,
+    messages without topic are passed with group of the next topic.
+    """
+    def __init__(self, logger, lock=None):
+        """
+        :type logger: Logger
+        :param lock: lock shared by buffered loggers of all trackers
+        """
+        self.logger = logger
+        self.lock = lock or threading.Lock()
+        self.messages = []
+        self._topic_id = None
+
+    def info(self, message, topic_id=None):
+        self._append(self.logger.info, (message,), topic_id)
+
+    def failed(self, message, topic_id=None):
+        self._append(self.logger.failed, (message,), topic_id)
+
+    def downloaded(self, message, torrent, topic_id=None):
+        self._append(self.logger.downloaded, (message, torrent), topic_id)
+
+    def flush(self):
+        with self.lock:
+            self._flush()
+
+    def _append(self, method, args, topic_id):
+        with self.lock:
+            if self._topic_id is not None and topic_id != self._topic_id:
+                self._flush()
+            self._topic_id = topic_id
+            self.messages.append((method, args, topic_id))
+
+    def _flush(self):
+        messages, self.messages = self.messages, []
+        self._topic_id = None
+        for method, args, topic_id in messages:
+            if topic_id is not None:
+                method(*args, topic_id=topic_id)
+            else:
+                method(*args)
+
+
 class Engine(object):
     def __init__(self, logger, clients_manager):
         """
@@ -39,35 +91,50 @@ class Engine(object):
     def find_torrent(self, torrent_hash):
         return self.clients_manager.find_torrent(torrent_hash)
 
-    def add_torrent(self, filename, torrent, old_hash):
+    def add_torrent(self, filename, torrent, old_hash, topic_id=None):
         """
         :type filename: str
         :type old_hash: str | None
         :type torrent: Torrent
+        :type topic_id: int | None
         :rtype: datetime
         """
-        existing_torrent = self.find_torrent(torrent.info_hash)
-        if existing_torrent:
-            self.log.info(u"Torrent <b>%s</b> already added" % filename)
-        elif self.clients_manager.add_torrent(torrent.raw_content):
-            old_existing_torrent = self.find_torrent(old_hash) if old_hash else None
-            if old_existing_torrent:
-                self.log.info(u"Updated <b>%s</b>" % filename)
-            else:
-                self.log.info(u"Add new <b>%s</b>" % filename)
-            if old_existing_torrent:
-                if self.remove_torrent(old_hash):
-                    self.log.info(u"Remove old torrent <b>%s</b>" %
-                                  old_existing_torrent['name'])
+        return self.add_torrents([(filename, torrent, old_hash, topic_id)])[0]
+
+    def add_torrents(self, torrents):
+        """
+        Adds torrents to clients in batch and removes their old versions
+
+        :param torrents: filename, torrent, old hash and topic id of every torrent
+        :type torrents: list[(str, Torrent, str | None, int | None)]
+        :return: last update of every torrent
+        :rtype: list[datetime]
+        """
+        results = self.clients_manager.add_torrents([(torrent.raw_content, torrent.info_hash, old_hash)
+                                                     for _, torrent, old_hash, _ in torrents])
+        last_updates = []
+        for (filename, torrent, old_hash, topic_id), result in zip(torrents, results):
+            if result['exists']:
+                self.log.info(u"Torrent <b>%s</b> already added" % filename, topic_id=topic_id)
+            elif result['added']:
+                old_existing_torrent = result['old_torrent']
+                if old_existing_torrent:
+                    self.log.info(u"Updated <b>%s</b>" % filename, topic_id=topic_id)
                 else:
-                    self.log.failed(u"Can't remove old torrent <b>%s</b>" %
-                                    old_existing_torrent['name'])
-            existing_torrent = self.find_torrent(torrent.info_hash)
-        if existing_torrent:
-            last_update = existing_torrent['date_added']
-        else:
-            last_update = datetime.now()
-        return last_update
+                    self.log.info(u"Add new <b>%s</b>" % filename, topic_id=topic_id)
+                if old_existing_torrent:
+                    if result['removed']:
+                        self.log.info(u"Remove old torrent <b>%s</b>" %
+                                      old_existing_torrent['name'], topic_id=topic_id)
+                    else:
+                        self.log.failed(u"Can't remove old torrent <b>%s</b>" %
+                                        old_existing_torrent['name'], topic_id=topic_id)
+            existing_torrent = result['torrent']
+            if existing_torrent:
+                last_updates.append(existing_torrent['date_added'])
+            else:
+                last_updates.append(datetime.now())
+        return last_updates
 
     def remove_torrent(self, torrent_hash):
         return self.clients_manager.remove_torrent(torrent_hash)
@@ -97,6 +164,9 @@ class EngineRunner(threading.Thread):
         self.is_stoped = False
         self._interval = 7200
         self._last_execute = None
+        self._next_execute = time.time() + self.interval
+        self._jobs = []
+        self._jobs_lock = threading.Lock()
         self.start()
 
     @property
@@ -117,72 +187,132 @@ class EngineRunner(threading.Thread):
 
     def run(self):
         while not self.is_stoped:
-            self.waiter.wait(self.interval)
+            self.waiter.wait(self._get_wait_timeout())
             if self.is_stoped:
                 return
-            self._execute()
             self.waiter.clear()
+            with self._jobs_lock:
+                jobs, self._jobs = self._jobs, []
+            if None in jobs:
+                self._execute_all()
+            elif jobs:
+                ids = {topic_id for job_ids, _ in jobs for topic_id in job_ids or []}
+                trackers = {name for _, job_trackers in jobs for name in job_trackers or []}
+                self._execute(list(ids), list(trackers))
+            else:
+                self._execute_scheduled()
 
     def stop(self):
         self.is_stoped = True
         self.waiter.set()
 
-    def execute(self):
+    def execute(self, ids=None, trackers=None):
+        """
+        Requests execution, by default all topics are checked
+
+        :param ids: check only topics with these ids
+        :type ids: list[int] | None
+        :param trackers: check only topics of these trackers
+        :type trackers: list[str] | None
+        """
+        with self._jobs_lock:
+            self._jobs.append(None if ids is None and trackers is None else (ids, trackers))
         self.waiter.set()
 
-    def _execute(self):
+    def _get_wait_timeout(self):
+        return max(0, self._next_execute - time.time())
+
+    def _execute_scheduled(self):
+        self._execute_all()
+
+    def _execute_all(self):
+        self._execute(update_last_execute=True)
+        self._next_execute = time.time() + self.interval
+
+    def _execute(self, ids=None, trackers=None, update_last_execute=False):
         caught_exception = None
         self.is_executing = True
+        opened_sessions = sessions.names()
         try:
             self.logger.started()
-            self.trackers_manager.execute(Engine(self.logger, self.clients_manager))
+            self.clients_manager.start_execute()
+            engine = Engine(self.logger, self.clients_manager)
+            if ids is not None or trackers is not None:
+                self.trackers_manager.execute(engine, ids, trackers)
+            else:
+                self.trackers_manager.execute(engine)
         except Exception as e:
             caught_exception = e
         finally:
+            # keep-alive connections opened by execution are reused only during it,
+            # sessions opened before can be in use by concurrent requests
+            sessions.close([name for name in sessions.names() if name not in opened_sessions])
+            self.clients_manager.finish_execute()
             self.is_executing = False
-            self.last_execute = datetime.now()
-            self.logger.finished(self.last_execute, caught_exception)
+            finish_time = datetime.now()
+            if update_last_execute:
+                self.last_execute = finish_time
+            self.logger.finished(finish_time, caught_exception)
         return True
 
 
 class DBEngineRunner(EngineRunner):
-    def __init__(self, logger, trackers_manager, clients_manager, **kwargs):
+    """
+    Engine runner which stores settings in database and checks every topic by its own schedule
+    """
+    def __init__(self, logger, trackers_manager, clients_manager, scheduler=None, **kwargs):
         """
         :type logger: Logger
         :type trackers_manager: plugin_managers.TrackersManager
         :type clients_manager: plugin_managers.ClientsManager
+        :type scheduler: TopicScheduler
         """
+        self.scheduler = scheduler or TopicScheduler()
+        self._settings = SettingsCache()
         super(DBEngineRunner, self).__init__(logger, trackers_manager, clients_manager, **kwargs)
 
+    def _get_wait_timeout(self):
+        self.scheduler.load()
+        next_check = self.scheduler.get_next_check()
+        if next_check is None:
+            return self.interval
+        # topics added meanwhile are picked up by next load at the latest after interval
+        return min(self.interval, max(0, (next_check - datetime.now()).total_seconds()))
+
+    def _execute_scheduled(self):
+        ids = self.scheduler.pop_due(datetime.now())
+        if ids:
+            self._execute(ids, update_last_execute=True)
+
+    def _execute_all(self):
+        self._execute(update_last_execute=True)
+
+    def _execute(self, ids=None, trackers=None, update_last_execute=False):
+        result = super(DBEngineRunner, self)._execute(ids, trackers, update_last_execute)
+        self.scheduler.reschedule(timedelta(seconds=self.interval), datetime.now(), ids, trackers)
+        return result
+
     @property
     def interval(self):
-        settings_execute = self._get_settings_execute()
-        return settings_execute.interval
+        return self._settings.get('interval', lambda: self._get_settings_execute().interval)
 
     @interval.setter
     def interval(self, value):
-        settings_execute = self._get_settings_execute()
-        with DBSession() as db:
-            db.add(settings_execute)
-            settings_execute.interval = value
-            db.commit()
+        self._settings.set('interval', value, lambda v: self._set_settings_execute(interval=v))
+        # recalculate wait timeout with new interval
+        self.waiter.set()
 
     @property
     def last_execute(self):
-        settings_execute = self._get_settings_execute()
-        return settings_execute.last_execute
+        return self._settings.get('last_execute', lambda: self._get_settings_execute().last_execute)
 
     @last_execute.setter
     def last_execute(self, value):
-        settings_execute = self._get_settings_execute()
-        with DBSession() as db:
-            db.add(settings_execute)
-            settings_execute.last_execute = value
-            db.commit()
+        self._settings.set('last_execute', value, lambda v: self._set_settings_execute(last_execute=v))
 
     @staticmethod
     def _get_settings_execute():
-        with DBSession() as db:
+        with DBSession(immediate=True) as db:
             if db.query(Execute).count() == 0:
                 settings_execute = Execute(interval=7200, last_execute=None)
                 db.add(settings_execute)
@@ -190,3 +320,13 @@ class DBEngineRunner(EngineRunner):
             settings_execute = db.query(Execute).first()
             db.expunge(settings_execute)
         return settings_execute
+
+    @staticmethod
+    def _set_settings_execute(**values):
+        with DBSession(immediate=True) as db:
+            settings_execute = db.query(Execute).first()
+            if settings_execute is None:
+                settings_execute = Execute(interval=7200, last_execute=None)
+                db.add(settings_execute)
+            for name, value in values.items():
+                setattr(settings_execute, name, value)
@@ -0,0 +1,172 @@
+from datetime import datetime
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from monitorrent.db import Base, DBSession, row2dict
+from monitorrent.engine import Logger
+
+
+class ExecuteRun(Base):
+    __tablename__ = 'execute_runs'
+
+    id = Column(Integer, primary_key=True)
+    start_time = Column(DateTime, nullable=False, index=True)
+    finish_time = Column(DateTime, nullable=True)
+    exception = Column(String, nullable=True)
+    failed = Column(Integer, nullable=False, default=0)
+    downloaded = Column(Integer, nullable=False, default=0)
+
+
+class ExecuteLogEvent(Base):
+    __tablename__ = 'execute_log_events'
+
+    id = Column(Integer, primary_key=True)
+    run_id = Column(Integer, ForeignKey('execute_runs.id'), nullable=False)
+    time = Column(DateTime, nullable=False, index=True)
+    level = Column(String, nullable=False)
+    message = Column(String, nullable=False)
+    # topic can be removed later, but its log has to stay
+    topic_id = Column(Integer, nullable=True, index=True)
+
+    __table_args__ = (
+        Index('ix_execute_log_events_run_id_level', 'run_id', 'level'),
+        Index('ix_execute_log_events_level_time', 'level', 'time'),
+    )
+
+
+class ExecuteHistory(Logger):
+    """
+    Append-only store of execution runs and their log events.
+
+    Events are written by batches, runs older than max_runs are removed
+    and only failed and downloaded events are kept for runs older than compact_runs.
+    Time of events is taken on call unless event_time is passed by asynchronous writer.
+    """
+    levels = ['info', 'failed', 'downloaded']
+
+    def __init__(self, max_runs=100, compact_runs=10, batch_size=100):
+        """
+        :type max_runs: int
+        :type compact_runs: int
+        :param batch_size: max count of events waiting to be written
+        :type batch_size: int
+        """
+        self.max_runs = max_runs
+        self.compact_runs = compact_runs
+        self.batch_size = batch_size
+        self._run_id = None
+        self._events = []
+        self._counts = dict()
+
+    def started(self, event_time=None):
+        with DBSession(immediate=True) as db:
+            run = ExecuteRun(start_time=event_time or datetime.now())
+            db.add(run)
+            db.flush()
+            self._run_id = run.id
+        self._events = []
+        self._counts = dict()
+
+    def finished(self, finish_time, exception, event_time=None):
+        """
+        :param event_time: not used, finish_time of run is stored
+        """
+        if self._run_id is None:
+            return
+        self._flush()
+        with DBSession(immediate=True) as db:
+            run = db.query(ExecuteRun).filter(ExecuteRun.id == self._run_id).first()
+            run.finish_time = finish_time
+            run.exception = exception.message if exception else None
+            run.failed = self._counts.get('failed', 0)
+            run.downloaded = self._counts.get('downloaded', 0)
+        self._run_id = None
+        self.cleanup()
+
+    def info(self, message, topic_id=None):
+        self.log('info', message, topic_id)
+
+    def failed(self, message, topic_id=None):
+        self.log('failed', message, topic_id)
+
+    def downloaded(self, message, torrent, topic_id=None):
+        self.log('downloaded', message, topic_id)
+
+    def log(self, level, message, topic_id=None, event_time=None):
+        """
+        Stores event of current run, torrent of downloaded event isn't stored, so it isn't required
+
+        :param level: one of levels
+        """
+        if self._run_id is None:
+            return
+        self._counts[level] = self._counts.get(level, 0) + 1
+        self._events.append({'run_id': self._run_id, 'time': event_time or datetime.now(), 'level': level,
+                             'message': message, 'topic_id': topic_id})
+        if len(self._events) >= self.batch_size:
+            self._flush()
+
+    def cleanup(self):
+        """
+        Removes old runs and compacts events of not so old runs
+        """
+        with DBSession(immediate=True) as db:
+            remove_before = self._get_run_id_boundary(db, self.max_runs)
+            if remove_before is not None:
+                db.query(ExecuteLogEvent).filter(ExecuteLogEvent.run_id <= remove_before)\
+                    .delete(synchronize_session=False)
+                db.query(ExecuteRun).filter(ExecuteRun.id <= remove_before).delete(synchronize_session=False)
+            compact_before = self._get_run_id_boundary(db, self.compact_runs)
+            if compact_before is not None:
+                db.query(ExecuteLogEvent)\
+                    .filter(ExecuteLogEvent.run_id <= compact_before, ExecuteLogEvent.level == 'info')\
+                    .delete(synchronize_session=False)
+
+    def get_runs(self, offset=0, limit=50):
+        """
+        :return: total count of runs and page of runs, newest first
+        :rtype: (int, list[dict])
+        """
+        with DBSession() as db:
+            query = db.query(ExecuteRun)
+            count = query.count()
+            runs = query.order_by(ExecuteRun.id.desc()).offset(offset).limit(limit).all()
+            return count, [row2dict(run) for run in runs]
+
+    def get_events(self, run_id=None, runs=None, level=None, topic_id=None, offset=0, limit=50):
+        """
+        :param run_id: events of this run only
+        :param runs: events of this count of last runs only
+        :param level: events of this level only
+        :param topic_id: events of this topic only
+        :return: total count of filtered events and page of them, newest first
+        :rtype: (int, list[dict])
+        """
+        with DBSession() as db:
+            query = db.query(ExecuteLogEvent)
+            if run_id is not None:
+                query = query.filter(ExecuteLogEvent.run_id == run_id)
+            if runs is not None:
+                boundary = self._get_run_id_boundary(db, runs)
+                if boundary is not None:
+                    query = query.filter(ExecuteLogEvent.run_id > boundary)
+            if level is not None:
+                query = query.filter(ExecuteLogEvent.level == level)
+            if topic_id is not None:
+                query = query.filter(ExecuteLogEvent.topic_id == topic_id)
+            count = query.count()
+            events = query.order_by(ExecuteLogEvent.id.desc()).offset(offset).limit(limit).all()
+            return count, [row2dict(e) for e in events]
+
+    def _flush(self):
+        events, self._events = self._events, []
+        if not events:
+            return
+        with DBSession(immediate=True) as db:
+            db.execute(ExecuteLogEvent.__table__.insert(), events)
+
+    @staticmethod
+    def _get_run_id_boundary(db, count):
+        """
+        :return: id of newest run which is older than last count runs or None if there are no such runs
+        """
+        row = db.query(ExecuteRun.id).order_by(ExecuteRun.id.desc()).offset(count).first()
+        return row[0] if row else None
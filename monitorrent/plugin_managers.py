@@ -1,7 +1,18 @@
 import os
-from monitorrent.db import DBSession, row2dict
+import threading
+import time
+from Queue import Queue, Empty
+from collections import namedtuple
+from datetime import datetime
+from multiprocessing import TimeoutError
+from multiprocessing.pool import ThreadPool
+from sqlalchemy import select
+from sqlalchemy.orm import class_mapper
+from monitorrent.db import DBSession
 from monitorrent.plugins import Topic
 from monitorrent.plugins.trackers import TrackerPluginBase, TrackerPluginWithCredentialsBase
+from monitorrent.engine import Engine, BufferedLogger
+from monitorrent.utils.bittorrent import Torrent
 
 plugins = dict()
 upgrades = dict()
@@ -37,11 +48,25 @@ def get_all_plugins():
 class TrackersManager(object):
     """
     :type trackers: dict[str, TrackerPluginBase | TrackerPluginWithCredentialsBase]
+    :type tracker_max_workers: dict[str, int]
     """
-    def __init__(self, trackers=None):
+    def __init__(self, trackers=None, max_workers=1, tracker_max_workers=None, verify_ttl=None):
+        """
+        :param max_workers: how many trackers can be executed at the same time, 1 means serial execution
+        :param tracker_max_workers: how many executions of the same tracker can run at the same time, default is 1
+        :param verify_ttl: seconds while login to trackers is trusted without verify, default is set by tracker
+        """
         if trackers is None:
             trackers = get_plugins('tracker')
         self.trackers = trackers
+        if verify_ttl is not None:
+            for tracker in trackers.values():
+                if isinstance(tracker, TrackerPluginWithCredentialsBase):
+                    tracker.verify_ttl = verify_ttl
+        self.max_workers = max_workers
+        self.tracker_max_workers = tracker_max_workers or dict()
+        self._tracker_semaphores = dict()
+        self._tracker_semaphores_lock = threading.Lock()
 
     def get_settings(self, name):
         tracker = self.get_tracker(name)
@@ -81,7 +106,7 @@ class TrackersManager(object):
         return False
 
     def remove_topic(self, id):
-        with DBSession() as db:
+        with DBSession(immediate=True) as db:
             topic = db.query(Topic).filter(Topic.id == id).first()
             if topic is None:
                 return False
@@ -113,34 +138,180 @@ class TrackersManager(object):
         return tracker.update_topic(id, settings)
 
     def get_watching_torrents(self):
+        """
+        Reads topics list by one query without ORM objects: only common topic columns are selected,
+        tracker tables are joined only for columns used by get_topic_info of tracker.
+        Topics of trackers which override get_topic_info without topic_info_columns are loaded by ORM.
+        """
+        topics = Topic.__table__
+        columns = [topics.c.id, topics.c.url, topics.c.display_name, topics.c.last_update, topics.c.type]
+        from_clause = topics
+        info_columns = dict()
+        for name, tracker in self.trackers.items():
+            if not tracker.topic_info_columns:
+                continue
+            mapper = class_mapper(tracker.topic_class)
+            tracker_columns = [(c, mapper.columns[c]) for c in tracker.topic_info_columns]
+            for table in set(column.table for _, column in tracker_columns if column.table is not topics):
+                from_clause = from_clause.outerjoin(table, table.c.id == topics.c.id)
+            labels = [column.label('{0}_{1}'.format(name, c)) for c, column in tracker_columns]
+            info_columns[name] = (namedtuple('TopicInfo', tracker.topic_info_columns), labels)
+            columns.extend(labels)
+
         watching_torrents = []
+        # topics by tracker name which info is read from ORM objects
+        orm_topics = dict()
         with DBSession() as db:
-            dbtopics = db.query(Topic).all()
-            for dbtopic in dbtopics:
-                tracker = self.get_tracker(dbtopic.type)
+            rows = db.execute(select(columns).select_from(from_clause)).fetchall()
+            for row in rows:
+                tracker = self.trackers.get(row.type)
                 if not tracker:
                     continue
-                topic = row2dict(dbtopic, None, ['id', 'url', 'display_name', 'last_update'])
-                topic['info'] = tracker.get_topic_info(dbtopic)
-                topic['tracker'] = dbtopic.type
+                topic = {'id': row.id, 'url': row.url, 'display_name': row.display_name,
+                         'last_update': row.last_update, 'info': None, 'tracker': row.type}
+                if row.type in info_columns:
+                    topic_info_type, labels = info_columns[row.type]
+                    topic['info'] = tracker.get_topic_info(topic_info_type(*[row[l.name] for l in labels]))
+                elif type(tracker).get_topic_info != TrackerPluginBase.get_topic_info:
+                    orm_topics.setdefault(row.type, dict())[row.id] = topic
                 watching_torrents.append(topic)
+            for name, topics_by_id in orm_topics.items():
+                tracker = self.trackers[name]
+                for topic in db.query(tracker.topic_class).filter(Topic.id.in_(topics_by_id.keys())):
+                    topics_by_id[topic.id]['info'] = tracker.get_topic_info(topic)
         return watching_torrents
 
-    def execute(self, engine):
-        for name, tracker in self.trackers.iteritems():
+    def execute(self, engine, ids=None, trackers=None):
+        """
+        Checks topics for updates, by default all topics of all trackers are checked
+
+        :type engine: Engine
+        :param ids: check only topics with these ids
+        :type ids: list[int] | None
+        :param trackers: check all topics of these trackers
+        :type trackers: list[str] | None
+        """
+        jobs = self._get_jobs(ids, trackers)
+        workers = min(self.max_workers, len(jobs))
+        if workers <= 1:
+            for name, tracker, tracker_ids in jobs:
+                self._execute_tracker(name, tracker, tracker_ids, engine)
+            return
+
+        flush_lock = threading.Lock()
+        pool = ThreadPool(workers)
+        try:
+            results = [pool.apply_async(self._execute_tracker_buffered,
+                                        (name, tracker, tracker_ids, engine, flush_lock))
+                       for name, tracker, tracker_ids in jobs]
+            for result in results:
+                result.get()
+        finally:
+            pool.close()
+            pool.join()
+
+    def _get_jobs(self, ids, trackers):
+        """
+        :return: list of tracker name, tracker and topic ids to check (None for all topics)
+        :rtype: list[(str, TrackerPluginBase, list[int] | None)]
+        """
+        if ids is None and trackers is None:
+            return [(name, tracker, None) for name, tracker in self.trackers.iteritems()]
+
+        tracker_ids = dict()
+        if ids:
+            with DBSession() as db:
+                for topic_id, topic_type in db.query(Topic.id, Topic.type).filter(Topic.id.in_(ids)):
+                    tracker_ids.setdefault(topic_type, []).append(topic_id)
+        for name in trackers or []:
+            tracker_ids[name] = None
+        return [(name, tracker, tracker_ids[name]) for name, tracker in self.trackers.iteritems()
+                if name in tracker_ids]
+
+    def _execute_tracker_buffered(self, name, tracker, ids, engine, flush_lock):
+        logger = BufferedLogger(engine.log, flush_lock)
+        try:
+            self._execute_tracker(name, tracker, ids, Engine(logger, engine.clients_manager))
+        finally:
+            logger.flush()
+
+    def _execute_tracker(self, name, tracker, ids, engine):
+        with self._get_tracker_semaphore(name):
             try:
                 engine.log.info("Start checking for <b>{}</b>".format(name))
-                tracker.execute(None, engine)
+                tracker.execute(ids, engine)
                 engine.log.info("End checking for <b>{}</b>".format(name))
             except Exception as e:
                 engine.log.info("Failed while checking for <b>{0}</b>.\nReason: {1}".format(name, e.message))
 
+    def _get_tracker_semaphore(self, name):
+        with self._tracker_semaphores_lock:
+            semaphore = self._tracker_semaphores.get(name)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.tracker_max_workers.get(name, 1))
+                self._tracker_semaphores[name] = semaphore
+            return semaphore
+
+
+class CircuitBreaker(object):
+    """
+    Skips calls to service after several consecutive failures, one trial call is allowed after reset timeout
+    """
+    def __init__(self, failure_threshold=3, reset_timeout=300):
+        """
+        :param failure_threshold: count of consecutive failures which opens circuit
+        :param reset_timeout: seconds after which one trial call is allowed to open circuit
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.time() - self._opened_at >= self.reset_timeout:
+                # half open: next trial call is allowed after another reset timeout
+                self._opened_at = time.time()
+                return True
+            return False
+
+    def success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+
+    def failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.time()
+
 
 class ClientsManager(object):
-    def __init__(self, clients=None):
+    def __init__(self, clients=None, timeout=30, failure_threshold=3, reset_timeout=300):
+        """
+        :param timeout: seconds to wait for answer of every client
+        :param failure_threshold: count of consecutive failures after which client is skipped
+        :param reset_timeout: seconds to skip failing client
+        """
         if clients is None:
             clients = get_plugins('client')
         self.clients = clients
+        self.timeout = timeout
+        # one worker per client, calls of client are serialized by its connection anyway,
+        # so hung client doesn't hold workers of other clients
+        self._pools = dict()
+        self._pools_lock = threading.Lock()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = dict()
+        self._breakers_lock = threading.Lock()
+        # torrents of every client by upper case hash, only kept during execution
+        self._indexes = None
+        self._indexes_lock = threading.RLock()
 
     def get_settings(self, name):
         client = self.get_client(name)
@@ -153,6 +324,9 @@ class ClientsManager(object):
         if not client:
             return False
         client.set_settings(settings)
+        with self._indexes_lock:
+            if self._indexes is not None:
+                self._indexes.pop(name, None)
         return True
 
     def check_connection(self, name):
@@ -164,21 +338,313 @@ class ClientsManager(object):
     def get_client(self, name):
         return self.clients.get(name)
 
+    def start_execute(self):
+        """
+        Enables index of torrents, each client is asked for all its torrents once on first lookup
+        """
+        with self._indexes_lock:
+            self._indexes = dict()
+
+    def finish_execute(self):
+        """
+        Drops index of torrents and closes connections kept by clients during execution
+        """
+        with self._indexes_lock:
+            self._indexes = None
+        self.disconnect()
+
     def find_torrent(self, torrent_hash):
-        for name, client in self.clients.iteritems():
-            result = client.find_torrent(torrent_hash)
-            if result:
-                return result
-        return False
+        """
+        Looks for torrent in all clients concurrently, ready indexes are checked first
 
-    def add_torrent(self, torrent):
-        for name, client in self.clients.iteritems():
-            if client.add_torrent(torrent):
+        :rtype: dict | bool
+        """
+        with self._indexes_lock:
+            indexes = dict(self._indexes) if self._indexes is not None else dict()
+        for index in indexes.values():
+            if index is not None and torrent_hash.upper() in index:
+                return index[torrent_hash.upper()]
+        # clients with ready index don't have this torrent
+        clients = [(name, client) for name, client in self.clients.iteritems() if indexes.get(name) is None]
+        return self._call_clients(clients, lambda name, client: self._find_in_client(name, client, torrent_hash))
+
+    def add_torrent(self, torrent, torrent_hash=None):
+        """
+        :param torrent: torrent file content
+        :param torrent_hash: info hash of torrent, used to update index of torrents
+        """
+        for name, client in self._get_available_clients():
+            try:
+                added = self._call_client(name, client, lambda n, c: c.add_torrent(torrent))
+            except Exception:
+                # failed client is a miss, torrent is added to next one
+                continue
+            if added:
+                if torrent_hash:
+                    self._add_to_index(name, torrent, torrent_hash)
                 return True
         return False
 
     def remove_torrent(self, torrent_hash):
+        def remove(name, client):
+            if not client.remove_torrent(torrent_hash):
+                return False
+            self._remove_from_index(name, torrent_hash)
+            return True
+
+        return self._call_clients(self.clients.items(), remove)
+
+    def add_torrents(self, torrents):
+        """
+        Adds torrents missing in clients and removes their old versions by as few calls as clients allow
+
+        :param torrents: content, hash and old hash of every torrent
+        :type torrents: list[(str, str, str | None)]
+        :return: status of every torrent: exists (was already added), added, old_torrent (found old version),
+                 removed (old version was removed) and torrent (found added torrent)
+        :rtype: list[dict]
+        """
+        results = []
+        for torrent, torrent_hash, old_hash in torrents:
+            existing_torrent = self.find_torrent(torrent_hash)
+            results.append({'exists': bool(existing_torrent), 'added': False, 'old_torrent': False,
+                            'removed': False, 'torrent': existing_torrent})
+
+        pending = [i for i, result in enumerate(results) if not result['exists']]
+        for name, client in self._get_available_clients():
+            if not pending:
+                break
+            items = [torrents[i][0] for i in pending]
+            try:
+                statuses = self._call_client(name, client,
+                                             lambda n, c: self._call_batch(c, 'add_torrents', 'add_torrent', items))
+            except Exception:
+                # failed client is a miss, torrents are added to next one
+                continue
+            for i, status in zip(pending, statuses):
+                if status:
+                    results[i]['added'] = True
+                    self._add_to_index(name, torrents[i][0], torrents[i][1])
+            pending = [i for i, status in zip(pending, statuses) if not status]
+
+        removing = []
+        for (torrent, torrent_hash, old_hash), result in zip(torrents, results):
+            if not result['added']:
+                continue
+            result['old_torrent'] = self.find_torrent(old_hash) if old_hash else False
+            if result['old_torrent']:
+                removing.append((result, old_hash))
+        if removing:
+            removed = self.remove_torrents([old_hash for _, old_hash in removing])
+            for (result, _), status in zip(removing, removed):
+                result['removed'] = status
+
+        for (torrent, torrent_hash, old_hash), result in zip(torrents, results):
+            if result['added']:
+                result['torrent'] = self.find_torrent(torrent_hash)
+        return results
+
+    def remove_torrents(self, torrent_hashes):
+        """
+        :type torrent_hashes: list[str]
+        :return: if torrent was removed for every hash
+        :rtype: list[bool]
+        """
+        statuses = [False] * len(torrent_hashes)
+        pending = range(len(torrent_hashes))
+        for name, client in self._get_available_clients():
+            if not pending:
+                break
+            items = [torrent_hashes[i] for i in pending]
+            try:
+                client_statuses = self._call_client(
+                    name, client, lambda n, c: self._call_batch(c, 'remove_torrents', 'remove_torrent', items))
+            except Exception:
+                continue
+            for i, status in zip(pending, client_statuses):
+                if status:
+                    statuses[i] = True
+                    self._remove_from_index(name, torrent_hashes[i])
+            pending = [i for i, status in zip(pending, client_statuses) if not status]
+        return statuses
+
+    def disconnect(self):
+        """
+        Closes connections kept by clients during execution
+        """
         for name, client in self.clients.iteritems():
-            if client.remove_torrent(torrent_hash):
-                return True
+            disconnect = getattr(client, 'disconnect', None)
+            if disconnect is not None:
+                disconnect()
+
+    def _get_index(self, name, client):
+        """
+        :return: torrents of client by upper case hash or None if index isn't available
+        :rtype: dict | None
+        """
+        with self._indexes_lock:
+            if self._indexes is None:
+                return None
+            if name in self._indexes:
+                return self._indexes[name]
+        # torrents are requested without lock, so clients are indexed concurrently
+        get_torrents = getattr(client, 'get_torrents', None)
+        torrents = None
+        if get_torrents is not None:
+            try:
+                torrents = get_torrents()
+            except Exception:
+                pass
+        index = {h.upper(): t for h, t in torrents.iteritems()} if torrents is not None else None
+        with self._indexes_lock:
+            if self._indexes is None:
+                return index
+            return self._indexes.setdefault(name, index)
+
+    def _find_in_client(self, name, client, torrent_hash):
+        index = self._get_index(name, client)
+        if index is not None:
+            return index.get(torrent_hash.upper(), False)
+        return client.find_torrent(torrent_hash)
+
+    def _get_available_clients(self):
+        """
+        :return: clients which aren't skipped because of failures
+        :rtype: list[(str, object)]
+        """
+        return [(name, client) for name, client in self.clients.iteritems() if self._get_breaker(name).allow()]
+
+    def _get_breaker(self, name):
+        with self._breakers_lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+                self._breakers[name] = breaker
+            return breaker
+
+    def _call_client(self, name, client, call):
+        """
+        Calls client by its worker, client has to answer in timeout.
+        Failed or not answered call is a failure for circuit breaker of client.
+
+        :param call: callable accepting client name and client
+        :raise Exception: error of failed client or timeout error
+        """
+        result = self._get_pool(name).apply_async(call, (name, client))
+        try:
+            value = result.get(self.timeout)
+        except TimeoutError:
+            self._get_breaker(name).failure()
+            raise Exception("Client {0} doesn't respond".format(name))
+        except Exception:
+            self._get_breaker(name).failure()
+            raise
+        self._get_breaker(name).success()
+        return value
+
+    def _call_clients(self, clients, call):
+        """
+        Calls all available clients concurrently by their workers, each client has to answer in timeout.
+        Failed or not answered client is a miss for this call and a failure for its circuit breaker.
+
+        :param clients: names and clients to call
+        :type clients: list[(str, object)]
+        :param call: callable accepting client name and client
+        :return: first truthy result or False if there is no one
+        :raise Exception: error of failed client if all called clients failed
+        """
+        clients = [(name, client) for name, client in clients if self._get_breaker(name).allow()]
+        results = Queue()
+
+        def run(name, client):
+            try:
+                results.put((name, call(name, client), None))
+            except Exception as e:
+                results.put((name, None, e))
+
+        for name, client in clients:
+            self._get_pool(name).apply_async(run, (name, client))
+
+        deadline = time.time() + self.timeout
+        pending = set(name for name, _ in clients)
+        error = None
+        answered = not clients
+        while pending:
+            try:
+                name, result, e = results.get(timeout=max(deadline - time.time(), 0))
+            except Empty:
+                for name in pending:
+                    self._get_breaker(name).failure()
+                error = error or Exception("Client {0} doesn't respond".format(', '.join(sorted(pending))))
+                break
+            pending.discard(name)
+            if e is not None:
+                self._get_breaker(name).failure()
+                error = error or e
+                continue
+            answered = True
+            self._get_breaker(name).success()
+            if result:
+                return result
+        if not answered:
+            raise error
         return False
+
+    def _get_pool(self, name):
+        with self._pools_lock:
+            pool = self._pools.get(name)
+            if pool is None:
+                pool = ThreadPool(1)
+                self._pools[name] = pool
+            return pool
+
+    def _add_to_index(self, name, torrent, torrent_hash):
+        """
+        Adds just added torrent to index of client without asking client for it again
+        """
+        with self._indexes_lock:
+            index = self._indexes.get(name) if self._indexes is not None else None
+            if index is None:
+                return
+            index[torrent_hash.upper()] = {'name': self._get_torrent_name(torrent), 'date_added': datetime.now()}
+
+    @staticmethod
+    def _get_torrent_name(torrent):
+        try:
+            return Torrent(torrent, lazy=True).content['info']['name']
+        except Exception:
+            return None
+
+    def _remove_from_index(self, name, torrent_hash):
+        with self._indexes_lock:
+            index = self._indexes.get(name) if self._indexes is not None else None
+            if index is not None:
+                index.pop(torrent_hash.upper(), None)
+
+    # noinspection PyMethodMayBeStatic
+    def _call_batch(self, client, batch_method, method, items):
+        """
+        Calls batch method of client if it has one, otherwise calls single item method for every item
+
+        :return: status of every item
+        :rtype: list[bool]
+        :raise Exception: error of client if all single item calls failed
+        """
+        call = getattr(client, batch_method, None)
+        if call is not None:
+            try:
+                return [bool(status) for status in call(items)]
+            except Exception:
+                # unsupported by client, so fall back to single item calls
+                pass
+        statuses = []
+        errors = []
+        for item in items:
+            try:
+                statuses.append(bool(getattr(client, method)(item)))
+            except Exception as e:
+                errors.append(e)
+                statuses.append(False)
+        if errors and len(errors) == len(items):
+            raise errors[0]
+        return statuses
@@ -10,6 +10,11 @@ class Topic(Base):
     url = Column(String, nullable=False, unique=True)
     last_update = Column(DateTime, nullable=True)
     type = Column(String)
+    next_check = Column(DateTime, nullable=True)
+    # validators of last downloaded torrent for conditional requests
+    http_etag = Column(String, nullable=True)
+    http_last_modified = Column(String, nullable=True)
+    http_content_length = Column(Integer, nullable=True)
 
     __mapper_args__ = {
         'polymorphic_identity': 'topic',
@@ -1 +1,109 @@
+import socket
+import threading
+import time
 
+
+def is_transport_error(e):
+    """
+    Default check of exception raised by broken connection, client specific errors aren't retried
+    """
+    return isinstance(e, (socket.error, IOError))
+
+
+class ClientConnection(object):
+    """
+    Keeps one authenticated connection to torrent client and serializes calls through it.
+
+    Credentials are loaded once and reloaded only after reset (e.g. when settings are changed),
+    failed connects are retried with exponential backoff.
+    """
+    def __init__(self, load_credentials, connect, disconnect=None, min_backoff=1, max_backoff=300,
+                 is_connection_error=is_transport_error):
+        """
+        :param load_credentials: returns dict with credentials or None if client isn't configured
+        :param connect: creates connected client from credentials dict
+        :param disconnect: closes connected client
+        :param min_backoff: delay in seconds before first reconnect after failed connect
+        :param max_backoff: max delay in seconds between reconnects
+        :param is_connection_error: returns True for exception raised by broken connection,
+                                    only such exceptions are retried on new connection
+        """
+        self._load_credentials = load_credentials
+        self._connect = connect
+        self._disconnect = disconnect
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.is_connection_error = is_connection_error
+        self._lock = threading.RLock()
+        self._credentials = None
+        self._client = None
+        self._backoff = 0
+        self._retry_at = 0
+
+    def get(self):
+        """
+        :return: connected client or None if client isn't configured or can't connect now
+        """
+        with self._lock:
+            if self._client is not None:
+                return self._client
+            if self._credentials is None:
+                self._credentials = self._load_credentials() or dict()
+            if not self._credentials:
+                return None
+            if time.time() < self._retry_at:
+                return None
+            try:
+                self._client = self._connect(self._credentials)
+            except Exception:
+                self._backoff = min(max(self._backoff * 2, self.min_backoff), self.max_backoff)
+                self._retry_at = time.time() + self._backoff
+                return None
+            self._backoff = 0
+            self._retry_at = 0
+            return self._client
+
+    def execute(self, action, default=False):
+        """
+        Calls action with connected client, broken cached connection is reconnected once,
+        other exceptions are raised as is and connection is kept
+
+        :param action: callable accepting connected client
+        :param default: returned when client isn't available
+        """
+        with self._lock:
+            while True:
+                reused = self._client is not None
+                client = self.get()
+                if client is None:
+                    return default
+                try:
+                    return action(client)
+                except Exception as e:
+                    if not self.is_connection_error(e):
+                        raise
+                    self.disconnect()
+                    if not reused:
+                        raise
+
+    def disconnect(self):
+        """
+        Closes connection, next call will connect again
+        """
+        with self._lock:
+            client, self._client = self._client, None
+            if client is not None and self._disconnect is not None:
+                try:
+                    self._disconnect(client)
+                except Exception:
+                    pass
+
+    def reset(self):
+        """
+        Closes connection and forgets credentials and backoff, should be called when settings are changed
+        """
+        with self._lock:
+            self.disconnect()
+            self._credentials = None
+            self._backoff = 0
+            self._retry_at = 0
@@ -1,8 +1,12 @@
 import base64
+import socket
 from deluge_client import DelugeRPCClient
+from deluge_client.client import ConnectionLostException, CallTimeoutException, FailedToReconnectException
 from sqlalchemy import Column, Integer, String
 from monitorrent.db import Base, DBSession
 from monitorrent.plugin_managers import register_plugin
+from monitorrent.plugins.clients import ClientConnection
+from monitorrent.utils.bittorrent import Torrent
 from datetime import datetime
 
 
@@ -18,6 +22,8 @@ class DelugeCredentials(Base):
 
 class DelugeClientPlugin(object):
     name = "deluge"
+    # seconds to wait for answer, so hung call doesn't hold connection forever
+    timeout = 20
     form = [{
         'type': 'row',
         'content': [{
@@ -46,6 +52,10 @@ class DelugeClientPlugin(object):
         }]
     }]
 
+    def __init__(self):
+        self._connection = ClientConnection(self._load_credentials, self._connect, lambda c: c.disconnect(),
+                                            is_connection_error=self._is_connection_error)
+
     def get_settings(self):
         with DBSession() as db:
             cred = db.query(DelugeCredentials).first()
@@ -63,65 +73,106 @@ class DelugeClientPlugin(object):
             cred.port = settings.get('port', None)
             cred.username = settings.get('username', None)
             cred.password = settings.get('password', None)
+        self._connection.reset()
 
-    def _get_client(self):
+    # noinspection PyMethodMayBeStatic
+    def _load_credentials(self):
         with DBSession() as db:
             cred = db.query(DelugeCredentials).first()
-
             if not cred:
-                return False
+                return None
+            deluge_port = 58846
+            return {'host': cred.host, 'port': cred.port or deluge_port,
+                    'username': cred.username, 'password': cred.password}
+
+    # noinspection PyMethodMayBeStatic
+    @staticmethod
+    def _is_connection_error(e):
+        return isinstance(e, (socket.error, ConnectionLostException, CallTimeoutException,
+                              FailedToReconnectException))
+
+    def _connect(self, cred):
+        client = DelugeRPCClient(cred['host'], cred['port'], cred['username'], cred['password'],
+                                 timeout=self.timeout)
+        client.connect()
+        return client
 
-            deluge_port = "58846"
-            if not cred.port:
-                cred.port = deluge_port
-            return DelugeRPCClient(cred.host, cred.port, cred.username, cred.password)
+    def disconnect(self):
+        self._connection.disconnect()
 
     def check_connection(self):
-        client = self._get_client()
-        if not client:
-            return False
-        try:
-            client.connect()
-            return client.connected
-        except Exception:
-            return False
+        self._connection.reset()
+        client = self._connection.get()
+        return client is not None and client.connected
 
     def find_torrent(self, torrent_hash):
-        client = self._get_client()
-        if not client:
-            return False
-        try:
-            client.connect()
-        except:
-            return False
-        torrent = client.call("core.get_torrent_status",
-                              torrent_hash.lower(), ['time_added', 'name'])
-        if len(torrent) == 0:
+        def find(client):
+            return client.call("core.get_torrent_status", torrent_hash.lower(), ['time_added', 'name'])
+
+        torrent = self._connection.execute(find)
+        if not torrent:
             return False
         return {
             "name": torrent['name'],
             "date_added": datetime.fromtimestamp(torrent['time_added'])
         }
 
+    def get_torrents(self):
+        """
+        :return: all torrents by hash or None if client isn't available
+        :rtype: dict | None
+        """
+        torrents = self._connection.execute(
+            lambda client: client.call("core.get_torrents_status", {}, ['time_added', 'name']), None)
+        if torrents is None:
+            return None
+        return {torrent_hash: {"name": torrent['name'], "date_added": datetime.fromtimestamp(torrent['time_added'])}
+                for torrent_hash, torrent in torrents.iteritems()}
+
     # TODO add path to download
     def add_torrent(self, torrent):
         path_to_download = None
-        client = self._get_client()
-        if not client:
-            return False
-        client.connect()
-        result = client.call("core.add_torrent_file",
-                             None, base64.encodestring(torrent), None)
-        return result
+        return self._connection.execute(
+            lambda client: client.call("core.add_torrent_file", None, base64.encodestring(torrent), None))
+
+    def add_torrents(self, torrents):
+        """
+        Adds all torrents by one call
+
+        :type torrents: list[str]
+        :return: if torrent was added for every torrent
+        :rtype: list[bool]
+        """
+        hashes = [Torrent(torrent, lazy=True).info_hash.lower() for torrent in torrents]
+
+        def add(client):
+            client.call("core.add_torrent_files", [(None, base64.encodestring(torrent), {}) for torrent in torrents])
+            return client.call("core.get_torrents_status", {'id': hashes}, ['name'])
+
+        added = self._connection.execute(add, None)
+        if added is None:
+            return [False] * len(torrents)
+        return [torrent_hash in added for torrent_hash in hashes]
+
+    def remove_torrents(self, torrent_hashes):
+        """
+        Removes all torrents by one call
+
+        :type torrent_hashes: list[str]
+        :return: if torrent was removed for every hash
+        :rtype: list[bool]
+        """
+        hashes = [torrent_hash.lower() for torrent_hash in torrent_hashes]
+        errors = self._connection.execute(lambda client: client.call("core.remove_torrents", hashes, False), None)
+        if errors is None:
+            return [False] * len(hashes)
+        failed = set(error[0] for error in errors)
+        return [torrent_hash not in failed for torrent_hash in hashes]
 
     def remove_torrent(self, torrent_hash):
-        client = self._get_client()
-        if not client:
-            return False
-        client.connect()
         try:
-            return client.call("core.remove_torrent",
-                               torrent_hash.lower(), False)
+            return self._connection.execute(lambda client: client.call("core.remove_torrent",
+                                                                       torrent_hash.lower(), False))
         except:
             return False
 
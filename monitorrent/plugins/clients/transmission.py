@@ -1,7 +1,10 @@
+import socket
 import transmissionrpc
+from transmissionrpc.error import TransmissionError, HTTPHandlerError
 from sqlalchemy import Column, Integer, String, DateTime
 from monitorrent.db import Base, DBSession
 from monitorrent.plugin_managers import register_plugin
+from monitorrent.plugins.clients import ClientConnection
 import base64
 
 
@@ -17,6 +20,8 @@ class TransmissionCredentials(Base):
 
 class TransmissionClientPlugin(object):
     name = "transmission"
+    # seconds to wait for answer, so hung call doesn't hold connection forever
+    timeout = 20
     form = [{
         'type': 'row',
         'content': [{
@@ -45,6 +50,10 @@ class TransmissionClientPlugin(object):
         }]
     }]
 
+    def __init__(self):
+        self._connection = ClientConnection(self._load_credentials, self._connect,
+                                            is_connection_error=self._is_connection_error)
+
     def get_settings(self):
         with DBSession() as db:
             cred = db.query(TransmissionCredentials).first()
@@ -62,44 +71,96 @@ class TransmissionClientPlugin(object):
             cred.port = settings['port']
             cred.username = settings.get('username', None)
             cred.password = settings.get('password', None)
+        self._connection.reset()
 
-    def check_connection(self):
+    # noinspection PyMethodMayBeStatic
+    def _load_credentials(self):
         with DBSession() as db:
             cred = db.query(TransmissionCredentials).first()
             if not cred:
-                return False
+                return None
+            return {'host': cred.host, 'port': cred.port, 'username': cred.username, 'password': cred.password}
+
+    # noinspection PyMethodMayBeStatic
+    @staticmethod
+    def _is_connection_error(e):
+        # http errors are wrapped by transmissionrpc, while errors returned by transmission aren't
+        if isinstance(e, TransmissionError):
+            return isinstance(e.original, (HTTPHandlerError, socket.error, IOError))
+        return isinstance(e, (HTTPHandlerError, socket.error, IOError))
+
+    def _connect(self, cred):
+        return transmissionrpc.Client(address=cred['host'], port=cred['port'],
+                                      user=cred['username'], password=cred['password'], timeout=self.timeout)
+
+    def disconnect(self):
+        self._connection.disconnect()
+
+    def check_connection(self):
+        self._connection.reset()
+        return self._connection.get() or False
+
+    def find_torrent(self, torrent_hash):
+        def find(client):
             try:
-                client = transmissionrpc.Client(address=cred.host, port=cred.port,
-                                                user=cred.username, password=cred.password)
-                return client
-            except transmissionrpc.TransmissionError:
+                return client.get_torrent(torrent_hash.lower(), ['id', 'hashString', 'addedDate', 'name'])
+            except KeyError:
                 return False
 
-    def find_torrent(self, torrent_hash):
-        client = self.check_connection()
-        if not client:
-            return False
-        try:
-            torrent = client.get_torrent(torrent_hash.lower(), ['id', 'hashString', 'addedDate', 'name'])
-            return {
-                "name": torrent.name,
-                "date_added": torrent.date_added
-            }
-        except KeyError:
+        torrent = self._connection.execute(find)
+        if not torrent:
             return False
+        return {
+            "name": torrent.name,
+            "date_added": torrent.date_added
+        }
+
+    def get_torrents(self):
+        """
+        :return: all torrents by hash or None if client isn't available
+        :rtype: dict | None
+        """
+        torrents = self._connection.execute(
+            lambda client: client.get_torrents(arguments=['id', 'hashString', 'addedDate', 'name']), None)
+        if torrents is None:
+            return None
+        return {torrent.hashString: {"name": torrent.name, "date_added": torrent.date_added} for torrent in torrents}
 
     def add_torrent(self, torrent):
-        client = self.check_connection()
-        if not client:
-            return False
-        client.add_torrent(base64.encodestring(torrent))
-        return True
+        def add(client):
+            client.add_torrent(base64.encodestring(torrent))
+            return True
+
+        return self._connection.execute(add)
+
+    def remove_torrents(self, torrent_hashes):
+        """
+        Removes all existing torrents by one call, transmission silently ignores unknown hashes,
+        so they are looked up before removing
+
+        :type torrent_hashes: list[str]
+        :return: if torrent was removed for every hash
+        :rtype: list[bool]
+        """
+        hashes = [torrent_hash.lower() for torrent_hash in torrent_hashes]
+
+        def remove(client):
+            existing = set(torrent.hashString.lower()
+                           for torrent in client.get_torrents(ids=hashes, arguments=['id', 'hashString']))
+            if existing:
+                client.remove_torrent(list(existing), delete_data=False)
+            return existing
+
+        removed = self._connection.execute(remove, None)
+        if removed is None:
+            return [False] * len(torrent_hashes)
+        return [torrent_hash in removed for torrent_hash in hashes]
 
     def remove_torrent(self, torrent_hash):
-        client = self.check_connection()
-        if not client:
-            return False
-        client.remove_torrent(torrent_hash, delete_data=False)
-        return True
+        def remove(client):
+            client.remove_torrent(torrent_hash, delete_data=False)
+            return True
+
+        return self._connection.execute(remove)
 
 register_plugin('client', 'transmission', TransmissionClientPlugin())
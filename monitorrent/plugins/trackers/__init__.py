@@ -1,9 +1,16 @@
 import abc
+import re
+import threading
+import time
+from Queue import Queue, Empty
+from urlparse import urlparse
 from enum import Enum
-from monitorrent.db import DBSession, row2dict, dict2row
+from sqlalchemy import inspect, Column, String, MetaData, Table
+from monitorrent.db import DBSession, UpdateBuffer, row2dict, dict2row
 from monitorrent.plugins import Topic
-from monitorrent.utils.bittorrent import Torrent
-from monitorrent.utils.downloader import download
+from monitorrent.utils.bittorrent import Torrent, TORRENT_RE
+from monitorrent.utils.downloader import download_if_modified
+from monitorrent.utils.sessions import get_session
 from monitorrent.engine import Engine
 
 
@@ -13,6 +20,8 @@ class TrackerPluginBase(object):
     topic_class = Topic
     topic_public_fields = ['id', 'url', 'last_update', 'display_name']
     topic_private_fields = ['display_name']
+    # topic fields used by get_topic_info, only they are read for topics list
+    topic_info_columns = []
     topic_form = [{
         'type': 'row',
         'content': [{
@@ -22,6 +31,22 @@ class TrackerPluginBase(object):
             'flex': 100
         }]
     }]
+    # how many topics are downloaded at the same time, 1 means serial execution
+    fetch_workers = 1
+    # how many topics can be downloaded from one host at the same time
+    max_connections_per_host = 2
+    # max count of topics waiting between execution stages
+    pipeline_queue_size = 10
+    # max count of changed topics whose torrents are added to clients by one batch
+    commit_batch_size = 10
+    # max count of updated rows and seconds they wait before they are written to database
+    update_buffer_size = 100
+    update_buffer_delay = 30
+    # name of shared keep-alive session used for downloads, new session per download if None
+    session_name = None
+
+    _host_semaphores = dict()
+    _host_semaphores_lock = threading.Lock()
 
     @abc.abstractmethod
     def can_parse_url(self, url):
@@ -62,7 +87,7 @@ class TrackerPluginBase(object):
         if parsed_url is None:
             # TODO: Throw exception, because we shouldn't call add topic if we can't parse URL
             return False
-        with DBSession() as db:
+        with DBSession(immediate=True) as db:
             topic = self.topic_class(url=url)
             self._set_topic_params(url, parsed_url, topic, params)
             db.add(topic)
@@ -78,7 +103,7 @@ class TrackerPluginBase(object):
             return data
 
     def update_topic(self, id, params):
-        with DBSession() as db:
+        with DBSession(immediate=True) as db:
             topic = db.query(self.topic_class).filter(Topic.id == id).first()
             if topic is None:
                 return False
@@ -100,32 +125,229 @@ class TrackerPluginBase(object):
         :type engine: Engine
         :return: None
         """
+        if ids is not None and len(ids) == 0:
+            return
         with DBSession() as db:
-            topics = db.query(self.topic_class).all()
+            query = db.query(self.topic_class)
+            if ids is not None:
+                query = query.filter(Topic.id.in_(ids))
+            topics = query.all()
             db.expunge_all()
+        update_buffer = UpdateBuffer(self.update_buffer_size, self.update_buffer_delay)
+        try:
+            if self.fetch_workers > 1 and len(topics) > 1:
+                self._execute_pipeline(topics, engine, update_buffer)
+            else:
+                self._execute_serial(topics, engine, update_buffer)
+        finally:
+            self._flush_updates(update_buffer, engine)
+
+    def _execute_serial(self, topics, engine, update_buffer):
+        updates = []
         for topic in topics:
-            topic_name = topic.display_name
             try:
-                engine.log.info(u"Check for changes <b>%s</b>" % topic_name)
-                torrent_content, filename = download(self._prepare_request(topic))
-                if not filename:
-                    filename = topic_name
-                engine.log.downloaded(u"Torrent <b>%s</b> downloaded" % filename, torrent_content)
-                torrent = Torrent(torrent_content)
-                old_hash = topic.hash
-                if torrent.info_hash != old_hash:
-                    engine.log.info(u"Torrent <b>%s</b> was changed" % topic_name)
-                    last_update = engine.add_torrent(filename, torrent, old_hash)
-                    with DBSession() as db:
-                        db.add(topic)
-                        topic.hash = torrent.info_hash
-                        topic.last_update = last_update
-                        db.commit()
-                else:
-                    engine.log.info(u"Torrent <b>%s</b> not changed" % topic_name)
+                torrent_content, filename, validators = self._download_topic(topic)
             except Exception as e:
-                engine.log.failed(u"Failed update <b>%s</b>.\nReason: %s" % (topic_name, e.message))
+                self._log_check_failed(topic, e, engine)
+                continue
+            update = self._check_topic(topic, torrent_content, filename, validators, engine)
+            if update:
+                updates.append(update)
+            if len(updates) >= self.commit_batch_size:
+                self._commit_topics(updates, engine, update_buffer)
+                updates = []
+            self._flush_updates(update_buffer, engine, expired_only=True)
+        if updates:
+            self._commit_topics(updates, engine, update_buffer)
+
+    def _execute_pipeline(self, topics, engine, update_buffer):
+        """
+        Executes topics in three stages joined by bounded queues:
+        download (thread pool), decode and hash check (single thread)
+        and commit (current thread, so all DB writes are made by single writer)
+
+        :type topics: list[Topic]
+        :type engine: Engine
+        :type update_buffer: UpdateBuffer
+        """
+        topics_queue = Queue()
+        for topic in topics:
+            topics_queue.put(topic)
+        downloaded_queue = Queue(self.pipeline_queue_size)
+        commit_queue = Queue(self.pipeline_queue_size)
+
+        fetchers = [threading.Thread(target=self._fetch_worker, args=(topics_queue, downloaded_queue))
+                    for _ in range(min(self.fetch_workers, len(topics)))]
+        decoder = threading.Thread(target=self._decode_worker,
+                                   args=(len(topics), downloaded_queue, commit_queue, engine))
+        for thread in fetchers + [decoder]:
+            thread.daemon = True
+            thread.start()
+        self._commit_loop(commit_queue, engine, update_buffer)
+        decoder.join()
+        for fetcher in fetchers:
+            fetcher.join()
+
+    def _fetch_worker(self, topics_queue, downloaded_queue):
+        while True:
+            try:
+                topic = topics_queue.get_nowait()
+            except Empty:
+                return
+            try:
+                with self._get_host_semaphore(topic.url):
+                    torrent_content, filename, validators = self._download_topic(topic)
+                downloaded_queue.put((topic, torrent_content, filename, validators, None))
+            except Exception as e:
+                downloaded_queue.put((topic, None, None, None, e))
+
+    def _decode_worker(self, count, downloaded_queue, commit_queue, engine):
+        try:
+            for _ in range(count):
+                topic, torrent_content, filename, validators, error = downloaded_queue.get()
+                if error is not None:
+                    self._log_check_failed(topic, error, engine)
+                    continue
+                update = self._check_topic(topic, torrent_content, filename, validators, engine)
+                if update:
+                    commit_queue.put(update)
+        finally:
+            commit_queue.put(None)
+
+    def _commit_loop(self, commit_queue, engine, update_buffer):
+        finished = False
+        while not finished:
+            try:
+                updates = [commit_queue.get(timeout=self.update_buffer_delay)]
+            except Empty:
+                # updates of last batch don't wait for end of slow downloads
+                self._flush_updates(update_buffer, engine, expired_only=True)
+                continue
+            while len(updates) < self.commit_batch_size:
+                try:
+                    updates.append(commit_queue.get_nowait())
+                except Empty:
+                    break
+            if None in updates:
+                updates.remove(None)
+                finished = True
+            if updates:
+                self._commit_topics(updates, engine, update_buffer)
+            self._flush_updates(update_buffer, engine, expired_only=True)
+
+    def _get_host_semaphore(self, url):
+        host = urlparse(url).netloc
+        with self._host_semaphores_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.max_connections_per_host)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+
+    def _download_topic(self, topic):
+        """
+        Downloads torrent only if it was modified since last check
 
+        :type topic: Topic
+        :return: torrent content (None if not modified), filename and validators for next conditional download
+        :rtype: (str | None, str | None, dict)
+        """
+        session = get_session(self.session_name) if self.session_name else None
+        return download_if_modified(self._prepare_request(topic), topic.http_etag, topic.http_last_modified,
+                                    session=session)
+
+    def _check_topic(self, topic, torrent_content, filename, validators, engine):
+        """
+        :type topic: Topic
+        :type validators: dict
+        :type engine: Engine
+        :return: topic, its changed fields and changed torrent to add (filename, torrent and old hash)
+                 if torrent or its validators were changed, otherwise None
+        :rtype: (Topic, dict, (str, Torrent, str | None) | None) | None
+        """
+        topic_name = topic.display_name
+        topic_id = topic.id
+        try:
+            engine.log.info(u"Check for changes <b>%s</b>" % topic_name, topic_id=topic_id)
+            # topic fields changed by plugin during download are saved too
+            topic_modified = inspect(topic).modified
+            if torrent_content is None:
+                engine.log.info(u"Torrent <b>%s</b> not modified" % topic_name, topic_id=topic_id)
+                return (topic, dict(), None) if topic_modified else None
+            if not filename:
+                filename = topic_name
+            engine.log.downloaded(u"Torrent <b>%s</b> downloaded" % filename, torrent_content, topic_id=topic_id)
+            changes = {'http_' + k: v for k, v in validators.items() if getattr(topic, 'http_' + k) != v}
+            torrent = Torrent(torrent_content, lazy=True)
+            old_hash = topic.hash
+            added_torrent = None
+            if torrent.info_hash != old_hash:
+                engine.log.info(u"Torrent <b>%s</b> was changed" % topic_name, topic_id=topic_id)
+                # torrents are added to clients in batches right before commit
+                added_torrent = (filename, torrent, old_hash, topic_id)
+                changes['hash'] = torrent.info_hash
+            else:
+                engine.log.info(u"Torrent <b>%s</b> not changed" % topic_name, topic_id=topic_id)
+            if changes or topic_modified:
+                return topic, changes, added_torrent
+        except Exception as e:
+            engine.log.failed(u"Failed update <b>%s</b>.\nReason: %s" % (topic_name, e.message), topic_id=topic_id)
+        return None
+
+    # noinspection PyMethodMayBeStatic
+    def _log_check_failed(self, topic, error, engine):
+        topic_name = topic.display_name
+        engine.log.info(u"Check for changes <b>%s</b>" % topic_name, topic_id=topic.id)
+        engine.log.failed(u"Failed update <b>%s</b>.\nReason: %s" % (topic_name, error.message), topic_id=topic.id)
+
+    # noinspection PyMethodMayBeStatic
+    def _commit_topics(self, updates, engine, update_buffer):
+        """
+        Adds changed torrents to clients by one batch and puts topic changes to update buffer
+
+        :type updates: list[(Topic, dict, (str, Torrent, str | None, int) | None)]
+        :type engine: Engine
+        :type update_buffer: UpdateBuffer
+        """
+        added = [(changes, added_torrent) for _, changes, added_torrent in updates if added_torrent]
+        if added:
+            try:
+                last_updates = engine.add_torrents([added_torrent for _, added_torrent in added])
+            except Exception as e:
+                for _, (filename, _, _, topic_id) in added:
+                    engine.log.failed(u"Failed add torrent <b>%s</b>.\nReason: %s" % (filename, e.message),
+                                      topic_id=topic_id)
+                # topics aren't updated, so they will be checked again
+                updates = [update for update in updates if not update[2]]
+            else:
+                for (changes, _), last_update in zip(added, last_updates):
+                    changes['last_update'] = last_update
+        if not updates:
+            return
+        names = u", ".join(topic.display_name for topic, _, _ in updates)
+        try:
+            for topic, changes, _ in updates:
+                # fields changed by plugin on detached topic are saved too
+                values = {attr.key: attr.value for attr in inspect(topic).attrs if attr.history.has_changes()}
+                values.update(changes)
+                update_buffer.update(type(topic), topic.id, values)
+        except Exception as e:
+            engine.log.failed(u"Failed save <b>%s</b>.\nReason: %s" % (names, e.message))
+
+    # noinspection PyMethodMayBeStatic
+    def _flush_updates(self, update_buffer, engine, expired_only=False):
+        """
+        :type update_buffer: UpdateBuffer
+        :type engine: Engine
+        :param expired_only: flush only if updates wait for update_buffer_delay
+        """
+        try:
+            if expired_only:
+                update_buffer.flush_expired()
+            else:
+                update_buffer.flush()
+        except Exception as e:
+            engine.log.failed(u"Failed save topics.\nReason: %s" % e.message)
 
     @abc.abstractmethod
     def _prepare_request(self, topic):
@@ -192,6 +414,16 @@ class TrackerPluginWithCredentialsBase(TrackerPluginBase):
         }]
     }]
 
+    # seconds while successful verification or login is trusted without new verify
+    verify_ttl = 3600
+
+    _verified_at = None
+    # password field of login form returned instead of torrent
+    login_page_re = re.compile(r'<input[^>]+type\s*=\s*["\']?password', re.IGNORECASE)
+
+    def __init__(self):
+        self._login_lock = threading.Lock()
+
     @abc.abstractmethod
     def login(self):
         """
@@ -214,26 +446,109 @@ class TrackerPluginWithCredentialsBase(TrackerPluginBase):
             return row2dict(dbcredentials, None, self.credentials_public_fields)
 
     def update_credentials(self, credentials):
-        with DBSession() as db:
+        with DBSession(immediate=True) as db:
             dbcredentials = db.query(self.credentials_class).first()
             if dbcredentials is None:
                 dbcredentials = self.credentials_class()
                 db.add(dbcredentials)
             dict2row(dbcredentials, credentials, self.credentials_private_fields)
+        self._verified_at = None
 
     def execute(self, ids, engine):
+        if ids is not None and len(ids) == 0:
+            return
         if not self._execute_login(engine):
             return
         super(TrackerPluginWithCredentialsBase, self).execute(ids, engine)
 
     def _execute_login(self, engine):
+        if self._verified_at is not None and time.time() - self._verified_at < self.verify_ttl:
+            engine.log.info("Credentials/Settings are valid")
+            return True
         if not self.verify():
             engine.log.info("Credentials/Settings are not valid\nTry login.")
             login_result = self.login()
             if login_result != LoginResult.Ok:
+                self._verified_at = None
                 engine.log.failed("Can't login: {}".format(login_result))
                 return False
+            self._verified_at = time.time()
             engine.log.info("Login successful")
             return True
+        self._verified_at = time.time()
         engine.log.info("Credentials/Settings are valid")
         return True
+
+    def is_login_page(self, content):
+        """
+        :return: True if tracker returned login page instead of torrent
+        """
+        return self.login_page_re.search(content) is not None
+
+    def _download_topic(self, topic):
+        """
+        Logins again and repeats download if tracker returned login page instead of torrent
+        or returned other page because credentials aren't valid anymore
+        """
+        verified_at = self._verified_at
+        result = super(TrackerPluginWithCredentialsBase, self)._download_topic(topic)
+        torrent_content = result[0]
+        if torrent_content is None or TORRENT_RE.match(torrent_content.lstrip()):
+            return result
+        with self._login_lock:
+            # other topic could be already downloaded after login
+            if self._verified_at == verified_at:
+                if not self.is_login_page(torrent_content) and self.verify():
+                    # page isn't caused by expired login, so login doesn't help
+                    return result
+                self._verified_at = None
+                if self.login() != LoginResult.Ok:
+                    return result
+                self._verified_at = time.time()
+        return super(TrackerPluginWithCredentialsBase, self)._download_topic(topic)
+
+
+class DownloadUrlTrackerMixin(object):
+    """
+    Mixin for trackers with different ids of topic and its torrent,
+    topic class has to have download_url column and tracker has to resolve it by get_download_url
+    """
+    def _download_topic(self, topic):
+        """
+        Download url is resolved from topic page only when it is unknown or download by stored one fails
+        """
+        if topic.download_url:
+            try:
+                # stored url is only probed, failed probe doesn't require login again
+                result = TrackerPluginBase._download_topic(self, topic)
+                if result[0] is None or TORRENT_RE.match(result[0].lstrip()):
+                    return result
+            except Exception:
+                pass
+        download_url = self.tracker.get_download_url(topic.url)
+        if download_url != topic.download_url:
+            # validators of old url aren't valid for new one
+            topic.http_etag = None
+            topic.http_last_modified = None
+            topic.download_url = download_url
+        return super(DownloadUrlTrackerMixin, self)._download_topic(topic)
+
+
+def upgrade_download_url(engine, operations_factory, topic_class):
+    """
+    Adds download_url column to existing topics table of tracker with DownloadUrlTrackerMixin
+    """
+    with engine.connect() as connection:
+        if not engine.dialect.has_table(connection, topic_class.__tablename__):
+            return
+    if get_download_url_version(engine, topic_class) == 0:
+        with operations_factory() as operations:
+            operations.add_column(topic_class.__tablename__, Column('download_url', String, nullable=True))
+
+
+def get_download_url_version(engine, topic_class):
+    m = MetaData(engine)
+    t = Table(topic_class.__tablename__, m, autoload=True)
+    if 'download_url' not in t.columns:
+        return 0
+    return 1
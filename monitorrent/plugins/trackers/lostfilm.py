@@ -1,14 +1,16 @@
 # coding=utf-8
 import re
+import threading
 import feedparser
-import requests
 from requests import Session
 from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, ForeignKey
-from monitorrent.db import Base, DBSession, row2dict
+from datetime import datetime
+from monitorrent.db import Base, DBSession, UpdateBuffer, row2dict, dict2row
 from urlparse import urlparse, parse_qs
 from monitorrent.plugin_managers import register_plugin
 from monitorrent.utils.soup import get_soup
 from monitorrent.utils.bittorrent import Torrent
+from monitorrent.utils.sessions import get_session
 from monitorrent.utils.downloader import download
 from monitorrent.plugins import Topic
 from monitorrent.plugins.trackers import TrackerPluginWithCredentialsBase, LoginResult
@@ -41,6 +43,19 @@ class LostFilmTVCredentials(Base):
     default_quality = Column(String, nullable=False, server_default='SD')
 
 
+class LostFilmTVRssState(Base):
+    """
+    Validators of last downloaded feed and newest entry up to which all entries are processed
+    """
+    __tablename__ = "lostfilmtv_rss_state"
+
+    id = Column(Integer, primary_key=True)
+    etag = Column(String, nullable=True)
+    modified = Column(String, nullable=True)
+    last_guid = Column(String, nullable=True)
+    last_published = Column(DateTime, nullable=True)
+
+
 # noinspection PyUnusedLocal
 def upgrade(engine, operations_factory):
     if not engine.dialect.has_table(engine.connect(), LostFilmTVSeries.__tablename__):
@@ -181,7 +196,7 @@ class LostFilmTVTracker(object):
         cookies = self.get_cookies()
         if not cookies:
             return False
-        r1 = requests.get('http://www.lostfilm.tv/my.php', cookies=cookies)
+        r1 = get_session(PLUGIN_NAME).get('http://www.lostfilm.tv/my.php', cookies=cookies)
         return len(r1.text) > 0
 
     def get_cookies(self):
@@ -198,7 +213,7 @@ class LostFilmTVTracker(object):
         if match is None:
             return None
 
-        r = requests.get(url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(url, allow_redirects=False)
         if r.status_code != 200:
             return None
         soup = get_soup(r.text)
@@ -274,6 +289,7 @@ class LostFilmPlugin(TrackerPluginWithCredentialsBase):
     topic_class = LostFilmTVSeries
     topic_public_fields = ['id', 'url', 'last_update', 'display_name', 'season', 'episode', 'quality']
     topic_private_fields = ['display_name', 'season', 'episode', 'quality']
+    topic_info_columns = ['season', 'episode']
     topic_form = [{
         'type': 'row',
         'content': [{
@@ -318,6 +334,11 @@ class LostFilmPlugin(TrackerPluginWithCredentialsBase):
         }]
     }]
 
+    rss_url = u'http://www.lostfilm.tv/rssdd.xml'
+    # incremented when topics are changed, so feed state of running execute isn't saved
+    _rss_version = 0
+    _rss_lock = threading.Lock()
+
     def can_parse_url(self, url):
         return self.tracker.can_parse_url(url)
 
@@ -352,7 +373,7 @@ class LostFilmPlugin(TrackerPluginWithCredentialsBase):
                 return LoginResult.CredentialsNotSpecified
         try:
             self.tracker.login(username, password)
-            with DBSession() as db:
+            with DBSession(immediate=True) as db:
                 cred = db.query(self.credentials_class).first()
                 cred.c_uid = self.tracker.c_uid
                 cred.c_pass = self.tracker.c_pass
@@ -386,63 +407,155 @@ class LostFilmPlugin(TrackerPluginWithCredentialsBase):
         :type engine: engine.Engine
         :rtype: None
         """
+        if ids is not None and len(ids) == 0:
+            return
         if not self._execute_login(engine):
             return
         cookies = self.tracker.get_cookies()
         with DBSession() as db:
-            db_series = db.query(LostFilmTVSeries).all()
-            series = map(row2dict, db_series)
+            # all series are required to know which entries aren't watched at all
+            series = map(row2dict, db.query(LostFilmTVSeries).all())
         series_names = {s[u'search_name'].lower(): s for s in series}
-        d = feedparser.parse(u'http://www.lostfilm.tv/rssdd.xml')
-        engine.log.info(u'Download <a href="http://www.lostfilm.tv/rssdd.xml">rss</a>')
+        requested_ids = set(ids) if ids is not None else None
+        with self._rss_lock:
+            rss_version = self._rss_version
+        state = self._load_rss_state()
+        d = feedparser.parse(self.rss_url, etag=state['etag'], modified=state['modified'])
+        engine.log.info(u'Download <a href="{0}">rss</a>'.format(self.rss_url))
+        if d.get('status') == 304:
+            engine.log.info(u'Rss not modified')
+            return
         try:
-            for entry in d.entries:
-                info = self.tracker.parse_rss_title(entry.title)
-                if not info:
-                    engine.log.failed(u'Can\'t parse title: <b>{0}</b>'.format(entry.title))
-                    continue
-
-                original_name = info['original_name']
-                serie = series_names.get(original_name.lower(), None)
-
-                if not serie:
-                    engine.log.info(u'Not watching series: {0}'.format(original_name))
-                    continue
-
-                if (info['season'] < serie['season']) or \
-                   (info['season'] == serie['season'] and info['episode'] <= serie['episode']):
-                    engine.log.info(u"Series <b>{0}</b> not changed".format(original_name))
-                    continue
-
-                if info['quality'] != serie['quality']:
-                    engine.log.info(u'Skip <b>{0}</b> by quality filter. Searching for {1} by get {2}'
-                                    .format(original_name, serie['quality'], info['quality']))
-                    continue
-
-                try:
-                    torrent_content, filename = download(entry.link, cookies=cookies)
-                except Exception as e:
-                    engine.log.failed(u"Failed to download from <b>{0}</b>.\nReason: {1}"
-                                      .format(entry.link, e.message))
-                    continue
-                if not filename:
-                    filename = original_name
-                torrent = Torrent(torrent_content)
-                engine.log.downloaded(u'Download new series: {0} ({1})'
-                                      .format(original_name, info['episode_info']),
-                                      torrent_content)
-                last_update = engine.add_torrent(filename, torrent, None)
-                with DBSession() as db:
-                    db_serie = db.query(LostFilmTVSeries)\
-                        .filter(LostFilmTVSeries.id == serie['id'])\
-                        .first()
-                    db_serie.last_update = last_update
-                    db_serie.season = info['season']
-                    db_serie.episode = info['episode']
-                    db.commit()
+            statuses = []
+            seen = False
+            with UpdateBuffer(self.update_buffer_size, self.update_buffer_delay) as update_buffer:
+                for entry in d.entries:
+                    published = self._get_published(entry)
+                    # feed is ordered from newest entry, all entries older than last processed one are seen
+                    seen = seen or (entry.get('id') or entry.link) == state['last_guid'] or \
+                        (published is not None and state['last_published'] is not None and
+                         published < state['last_published'])
+                    statuses.append(seen or self._process_rss_entry(entry, series_names, requested_ids,
+                                                                    cookies, engine, update_buffer))
+                    update_buffer.flush_expired()
+            self._save_rss_state(rss_version, d, statuses, state)
         except Exception as e:
             engine.log.failed(u"Failed update <b>lostfilm</b>.\nReason: {0}".format(e.message))
 
+    def _process_rss_entry(self, entry, series_names, requested_ids, cookies, engine, update_buffer):
+        """
+        :param requested_ids: ids of series checked by this execute, all series are checked if None
+        :type requested_ids: set[int] | None
+        :type update_buffer: UpdateBuffer
+        :return: False if entry has to be processed again on next execute
+        :rtype: bool
+        """
+        info = self.tracker.parse_rss_title(entry.title)
+        if not info:
+            engine.log.failed(u'Can\'t parse title: <b>{0}</b>'.format(entry.title))
+            return True
+
+        original_name = info['original_name']
+        serie = series_names.get(original_name.lower(), None)
+
+        if not serie:
+            engine.log.info(u'Not watching series: {0}'.format(original_name))
+            return True
+
+        if requested_ids is not None and serie['id'] not in requested_ids:
+            # series isn't checked now, so entry is processed by its own execute
+            return False
+
+        if (info['season'] < serie['season']) or \
+           (info['season'] == serie['season'] and info['episode'] <= serie['episode']):
+            engine.log.info(u"Series <b>{0}</b> not changed".format(original_name), topic_id=serie['id'])
+            return True
+
+        if info['quality'] != serie['quality']:
+            engine.log.info(u'Skip <b>{0}</b> by quality filter. Searching for {1} by get {2}'
+                            .format(original_name, serie['quality'], info['quality']), topic_id=serie['id'])
+            return True
+
+        try:
+            torrent_content, filename = download(entry.link, session=get_session(PLUGIN_NAME), cookies=cookies)
+        except Exception as e:
+            engine.log.failed(u"Failed to download from <b>{0}</b>.\nReason: {1}"
+                              .format(entry.link, e.message), topic_id=serie['id'])
+            return False
+        if not filename:
+            filename = original_name
+        torrent = Torrent(torrent_content, lazy=True)
+        engine.log.downloaded(u'Download new series: {0} ({1})'
+                              .format(original_name, info['episode_info']),
+                              torrent_content, topic_id=serie['id'])
+        last_update = engine.add_torrent(filename, torrent, None, serie['id'])
+        update_buffer.update(LostFilmTVSeries, serie['id'],
+                             {'last_update': last_update, 'season': info['season'], 'episode': info['episode']})
+        return True
+
+    def add_topic(self, url, params):
+        result = super(LostFilmPlugin, self).add_topic(url, params)
+        self._reset_rss_state()
+        return result
+
+    def update_topic(self, id, params):
+        result = super(LostFilmPlugin, self).update_topic(id, params)
+        self._reset_rss_state()
+        return result
+
+    def _reset_rss_state(self):
+        """
+        Forgets feed validators and processed entries, so whole feed is processed on next execute
+        """
+        with self._rss_lock:
+            self._rss_version += 1
+            with DBSession(immediate=True) as db:
+                db.query(LostFilmTVRssState).delete()
+
+    # noinspection PyMethodMayBeStatic
+    def _load_rss_state(self):
+        with DBSession() as db:
+            state = db.query(LostFilmTVRssState).first()
+            if state is None:
+                return {'etag': None, 'modified': None, 'last_guid': None, 'last_published': None}
+            return row2dict(state, fields=['etag', 'modified', 'last_guid', 'last_published'])
+
+    def _save_rss_state(self, rss_version, d, statuses, state):
+        """
+        Saves newest entry up to which all entries are processed,
+        feed validators are saved only if all entries are processed
+
+        :param statuses: if entry was processed for every entry of feed
+        :type statuses: list[bool]
+        :param state: previous state
+        :type state: dict
+        """
+        processed = 0
+        while processed < len(statuses) and statuses[-processed - 1]:
+            processed += 1
+        if processed > 0:
+            entry = d.entries[-processed]
+            state['last_guid'] = entry.get('id') or entry.link
+            state['last_published'] = self._get_published(entry)
+        if processed == len(statuses):
+            state['etag'] = d.get('etag')
+            state['modified'] = d.get('modified')
+        with self._rss_lock:
+            # topics could be changed during execution, so whole feed has to be processed next time
+            if self._rss_version != rss_version:
+                return
+            with DBSession(immediate=True) as db:
+                db_state = db.query(LostFilmTVRssState).first()
+                if db_state is None:
+                    db_state = LostFilmTVRssState()
+                    db.add(db_state)
+                dict2row(db_state, state)
+
+    @staticmethod
+    def _get_published(entry):
+        published = entry.get('published_parsed')
+        return datetime(*published[:6]) if published else None
+
     def get_topic_info(self, topic):
         if topic.season and topic.episode:
             return "S%02dE%02d" % (topic.season, topic.episode)
@@ -1,9 +1,9 @@
 import re
-import requests
 from sqlalchemy import Column, Integer, String, DateTime, MetaData, Table, ForeignKey
 from monitorrent.db import row2dict
 from monitorrent.utils.soup import get_soup
 from monitorrent.utils.bittorrent import Torrent
+from monitorrent.utils.sessions import get_session
 from monitorrent.plugin_managers import register_plugin
 from monitorrent.plugins import Topic
 from monitorrent.plugins.trackers import TrackerPluginBase
@@ -108,7 +108,7 @@ class RutorOrgTracker(object):
         if match is None:
             return None
 
-        r = requests.get(url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(url, allow_redirects=False)
         if r.status_code != 200:
             return None
         r.encoding = 'utf-8'
@@ -123,11 +123,11 @@ class RutorOrgTracker(object):
         download_url = self.get_download_url(url)
         if not download_url:
             return None
-        r = requests.get(download_url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(download_url, allow_redirects=False)
         content_type = r.headers.get('content-type', '')
         if content_type.find('bittorrent') == -1:
             raise Exception('Expect torrent for download from url: {0}, but was {1}'.format(url, content_type))
-        t = Torrent(r.content)
+        t = Torrent(r.content, lazy=True)
         return t.info_hash
 
     def get_download_url(self, url):
@@ -157,6 +157,8 @@ class RutorOrgPlugin(TrackerPluginBase):
             'flex': 100
         }]
     }]
+    session_name = PLUGIN_NAME
+    fetch_workers = 4
 
     def can_parse_url(self, url):
         return self.tracker.can_parse_url(url)
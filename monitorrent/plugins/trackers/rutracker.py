@@ -10,6 +10,7 @@ from monitorrent.plugins import Topic
 from monitorrent.plugin_managers import register_plugin
 from monitorrent.utils.soup import get_soup
 from monitorrent.utils.bittorrent import Torrent
+from monitorrent.utils.sessions import get_session
 from monitorrent.plugins.trackers import TrackerPluginWithCredentialsBase, LoginResult
 
 PLUGIN_NAME = 'rutracker.org'
@@ -67,7 +68,7 @@ class RutrackerTracker(object):
         # without slash response gets fucked up
         if not url.endswith("/"):
             url += "/"
-        r = requests.get(url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(url, allow_redirects=False)
         if r.status_code != 200:
             return None
 
@@ -100,7 +101,7 @@ class RutrackerTracker(object):
         if not cookies:
             return False
         profile_page_url = self.profile_page.format(self.uid)
-        profile_page_result = requests.get(profile_page_url, cookies=cookies)
+        profile_page_result = get_session(PLUGIN_NAME).get(profile_page_url, cookies=cookies)
         return profile_page_result.url == profile_page_url
 
     def get_cookies(self):
@@ -115,8 +116,8 @@ class RutrackerTracker(object):
         cookies = self.get_cookies()
         if not cookies:
             return None
-        r = requests.post(download_url, cookies=cookies)
-        t = Torrent(r.content)
+        r = get_session(PLUGIN_NAME).post(download_url, cookies=cookies)
+        t = Torrent(r.content, lazy=True)
         return t.info_hash
 
     def get_id(self, url):
@@ -147,6 +148,10 @@ class RutrackerPlugin(TrackerPluginWithCredentialsBase):
             'flex': 100
         }]
     }]
+    session_name = PLUGIN_NAME
+    fetch_workers = 2
+    # tracker throttles aggressive clients
+    max_connections_per_host = 1
 
     def login(self):
         with DBSession() as db:
@@ -159,7 +164,7 @@ class RutrackerPlugin(TrackerPluginWithCredentialsBase):
                 return LoginResult.CredentialsNotSpecified
         try:
             self.tracker.login(username, password)
-            with DBSession() as db:
+            with DBSession(immediate=True) as db:
                 cred = db.query(self.credentials_class).first()
                 if not cred:
                     cred = self.credentials_class()
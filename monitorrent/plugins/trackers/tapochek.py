@@ -9,7 +9,9 @@ from monitorrent.plugins import Topic
 from monitorrent.plugin_managers import register_plugin
 from monitorrent.utils.soup import get_soup
 from monitorrent.utils.bittorrent import Torrent
-from monitorrent.plugins.trackers import TrackerPluginWithCredentialsBase, LoginResult
+from monitorrent.utils.sessions import get_session
+from monitorrent.plugins.trackers import TrackerPluginWithCredentialsBase, LoginResult, DownloadUrlTrackerMixin, \
+    upgrade_download_url
 
 PLUGIN_NAME = 'tapochek.net'
 
@@ -28,12 +30,17 @@ class TapochekNetTopic(Topic):
 
     id = Column(Integer, ForeignKey('topics.id'), primary_key=True)
     hash = Column(String, nullable=True)
+    download_url = Column(String, nullable=True)
 
     __mapper_args__ = {
         'polymorphic_identity': PLUGIN_NAME
     }
 
 
+def upgrade(engine, operations_factory):
+    upgrade_download_url(engine, operations_factory, TapochekNetTopic)
+
+
 class TapochekLoginFailedException(Exception):
     def __init__(self, code, message):
         self.code = code
@@ -66,7 +73,7 @@ class TapochekNetTracker(object):
         # without slash response gets fucked up
         if not url.endswith("/"):
             url += "/"
-        r = requests.get(url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(url, allow_redirects=False)
         if r.status_code != 200:
             return None
 
@@ -100,7 +107,7 @@ class TapochekNetTracker(object):
         if not cookies:
             return False
         profile_page_url = self.profile_page.format(self.uid)
-        profile_page_result = requests.get(profile_page_url, cookies=cookies)
+        profile_page_result = get_session(PLUGIN_NAME).get(profile_page_url, cookies=cookies)
         return profile_page_result.url == profile_page_url
 
     def get_cookies(self):
@@ -115,8 +122,8 @@ class TapochekNetTracker(object):
         cookies = self.get_cookies()
         if not cookies:
             return None
-        r = requests.post(download_url, cookies=cookies)
-        t = Torrent(r.content)
+        r = get_session(PLUGIN_NAME).post(download_url, cookies=cookies)
+        t = Torrent(r.content, lazy=True)
         return t.info_hash
 
     def get_id(self, url):
@@ -128,13 +135,13 @@ class TapochekNetTracker(object):
 
     def get_download_url(self, url):
         cookies = self.get_cookies()
-        page = requests.get(url, cookies=cookies)
+        page = get_session(PLUGIN_NAME).get(url, cookies=cookies)
         page_soup = get_soup(page.content)
         download = page_soup.find("a", {"class": "genmed"})
         return "http://tapochek.net/"+download.attrs['href']
 
 
-class TapochekNetPlugin(TrackerPluginWithCredentialsBase):
+class TapochekNetPlugin(DownloadUrlTrackerMixin, TrackerPluginWithCredentialsBase):
     tracker = TapochekNetTracker()
     topic_class = TapochekNetTopic
     credentials_class = TapochekNetCredentials
@@ -147,6 +154,10 @@ class TapochekNetPlugin(TrackerPluginWithCredentialsBase):
             'flex': 100
         }]
     }]
+    session_name = PLUGIN_NAME
+    fetch_workers = 2
+    # tracker throttles aggressive clients
+    max_connections_per_host = 1
 
     def login(self):
         with DBSession() as db:
@@ -159,7 +170,7 @@ class TapochekNetPlugin(TrackerPluginWithCredentialsBase):
                 return LoginResult.CredentialsNotSpecified
         try:
             self.tracker.login(username, password)
-            with DBSession() as db:
+            with DBSession(immediate=True) as db:
                 cred = db.query(self.credentials_class).first()
                 if not cred:
                     cred = self.credentials_class()
@@ -193,12 +204,10 @@ class TapochekNetPlugin(TrackerPluginWithCredentialsBase):
     def parse_url(self, url):
         return self.tracker.parse_url(url)
 
-    # Tapochek has different ids for topic and download
-    # TODO possible performance optimization - store id for download in database
     def _prepare_request(self, topic):
         headers = {'referer': topic.url, 'host': "tapochek.net"}
         cookies = self.tracker.get_cookies()
-        request = requests.Request('GET', self.tracker.get_download_url(topic.url), headers=headers, cookies=cookies)
+        request = requests.Request('GET', topic.download_url, headers=headers, cookies=cookies)
         return request.prepare()
 
-register_plugin('tracker', PLUGIN_NAME, TapochekNetPlugin())
+register_plugin('tracker', PLUGIN_NAME, TapochekNetPlugin(), upgrade=upgrade)
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import re
 from urlparse import urlparse
-import requests
 from sqlalchemy import Column, Integer, String, MetaData, Table, ForeignKey
 from monitorrent.db import row2dict
 from monitorrent.plugin_managers import register_plugin
@@ -9,6 +8,7 @@ from monitorrent.plugins import Topic
 from monitorrent.plugins.trackers import TrackerPluginBase
 from monitorrent.utils.soup import get_soup
 from monitorrent.utils.bittorrent import Torrent
+from monitorrent.utils.sessions import get_session
 
 PLUGIN_NAME = 'unionpeer.org'
 
@@ -80,7 +80,7 @@ class UnionpeerOrgTracker(object):
         if match is None:
             return None
 
-        r = requests.get(url, allow_redirects=False)
+        r = get_session(PLUGIN_NAME).get(url, allow_redirects=False)
         if r.status_code != 200:
             return None
         soup = get_soup(r.content)
@@ -94,8 +94,8 @@ class UnionpeerOrgTracker(object):
         download_url = self.get_download_url(url)
         if not download_url:
             return None
-        r = requests.get(download_url)
-        t = Torrent(r.content)
+        r = get_session(PLUGIN_NAME).get(download_url)
+        t = Torrent(r.content, lazy=True)
         return t.info_hash
 
     def get_id(self, url):
@@ -129,6 +129,8 @@ class UnionpeerOrgPlugin(TrackerPluginBase):
             'flex': 100
         }]
     }]
+    session_name = PLUGIN_NAME
+    fetch_workers = 4
 
     def can_parse_url(self, url):
         return self.tracker.can_parse_url(url)
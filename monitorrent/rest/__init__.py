@@ -2,6 +2,7 @@ import json
 import datetime
 import falcon
 from itsdangerous import JSONWebSignatureSerializer, BadSignature
+from monitorrent.utils.lru_cache import LRUCache
 
 
 class MonitorrentJSONEncoder(json.JSONEncoder):
@@ -55,9 +56,12 @@ class AuthMiddleware(object):
     cookie_name = 'jwt'
     serializer = None
     token = None
+    # recently verified cookies -> validity, so signature isn't verified on every request
+    auth_cache = LRUCache(max_size=256, ttl=60)
 
     def process_resource(self, req, resp, resource):
-        if getattr(resource, '__no_auth__', False):
+        # sinks have no resource and check authentication themselves
+        if resource is None or getattr(resource, '__no_auth__', False):
             return
 
         if not self.validate_auth(req):
@@ -68,11 +72,14 @@ class AuthMiddleware(object):
         jwt = req.cookies.get(cls.cookie_name, None)
         if jwt is None:
             return False
-        try:
-            value = cls.serializer.loads(jwt)
-            return value == cls.token
-        except BadSignature:
-            return False
+        valid = cls.auth_cache.get(jwt)
+        if valid is None:
+            try:
+                valid = cls.serializer.loads(jwt) == cls.token
+            except BadSignature:
+                valid = False
+            cls.auth_cache.set(jwt, valid)
+        return valid
 
     @classmethod
     def authenticate(cls, resp):
@@ -81,6 +88,7 @@ class AuthMiddleware(object):
 
     @classmethod
     def logout(cls, resp):
+        cls.auth_cache.clear()
         resp.set_cookie(cls.cookie_name, "", path='/', secure=False,
                         expires=datetime.datetime.utcfromtimestamp(0))
 
@@ -88,6 +96,7 @@ class AuthMiddleware(object):
     def init(cls, secret_key, token):
         cls.serializer = JSONWebSignatureSerializer(secret_key)
         cls.token = token
+        cls.auth_cache.clear()
 
 
 def no_auth(obj):
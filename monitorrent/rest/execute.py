@@ -1,21 +1,55 @@
 import json
+import logging
+import falcon
 import threading
-from Queue import Queue, Empty
+from Queue import Queue, Empty, Full
+from collections import deque
+from datetime import datetime
 from monitorrent.engine import Logger, EngineRunner
+from monitorrent.execute_history import ExecuteHistory
+
+log = logging.getLogger('execute')
 
 
 class EngineRunnerLogger(Logger):
     """
+    Sends events of current execution to attached queues
+    and keeps last events in ring buffer shared by all Server-Sent Events subscribers.
+    Attached queue should be bounded, it is detached and closed when it is full, so slow consumer is dropped.
+
+    Events are written to history by separate thread, so execution doesn't wait for database.
+
     :type queues: list[Queue]
     """
-    queues = []
-    events = []
-    queues_lock = threading.Lock()
+    def __init__(self, buffer_size=1000, history=None, history_queue_size=10000):
+        """
+        :param buffer_size: how many last events are kept for subscribers
+        :type buffer_size: int
+        :param history: persistent store every event is written to as well
+        :type history: ExecuteHistory | None
+        :param history_queue_size: max count of events waiting to be written to history,
+                                   execution waits for history when it is reached
+        :type history_queue_size: int
+        """
+        self.history = history
+        self._history_queue = Queue(history_queue_size)
+        if history is not None:
+            writer = threading.Thread(target=self._history_writer)
+            writer.daemon = True
+            writer.start()
+        self.queues = []
+        # pairs of (event id, event)
+        self.events = deque(maxlen=buffer_size)
+        self.last_event_id = 0
+        # id of first event of current execution
+        self.execute_event_id = 1
+        self.queues_lock = threading.Condition()
 
     def started(self):
         with self.queues_lock:
-            self.events = []
+            self.execute_event_id = self.last_event_id + 1
         self._emit('started', None)
+        self._write_history('started')
 
     def finished(self, finish_time, exception):
         args = {
@@ -25,27 +59,32 @@ class EngineRunnerLogger(Logger):
         self._emit('finished', args)
         with self.queues_lock:
             for q in self.queues:
-                # close queue
-                q.put(None, False)
-            self.events = []
+                self._close(q)
+            self.execute_event_id = self.last_event_id + 1
+        self._write_history('finished', finish_time, exception)
 
-    def info(self, message):
-        self._emit_log('info', message)
+    def info(self, message, topic_id=None):
+        self._emit_log('info', message, topic_id=topic_id)
+        self._write_history('log', 'info', message, topic_id)
 
-    def failed(self, message):
-        self._emit_log('failed', message)
+    def failed(self, message, topic_id=None):
+        self._emit_log('failed', message, topic_id=topic_id)
+        self._write_history('log', 'failed', message, topic_id)
 
-    def downloaded(self, message, torrent):
-        self._emit_log('downloaded', message, size=len(torrent))
+    def downloaded(self, message, torrent, topic_id=None):
+        self._emit_log('downloaded', message, size=len(torrent), topic_id=topic_id)
+        # torrent isn't stored in history, so it isn't kept in memory by queue
+        self._write_history('log', 'downloaded', message, topic_id)
 
     def attach(self, queue):
         """
         :type queue: Queue
         """
         with self.queues_lock:
+            for event_id, e in self.events:
+                if event_id >= self.execute_event_id and not self._put(queue, e):
+                    return
             self.queues.append(queue)
-            for e in self.events:
-                queue.put(e, False)
 
     def detach(self, queue):
         """
@@ -55,28 +94,109 @@ class EngineRunnerLogger(Logger):
             if queue in self.queues:
                 self.queues.remove(queue)
 
+    def get_events(self, last_event_id, timeout):
+        """
+        Returns events after last_event_id, waits for new events if there are no such events yet
+
+        :param last_event_id: id of last event received by subscriber, None means start of current execution
+        :type last_event_id: int | None
+        :type timeout: float
+        :return: list of (event id, event) and count of events already dropped from buffer
+        :rtype: (list[(int, dict)], int)
+        """
+        with self.queues_lock:
+            if last_event_id is None or last_event_id > self.last_event_id:
+                last_event_id = self.execute_event_id - 1
+            if last_event_id == self.last_event_id:
+                self.queues_lock.wait(timeout)
+            events = [(event_id, e) for event_id, e in self.events if event_id > last_event_id]
+            first_event_id = events[0][0] if events else self.last_event_id + 1
+            return events, first_event_id - last_event_id - 1
+
     def _emit(self, event, data):
         data = {'event': event, 'data': data}
         with self.queues_lock:
-            for q in self.queues:
-                q.put(data, False)
-            self.events.append(data)
+            self.queues = [q for q in self.queues if self._put(q, data)]
+            self.last_event_id += 1
+            self.events.append((self.last_event_id, data))
+            self.queues_lock.notify_all()
 
-    def _emit_log(self, level, message, **kwargs):
+    def _emit_log(self, level, message, topic_id=None, **kwargs):
         data = {'level': level, 'message': message}
+        if topic_id is not None:
+            data['topic_id'] = topic_id
         data.update(kwargs)
         self._emit('log', data)
 
+    @classmethod
+    def _put(cls, queue, data):
+        """
+        :return: False if queue is full, such queue is closed
+        """
+        try:
+            queue.put(data, False)
+            return True
+        except Full:
+            cls._close(queue)
+            return False
+
+    @staticmethod
+    def _close(queue):
+        try:
+            queue.put(None, False)
+        except Full:
+            # consumer gets end of stream instead of events it can't read in time
+            with queue.mutex:
+                queue.queue.clear()
+            queue.put(None, False)
+
+    def wait_history(self):
+        """
+        Waits until all events are written to history
+        """
+        self._history_queue.join()
+
+    def _write_history(self, method, *args):
+        if self.history is None:
+            return
+        # time of event is taken now, writer can be far behind execution
+        self._history_queue.put((method, args, datetime.now()))
+
+    def _history_writer(self):
+        while True:
+            method, args, event_time = self._history_queue.get()
+            try:
+                getattr(self.history, method)(*args, event_time=event_time)
+            except Exception:
+                # broken history mustn't break execution
+                log.exception("Failed to write '%s' event to execute history", method)
+            finally:
+                self._history_queue.task_done()
+
 
 # noinspection PyUnusedLocal
 class ExecuteLog(object):
-    def __init__(self, logger, timeout=30):
+    """
+    Streams events of current execution,
+    with run, runs, level, topic, page or page_size parameters returns page of stored history instead.
+    Stream of client which doesn't read max_queue_size events in time is closed, :class:`ExecuteEvents`
+    should be used by new clients instead.
+    """
+    history_params = ['run', 'runs', 'level', 'topic', 'page', 'page_size']
+
+    def __init__(self, logger, timeout=30, history=None, max_page_size=500, max_queue_size=1000):
         """
         :type logger: EngineRunnerLogger
         :type timeout: int
+        :type history: ExecuteHistory | None
+        :type max_page_size: int
+        :type max_queue_size: int
         """
         self.logger = logger
         self.timeout = timeout
+        self.history = history
+        self.max_page_size = max_page_size
+        self.max_queue_size = max_queue_size
 
     def _response(self, queue):
         self.logger.attach(queue)
@@ -101,11 +221,87 @@ class ExecuteLog(object):
         finally:
             self.logger.detach(queue)
 
+    def _get_history(self, req):
+        run_id = req.get_param_as_int('run', min=1)
+        runs = req.get_param_as_int('runs', min=1)
+        topic_id = req.get_param_as_int('topic', min=1)
+        page = req.get_param_as_int('page', min=1) or 1
+        page_size = req.get_param_as_int('page_size', min=1, max=self.max_page_size) or 50
+        level = req.get_param('level')
+        if level is not None and level not in ExecuteHistory.levels:
+            raise falcon.HTTPBadRequest('WrongParameter', '"level" have to be one of {0}'
+                                        .format(', '.join(ExecuteHistory.levels)))
+        count, events = self.history.get_events(run_id, runs, level, topic_id, (page - 1) * page_size, page_size)
+        return {'count': count, 'page': page, 'page_size': page_size, 'data': events}
+
     def on_get(self, req, resp):
-        queue = Queue()
+        if self.history is not None and any(req.get_param(p) is not None for p in self.history_params):
+            resp.json = self._get_history(req)
+            return
+        queue = Queue(self.max_queue_size)
         resp.stream = self._response(queue)
 
 
+# noinspection PyUnusedLocal
+class ExecuteRuns(object):
+    """
+    Returns page of stored execution runs with counts of failed and downloaded events, newest first
+    """
+    def __init__(self, history, max_page_size=500):
+        """
+        :type history: ExecuteHistory
+        :type max_page_size: int
+        """
+        self.history = history
+        self.max_page_size = max_page_size
+
+    def on_get(self, req, resp):
+        page = req.get_param_as_int('page', min=1) or 1
+        page_size = req.get_param_as_int('page_size', min=1, max=self.max_page_size) or 50
+        count, runs = self.history.get_runs((page - 1) * page_size, page_size)
+        resp.json = {'count': count, 'page': page, 'page_size': page_size, 'data': runs}
+
+
+# noinspection PyUnusedLocal
+class ExecuteEvents(object):
+    """
+    Server-Sent Events stream of execution events, client resumes it by Last-Event-ID header.
+    Stream is closed after timeout without events and client reconnects after retry milliseconds.
+    """
+    def __init__(self, logger, timeout=30, retry=3000):
+        """
+        :type logger: EngineRunnerLogger
+        :type timeout: int
+        :type retry: int
+        """
+        self.logger = logger
+        self.timeout = timeout
+        self.retry = retry
+
+    def _response(self, last_event_id):
+        yield 'retry: {0}\n\n'.format(self.retry)
+        while True:
+            events, dropped = self.logger.get_events(last_event_id, self.timeout)
+            if not events:
+                break
+            if dropped:
+                # subscriber is too slow, it has to reload events it missed
+                yield 'event: dropped\ndata: {0}\n\n'.format(json.dumps({'count': dropped}))
+            for event_id, e in events:
+                yield 'id: {0}\nevent: {1}\ndata: {2}\n\n'.format(event_id, e['event'], json.dumps(e['data']))
+            last_event_id = events[-1][0]
+
+    def on_get(self, req, resp):
+        last_event_id = req.get_header('Last-Event-ID')
+        try:
+            last_event_id = int(last_event_id) if last_event_id is not None else None
+        except ValueError:
+            raise falcon.HTTPBadRequest('WrongParameter', 'Last-Event-ID have to be int')
+        resp.content_type = 'text/event-stream'
+        resp.set_header('Cache-Control', 'no-cache')
+        resp.stream = self._response(last_event_id)
+
+
 # noinspection PyUnusedLocal
 class ExecuteCall(object):
     def __init__(self, engine_runner):
@@ -115,4 +311,20 @@ class ExecuteCall(object):
         self.engine_runner = engine_runner
 
     def on_post(self, req, resp):
-        self.engine_runner.execute()
+        if req.json is None:
+            self.engine_runner.execute()
+            return
+        if not isinstance(req.json, dict):
+            raise falcon.HTTPBadRequest('WrongBody', 'Expecting JSON object body')
+
+        ids = req.json.get('ids', None)
+        trackers = req.json.get('trackers', None)
+        if ids is not None and (not isinstance(ids, list) or not all(isinstance(i, int) for i in ids)):
+            raise falcon.HTTPBadRequest('WrongParameter', '"ids" have to be list of int')
+        if trackers is not None and (not isinstance(trackers, list) or
+                                     not all(isinstance(t, basestring) for t in trackers)):
+            raise falcon.HTTPBadRequest('WrongParameter', '"trackers" have to be list of string')
+        if ids is None and trackers is None:
+            self.engine_runner.execute()
+        else:
+            self.engine_runner.execute(ids=ids, trackers=trackers)
@@ -1,15 +1,209 @@
+import hashlib
+import json
 import mimetypes
 import os
+import posixpath
+import threading
+from fnmatch import fnmatch
+from email.utils import formatdate, parsedate_tz, mktime_tz
 import falcon
 from monitorrent.rest import no_auth, AuthMiddleware
 
 
+class StaticFileInfo(object):
+    """
+    Metadata of static file and its precompressed siblings required to serve it
+    """
+    # precompressed siblings in order of preference
+    encodings = [('br', '.br'), ('gzip', '.gz')]
+
+    def __init__(self, path, size, modified_time, content_hash, mime_type=None, encoded_sizes=None):
+        """
+        :param encoded_sizes: sizes of precompressed siblings by encoding
+        :type encoded_sizes: dict[str, int] | None
+        """
+        self.path = path
+        self.size = size
+        self.modified_time = int(modified_time)
+        self.content_hash = content_hash
+        self.mime_type = mime_type or mimetypes.guess_type(path)[0]
+        self.last_modified = formatdate(self.modified_time, usegmt=True)
+        self.etag = '"{0}"'.format(content_hash)
+        self.encoded_sizes = encoded_sizes or dict()
+        # pairs of encoding and (path, size, etag)
+        self.encoded = {encoding: (path + extension, self.encoded_sizes[encoding],
+                                   '"{0}-{1}"'.format(content_hash, encoding))
+                        for encoding, extension in self.encodings if encoding in self.encoded_sizes}
+
+    @classmethod
+    def read(cls, path):
+        """
+        :rtype: StaticFileInfo
+        """
+        content_hash = hashlib.sha1()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(65536), ''):
+                content_hash.update(chunk)
+        modified_time = int(os.path.getmtime(path))
+        encoded_sizes = dict()
+        for encoding, extension in cls.encodings:
+            if os.path.isfile(path + extension):
+                stat = os.stat(path + extension)
+                # sibling compressed before file was changed doesn't match it, so it isn't served
+                if int(stat.st_mtime) >= modified_time:
+                    encoded_sizes[encoding] = stat.st_size
+        return cls(path, os.path.getsize(path), modified_time, content_hash.hexdigest(),
+                   encoded_sizes=encoded_sizes)
+
+    def is_actual(self):
+        """
+        :return: False if file or its precompressed siblings were changed after metadata was read
+        """
+        try:
+            stat = os.stat(self.path)
+            if stat.st_size != self.size or int(stat.st_mtime) != self.modified_time:
+                return False
+            for path, size, _ in self.encoded.values():
+                stat = os.stat(path)
+                if stat.st_size != size or int(stat.st_mtime) < self.modified_time:
+                    return False
+            return True
+        except OSError:
+            return False
+
+    def to_dict(self):
+        return {'size': self.size, 'mtime': self.modified_time, 'hash': self.content_hash,
+                'mime': self.mime_type, 'encoded': self.encoded_sizes}
+
+
+class StaticFilesIndex(object):
+    """
+    In-memory index of static files metadata by path relative to folder, so it isn't read on every request.
+
+    Index is built from manifest (path -> size, mtime, hash, mime and precompressed siblings sizes)
+    written at build time or on first start, so files aren't hashed on every start.
+    """
+    manifest_name = '.manifest.json'
+
+    def __init__(self, folder):
+        self.folder = os.path.realpath(folder)
+        self._files = dict()
+        self._lock = threading.Lock()
+
+    def build(self):
+        """
+        Reads metadata of all files in folder, precompressed files are indexed as siblings only
+        """
+        files = dict()
+        for d, dirnames, filenames in os.walk(self.folder):
+            for filename in filenames:
+                if filename == self.manifest_name or \
+                        any(filename.endswith(extension) for _, extension in StaticFileInfo.encodings):
+                    continue
+                path = os.path.join(d, filename)
+                files[self._get_key(path)] = StaticFileInfo.read(path)
+        with self._lock:
+            self._files = files
+
+    def load(self, manifest_path):
+        """
+        Reads metadata from manifest, files changed after manifest was written are read again
+        """
+        with open(manifest_path, 'rb') as f:
+            manifest = json.load(f)
+        files = dict()
+        for key, entry in manifest.items():
+            path = os.path.join(self.folder, *key.split('/'))
+            info = StaticFileInfo(path, entry['size'], entry['mtime'], entry['hash'], entry.get('mime'),
+                                  entry.get('encoded'))
+            if not info.is_actual():
+                if not os.path.isfile(path):
+                    continue
+                info = StaticFileInfo.read(path)
+            files[key] = info
+        with self._lock:
+            self._files = files
+
+    def save(self, manifest_path):
+        with self._lock:
+            manifest = {key: info.to_dict() for key, info in self._files.items()}
+        with open(manifest_path, 'wb') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+
+    def load_or_build(self, manifest_path=None):
+        """
+        Loads manifest if it exists, otherwise builds index and caches it in manifest
+        """
+        manifest_path = manifest_path or os.path.join(self.folder, self.manifest_name)
+        if os.path.isfile(manifest_path):
+            try:
+                self.load(manifest_path)
+                return
+            except (IOError, ValueError, KeyError):
+                pass
+        self.build()
+        try:
+            self.save(manifest_path)
+        except IOError:
+            # read-only installation, index is built again on next start
+            pass
+
+    @staticmethod
+    def get_key(path):
+        """
+        :param path: path relative to index folder
+        :return: normalized path used as key of index or None if path has '..' segments
+        :rtype: str | None
+        """
+        path = path.replace(os.path.sep, '/')
+        if '..' in path.split('/'):
+            return None
+        return posixpath.normpath(path).lstrip('/')
+
+    def get(self, path):
+        """
+        :param path: path relative to index folder
+        :return: metadata of file, files added or changed after build are indexed again on request
+        :rtype: StaticFileInfo | None
+        """
+        key = self.get_key(path)
+        if key is None:
+            return None
+        with self._lock:
+            info = self._files.get(key)
+        if info is not None and info.is_actual():
+            return info
+        file_path = os.path.realpath(os.path.join(self.folder, *key.split('/')))
+        if not file_path.startswith(self.folder + os.path.sep) or not os.path.isfile(file_path) or \
+                os.path.basename(file_path) == self.manifest_name:
+            if info is not None:
+                with self._lock:
+                    self._files.pop(key, None)
+            return None
+        info = StaticFileInfo.read(file_path)
+        with self._lock:
+            self._files[key] = info
+        return info
+
+    def clear(self):
+        with self._lock:
+            self._files.clear()
+
+    def _get_key(self, path):
+        return os.path.relpath(path, self.folder).replace(os.path.sep, '/')
+
+
 @no_auth
 class StaticFiles(object):
-    def __init__(self, folder=None, filename=None, redirect_to_login=True):
+    def __init__(self, folder=None, filename=None, redirect_to_login=True, index=None):
+        """
+        :param index: metadata index, files are served with caching headers and precompressed siblings if specified
+        :type index: StaticFilesIndex | None
+        """
         self.folder = folder
         self.filename = filename
         self.redirect_to_login = redirect_to_login
+        self.index = index
 
     def on_get(self, req, resp, filename=None):
         if self.redirect_to_login and not AuthMiddleware.validate_auth(req):
@@ -20,7 +214,101 @@ class StaticFiles(object):
         file_path = filename or self.filename
         if self.folder:
             file_path = os.path.join(self.folder, file_path)
+        if self.index is not None:
+            info = self.index.get(os.path.relpath(os.path.realpath(file_path), self.index.folder))
+            if info is None:
+                raise falcon.HTTPNotFound()
+            self.send(req, resp, info)
+            return
         mime_type, encoding = mimetypes.guess_type(file_path)
         resp.content_type = mime_type
         resp.stream_len = os.path.getsize(file_path)
         resp.stream = open(file_path, mode='rb')
+
+    @classmethod
+    def send(cls, req, resp, info):
+        """
+        Sends file with caching headers, answers 304 if client has actual version
+
+        :type info: StaticFileInfo
+        """
+        path, size, etag = info.path, info.size, info.etag
+        encoding = cls._get_encoding(req, info)
+        if encoding is not None:
+            path, size, etag = info.encoded[encoding]
+            resp.set_header('Content-Encoding', encoding)
+        if info.encoded:
+            resp.set_header('Vary', 'Accept-Encoding')
+        resp.set_header('ETag', etag)
+        resp.set_header('Last-Modified', info.last_modified)
+        resp.set_header('Cache-Control', 'no-cache')
+        resp.content_type = info.mime_type
+
+        if cls._not_modified(req, info, etag):
+            resp.status = falcon.HTTP_NOT_MODIFIED
+            return
+        f = open(path, mode='rb')
+        # size of opened file, so length is right even if file was replaced after it was indexed
+        resp.stream_len = os.fstat(f.fileno()).st_size
+        resp.stream = f
+
+    @staticmethod
+    def _get_encoding(req, info):
+        if not info.encoded:
+            return None
+        accepted = set()
+        for value in (req.get_header('Accept-Encoding') or '').split(','):
+            parts = [p.strip() for p in value.split(';')]
+            if any(p.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000') for p in parts[1:]):
+                continue
+            accepted.add(parts[0].lower())
+        for encoding, _ in StaticFileInfo.encodings:
+            if encoding in info.encoded and encoding in accepted:
+                return encoding
+        return None
+
+    @staticmethod
+    def _not_modified(req, info, etag):
+        if_none_match = req.get_header('If-None-Match')
+        if if_none_match is not None:
+            # weak comparison is used for If-None-Match
+            etags = [e.strip() for e in if_none_match.split(',')]
+            return '*' in etags or any((e[2:] if e.startswith('W/') else e) == etag for e in etags)
+        if_modified_since = req.get_header('If-Modified-Since')
+        if if_modified_since is not None:
+            parsed = parsedate_tz(if_modified_since)
+            return parsed is not None and mktime_tz(parsed) >= info.modified_time
+        return False
+
+
+class StaticFilesSink(object):
+    """
+    Single handler of all static files registered by :meth:`falcon.API.add_sink`,
+    public files are served without authentication, others require it like :class:`StaticFiles`
+    """
+    def __init__(self, index, public=None, login_url='/login'):
+        """
+        :type index: StaticFilesIndex
+        :param public: patterns of files paths which don't require authentication
+        :type public: list[str] | None
+        """
+        self.index = index
+        self.public = public if public is not None else ['login.html', 'favicon.ico', 'styles/*']
+        self.login_url = login_url
+
+    def __call__(self, req, resp, **kwargs):
+        if req.method != 'GET':
+            raise falcon.HTTPMethodNotAllowed(['GET'])
+        # the same normalized path is checked and served, so public pattern can't be bypassed by '..'
+        key = self.index.get_key(req.path)
+        info = self.index.get(key) if key is not None else None
+        if info is None:
+            raise falcon.HTTPNotFound()
+        if not self.is_public(key) and not AuthMiddleware.validate_auth(req):
+            resp.status = falcon.HTTP_FOUND
+            resp.location = self.login_url
+            return
+        StaticFiles.send(req, resp, info)
+
+    def is_public(self, path):
+        return any(fnmatch(path, pattern) for pattern in self.public)
@@ -0,0 +1,96 @@
+import heapq
+from datetime import datetime, timedelta
+from sqlalchemy import bindparam
+from monitorrent.db import DBSession
+from monitorrent.plugins import Topic
+
+
+class TopicScheduler(object):
+    """
+    Schedules check of every topic separately by next_check time stored in topic.
+
+    Check interval of topic adapts to how long ago topic was changed last time:
+    recently changed (active) topics are checked more often than configured interval down to min_interval,
+    topics without changes for a long time are backed off up to max_interval.
+    """
+    def __init__(self, min_interval=timedelta(minutes=30), max_interval=timedelta(days=7), change_ratio=0.1,
+                 batch_window=timedelta(minutes=5)):
+        """
+        :param min_interval: min interval between checks of one topic
+        :type min_interval: timedelta
+        :param max_interval: max interval between checks of one topic
+        :type max_interval: timedelta
+        :param change_ratio: part of time since last change used as check interval
+        :type change_ratio: float
+        :param batch_window: topics scheduled in this window are checked together
+        :type batch_window: timedelta
+        """
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.change_ratio = change_ratio
+        self.batch_window = batch_window
+        self._heap = []
+
+    def load(self):
+        """
+        Rebuilds heap from database, so added and removed topics are picked up.
+        Topics without next_check are due immediately
+        """
+        with DBSession() as db:
+            heap = [(next_check or datetime.min, topic_id)
+                    for topic_id, next_check in db.query(Topic.id, Topic.next_check)]
+        heapq.heapify(heap)
+        self._heap = heap
+
+    def get_next_check(self):
+        """
+        :rtype: datetime | None
+        """
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """
+        :type now: datetime
+        :return: ids of topics which have to be checked now
+        :rtype: list[int]
+        """
+        due_time = now + self.batch_window
+        ids = []
+        while self._heap and self._heap[0][0] <= due_time:
+            ids.append(heapq.heappop(self._heap)[1])
+        return ids
+
+    def get_interval(self, last_update, interval, now):
+        """
+        :param interval: configured interval, used for topics which were never changed
+        :type last_update: datetime | None
+        :type interval: timedelta
+        :type now: datetime
+        :rtype: timedelta
+        """
+        if last_update is None:
+            return interval
+        interval = timedelta(seconds=(now - last_update).total_seconds() * self.change_ratio)
+        return max(self.min_interval, min(interval, self.max_interval))
+
+    def reschedule(self, interval, now, ids=None, trackers=None):
+        """
+        Calculates next check time for checked topics, all topics are rescheduled by default
+
+        :type interval: timedelta
+        :type now: datetime
+        :type ids: list[int] | None
+        :type trackers: list[str] | None
+        """
+        topics = Topic.__table__
+        with DBSession(immediate=True) as db:
+            query = db.query(topics.c.id, topics.c.last_update)
+            if ids is not None or trackers is not None:
+                query = query.filter(topics.c.id.in_(ids or []) | topics.c.type.in_(trackers or []))
+            values = [{'topic_id': topic_id, 'next_check': now + self.get_interval(last_update, interval, now)}
+                      for topic_id, last_update in query]
+            if not values:
+                return
+            db.execute(topics.update()
+                       .where(topics.c.id == bindparam('topic_id'))
+                       .values(next_check=bindparam('next_check')), values)
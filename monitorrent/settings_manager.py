@@ -1,5 +1,6 @@
 from sqlalchemy import Column, Integer, String
 from monitorrent.db import DBSession, Base, get_engine
+from monitorrent.utils.settings_cache import SettingsCache
 
 
 class Settings(Base):
@@ -14,39 +15,26 @@ class SettingsManager(object):
     __password_settings_name = "monitorrent.password"
     __enable_authentication_settings_name = "monitorrent.is_authentication_enabled"
 
+    def __init__(self):
+        self._cache = SettingsCache()
+
     def get_password(self):
-        self.init_settings()
-        with DBSession() as db:
-            setting = db.query(Settings).filter(Settings.name == self.__password_settings_name).first()
-            if not setting:
-                return None
-            return setting.value
+        return self._cache.get(self.__password_settings_name, self._load_password)
 
     def set_password(self, value):
-        self.init_settings()
-        with DBSession() as db:
-            setting = db.query(Settings).filter(Settings.name == self.__password_settings_name).first()
-            if not setting:
-                setting = Settings(name=self.__password_settings_name)
-                db.add(setting)
-            setting.value = value
+        self._cache.set(self.__password_settings_name, value,
+                        lambda v: self._save_setting(self.__password_settings_name, v))
 
     def get_is_authentication_enabled(self):
-        self.init_settings()
-        with DBSession() as db:
-            setting = db.query(Settings).filter(Settings.name == self.__enable_authentication_settings_name).first()
-            if not setting:
-                return True
-            return setting.value == "True"
+        value = self._cache.get(self.__enable_authentication_settings_name,
+                                lambda: self._load_setting(self.__enable_authentication_settings_name))
+        if value is None:
+            return True
+        return value == "True"
 
     def set_is_authentication_enabled(self, value):
-        self.init_settings()
-        with DBSession() as db:
-            setting = db.query(Settings).filter(Settings.name == self.__enable_authentication_settings_name).first()
-            if not setting:
-                setting = Settings(name=self.__enable_authentication_settings_name)
-                db.add(setting)
-            setting.value = str(value)
+        self._cache.set(self.__enable_authentication_settings_name, str(value),
+                        lambda v: self._save_setting(self.__enable_authentication_settings_name, v))
 
     def enable_authentication(self):
         self.set_is_authentication_enabled(False)
@@ -61,3 +49,24 @@ class SettingsManager(object):
             if not setting:
                 setting = Settings(name=self.__password_settings_name, value='monitorrent')
                 db.add(setting)
+
+    def _load_password(self):
+        self.init_settings()
+        return self._load_setting(self.__password_settings_name)
+
+    @staticmethod
+    def _load_setting(name):
+        with DBSession() as db:
+            setting = db.query(Settings).filter(Settings.name == name).first()
+            if not setting:
+                return None
+            return setting.value
+
+    def _save_setting(self, name, value):
+        self.init_settings()
+        with DBSession() as db:
+            setting = db.query(Settings).filter(Settings.name == name).first()
+            if not setting:
+                setting = Settings(name=name)
+                db.add(setting)
+            setting.value = value
@@ -10,6 +10,7 @@ from monitorrent.db import init_db_engine, create_db, close_db, DBSession, get_e
     MigrationContext
 from monitorrent.plugins.trackers import Topic
 from monitorrent.rest import create_api, AuthMiddleware
+from monitorrent.utils.sessions import sessions
 from falcon.testing import TestBase
 
 test_vcr = vcr.VCR(
@@ -27,7 +28,16 @@ def use_vcr(func=None, **kwargs):
         class_name = inspect.stack()[1][3]
         cassette_name = '.'.join([module, class_name, func.__name__])
         kwargs.setdefault('path', cassette_name)
-    return test_vcr.use_cassette(**kwargs)(func)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kw):
+        # pooled connections can't be shared between cassettes
+        sessions.close()
+        try:
+            return func(*args, **kw)
+        finally:
+            sessions.close()
+    return test_vcr.use_cassette(**kwargs)(wrapper)
 
 
 class DbTestCase(TestCase):
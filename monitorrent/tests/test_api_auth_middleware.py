@@ -1,4 +1,5 @@
 import falcon
+from mock import patch
 from falcon.testing import TestResource
 from monitorrent.tests import RestTestBase
 from monitorrent.rest import no_auth, AuthMiddleware
@@ -7,6 +8,7 @@ from monitorrent.rest import no_auth, AuthMiddleware
 class TestAuthMiddleware(RestTestBase):
     def setUp(self, disable_auth=False):
         super(TestAuthMiddleware, self).setUp(disable_auth)
+        AuthMiddleware.auth_cache.clear()
 
     def test_auth_success(self):
         self.api.add_route(self.test_route, TestResource())
@@ -48,3 +50,34 @@ class TestAuthMiddleware(RestTestBase):
 
         self.simulate_request(self.test_route, headers={'Cookie': 'jwt=random; HttpOnly; Path=/'})
         self.assertEqual(falcon.HTTP_UNAUTHORIZED, self.srmock.status)
+
+    def test_auth_cached(self):
+        self.api.add_route(self.test_route, TestResource())
+
+        with patch.object(AuthMiddleware, 'serializer', wraps=AuthMiddleware.serializer) as serializer:
+            self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie()})
+            self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie()})
+            self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie(True)})
+            self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie(True)})
+
+        self.assertEqual(falcon.HTTP_UNAUTHORIZED, self.srmock.status)
+        self.assertEqual(2, serializer.loads.call_count)
+
+    def test_auth_cache_cleared_on_init(self):
+        self.api.add_route(self.test_route, TestResource())
+        self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie()})
+        self.assertEqual(falcon.HTTP_OK, self.srmock.status)
+
+        try:
+            AuthMiddleware.init('other secret!', 'monitorrent')
+            self.simulate_request(self.test_route, headers={'Cookie': self.get_cookie()})
+            self.assertEqual(falcon.HTTP_UNAUTHORIZED, self.srmock.status)
+        finally:
+            AuthMiddleware.init('secret!', 'monitorrent')
+
+    def test_auth_cache_cleared_on_logout(self):
+        AuthMiddleware.auth_cache.set('jwt', True)
+
+        AuthMiddleware.logout(falcon.Response())
+
+        self.assertEqual(0, len(AuthMiddleware.auth_cache))
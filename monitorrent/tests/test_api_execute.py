@@ -3,9 +3,10 @@ import falcon
 from datetime import datetime
 from Queue import Queue
 from unittest import TestCase
-from mock import MagicMock, Mock
+from mock import MagicMock, Mock, ANY, patch
+from ddt import ddt, data
 from monitorrent.tests import RestTestBase
-from monitorrent.rest.execute import ExecuteLog, EngineRunnerLogger, ExecuteCall
+from monitorrent.rest.execute import ExecuteLog, ExecuteRuns, ExecuteEvents, EngineRunnerLogger, ExecuteCall
 
 
 class ExecuteLogTest(RestTestBase):
@@ -87,9 +88,103 @@ class ExecuteLogTest(RestTestBase):
         return attach_mock, detach_mock, logger
 
 
+class ExecuteEventsTest(RestTestBase):
+    def setUp(self, disable_auth=True):
+        super(ExecuteEventsTest, self).setUp(disable_auth)
+        self.logger = EngineRunnerLogger(buffer_size=3)
+        self.api.add_route(self.test_route, ExecuteEvents(self.logger, timeout=0.1))
+
+    def test_events(self):
+        self.logger.started()
+        self.logger.info('Info')
+
+        body = ''.join(self.simulate_request(self.test_route))
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('text/event-stream', self.srmock.headers_dict['Content-Type'])
+        self.assertEqual('retry: 3000\n\n'
+                         'id: 1\nevent: started\ndata: null\n\n'
+                         'id: 2\nevent: log\ndata: {"message": "Info", "level": "info"}\n\n', body)
+
+    def test_resume(self):
+        self.logger.started()
+        self.logger.info('Info 1')
+        self.logger.info('Info 2')
+
+        body = ''.join(self.simulate_request(self.test_route, headers={'Last-Event-ID': '2'}))
+
+        self.assertNotIn('id: 2\n', body)
+        self.assertIn('id: 3\nevent: log\n', body)
+
+    def test_dropped(self):
+        self.logger.started()
+        for i in range(4):
+            self.logger.info('Info {0}'.format(i))
+
+        body = ''.join(self.simulate_request(self.test_route, headers={'Last-Event-ID': '1'}))
+
+        self.assertIn('event: dropped\ndata: {"count": 1}\n\n', body)
+        self.assertEqual(['3', '4', '5'], [l[4:] for l in body.split('\n') if l.startswith('id: ')])
+
+    def test_wrong_last_event_id(self):
+        self.simulate_request(self.test_route, headers={'Last-Event-ID': 'last'})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_BAD_REQUEST)
+
+
+@ddt
+class ExecuteLogHistoryTest(RestTestBase):
+    def setUp(self, disable_auth=True):
+        super(ExecuteLogHistoryTest, self).setUp(disable_auth)
+        self.history = Mock()
+        self.history.get_events = Mock(return_value=(1, [{'id': 1, 'level': 'failed'}]))
+        self.api.add_route(self.test_route, ExecuteLog(EngineRunnerLogger(), history=self.history))
+
+    def test_get_history(self):
+        body = self.simulate_request(self.test_route, query_string='runs=30&level=failed&page=2&page_size=10',
+                                     decode='utf-8')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual({'count': 1, 'page': 2, 'page_size': 10, 'data': [{'id': 1, 'level': 'failed'}]},
+                         json.loads(body))
+        self.history.get_events.assert_called_once_with(None, 30, 'failed', None, 10, 10)
+
+    @data('level=debug', 'run=first', 'page=0', 'page_size=100000')
+    def test_get_history_wrong_parameters(self, query_string):
+        self.simulate_request(self.test_route, query_string=query_string)
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_BAD_REQUEST)
+        self.assertFalse(self.history.get_events.called)
+
+
+@ddt
+class ExecuteRunsTest(RestTestBase):
+    def setUp(self, disable_auth=True):
+        super(ExecuteRunsTest, self).setUp(disable_auth)
+        self.history = Mock()
+        self.history.get_runs = Mock(return_value=(1, [{'id': 1, 'failed': 2, 'downloaded': 1}]))
+        self.api.add_route(self.test_route, ExecuteRuns(self.history))
+
+    def test_get_runs(self):
+        body = self.simulate_request(self.test_route, query_string='page=2&page_size=10', decode='utf-8')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual({'count': 1, 'page': 2, 'page_size': 10, 'data': [{'id': 1, 'failed': 2, 'downloaded': 1}]},
+                         json.loads(body))
+        self.history.get_runs.assert_called_once_with(10, 10)
+
+    @data('page=0', 'page_size=100000')
+    def test_get_runs_wrong_parameters(self, query_string):
+        self.simulate_request(self.test_route, query_string=query_string)
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_BAD_REQUEST)
+        self.assertFalse(self.history.get_runs.called)
+
+
+@ddt
 class ExecuteCallTest(RestTestBase):
     def test_execute(self):
-        engine_runner = Mock
+        engine_runner = Mock()
         engine_runner.execute = MagicMock()
         # noinspection PyTypeChecker
         execute_call = ExecuteCall(engine_runner)
@@ -102,6 +197,33 @@ class ExecuteCallTest(RestTestBase):
 
         engine_runner.execute.assert_called_once_with()
 
+    def test_execute_targeted(self):
+        engine_runner = Mock()
+        # noinspection PyTypeChecker
+        execute_call = ExecuteCall(engine_runner)
+
+        self.api.add_route(self.test_route, execute_call)
+
+        body = {'ids': [1, 2], 'trackers': ['rutor.org']}
+        self.simulate_request(self.test_route, method="POST", body=json.dumps(body))
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+
+        engine_runner.execute.assert_called_once_with(ids=[1, 2], trackers=['rutor.org'])
+
+    @data({'ids': 1}, {'ids': ['1']}, {'trackers': 'rutor.org'}, {'trackers': [1]}, [1, 2], 1, 'rutor.org')
+    def test_execute_targeted_wrong_parameters(self, body):
+        engine_runner = Mock()
+        # noinspection PyTypeChecker
+        execute_call = ExecuteCall(engine_runner)
+
+        self.api.add_route(self.test_route, execute_call)
+
+        self.simulate_request(self.test_route, method="POST", body=json.dumps(body))
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_BAD_REQUEST)
+        self.assertFalse(engine_runner.execute.called)
+
 
 class EngineRunnerLoggerTest(TestCase):
     def test_single_queue_items(self):
@@ -157,6 +279,72 @@ class EngineRunnerLoggerTest(TestCase):
         assert_events(self._read_from_queue(queue1))
         assert_events(self._read_from_queue(queue2))
 
+    def test_drop_slow_queue(self):
+        logger = EngineRunnerLogger()
+        slow_queue = Queue(2)
+        queue = Queue()
+        logger.attach(slow_queue)
+        logger.attach(queue)
+
+        logger.started()
+        logger.info('Info')
+        logger.failed('Failed')
+        logger.finished(datetime.now(), None)
+
+        # slow queue is closed and detached, other queue gets all events
+        self.assertEqual([queue], logger.queues)
+        self.assertEqual([], self._read_from_queue(slow_queue))
+        self.assertEqual(4, len(self._read_from_queue(queue)))
+
+    def test_attach_slow_queue(self):
+        logger = EngineRunnerLogger()
+        logger.started()
+        logger.info('Info')
+
+        queue = Queue(1)
+        logger.attach(queue)
+
+        self.assertEqual([], logger.queues)
+        self.assertEqual([], self._read_from_queue(queue))
+
+    def test_buffer_size(self):
+        logger = EngineRunnerLogger(buffer_size=2)
+
+        logger.started()
+        logger.info('Info')
+        logger.failed('Failed')
+
+        self.assertEqual(2, len(logger.events))
+        self.assertEqual(3, logger.last_event_id)
+
+    def test_get_events_after_finished(self):
+        logger = EngineRunnerLogger()
+        logger.started()
+        logger.finished(datetime.now(), None)
+
+        self.assertEqual(([], 0), logger.get_events(None, 0))
+        events, dropped = logger.get_events(0, 0)
+        self.assertEqual(['started', 'finished'], [e['event'] for _, e in events])
+
+    @patch('monitorrent.rest.execute.log')
+    def test_history(self, log):
+        history = Mock()
+        history.started = Mock(side_effect=Exception('Database error'))
+        logger = EngineRunnerLogger(history=history)
+
+        logger.started()
+        logger.failed('Failed', topic_id=1)
+        finish_time = datetime.now()
+        logger.finished(finish_time, None)
+        logger.wait_history()
+
+        # failure of history is logged and doesn't break execution
+        self.assertEqual(1, log.exception.call_count)
+        history.log.assert_called_once_with('failed', 'Failed', 1, event_time=ANY)
+        # time of event is taken when it is logged
+        self.assertLessEqual(history.log.call_args[1]['event_time'], finish_time)
+        history.finished.assert_called_once_with(finish_time, None, event_time=ANY)
+        self.assertEqual({'level': 'failed', 'message': 'Failed', 'topic_id': 1}, logger.events[1][1]['data'])
 
     @staticmethod
     def _read_from_queue(queue):
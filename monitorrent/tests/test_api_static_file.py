@@ -1,8 +1,12 @@
 # coding=utf-8
+import mimetypes
+import os
+import shutil
+import tempfile
 import falcon
 from ddt import ddt, data
 from mock import patch, mock_open, MagicMock
-from monitorrent.rest.static_file import StaticFiles
+from monitorrent.rest.static_file import StaticFiles, StaticFilesIndex, StaticFilesSink, StaticFileInfo
 from monitorrent.tests import RestTestBase
 
 
@@ -36,3 +40,216 @@ class TestStaticFiles(RestTestBase):
             self.simulate_request('/index.html')
             self.assertEqual(self.srmock.status, falcon.HTTP_FOUND)
             self.assertEqual('/login', self.srmock.headers_dict['location'])
+
+
+@ddt
+class TestIndexedStaticFiles(RestTestBase):
+    def setUp(self, disable_auth=True):
+        super(TestIndexedStaticFiles, self).setUp(disable_auth)
+        self.folder = tempfile.mkdtemp()
+        self._write('monitorrent.js', 'var a = 1;')
+        self._write('monitorrent.js.gz', 'gzip')
+        self._write('monitorrent.js.br', 'brotli')
+        self._write('monitorrent.3f2a9c1d.css', 'body {}')
+        self.index = StaticFilesIndex(self.folder)
+        self.index.build()
+        self.api.add_route('/{filename}', StaticFiles(self.folder, redirect_to_login=False, index=self.index))
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super(TestIndexedStaticFiles, self).tearDown()
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.folder, filename), 'wb') as f:
+            f.write(content)
+
+    def _get(self, filename, headers=None):
+        body = self.simulate_request('/' + filename, headers=headers or {})
+        return ''.join(body)
+
+    def test_etag(self):
+        body = self._get('monitorrent.js')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('var a = 1;', body)
+        self.assertEqual(mimetypes.guess_type('monitorrent.js')[0], self.srmock.headers_dict['content-type'])
+        self.assertEqual('no-cache', self.srmock.headers_dict['cache-control'])
+        self.assertEqual('Accept-Encoding', self.srmock.headers_dict['vary'])
+        self.assertIn('last-modified', self.srmock.headers_dict)
+        etag = self.srmock.headers_dict['etag']
+
+        body = self._get('monitorrent.js', {'If-None-Match': etag})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_NOT_MODIFIED)
+        self.assertEqual('', body)
+
+    def test_etag_changed(self):
+        body = self._get('monitorrent.js', {'If-None-Match': '"other", W/"1234"'})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('var a = 1;', body)
+
+    def test_if_modified_since(self):
+        self._get('monitorrent.js', {'If-Modified-Since': 'Thu, 01 Jan 2099 00:00:00 GMT'})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_NOT_MODIFIED)
+
+    @data(('gzip, deflate', 'gzip', 'gzip'),
+          ('gzip, deflate, br', 'br', 'brotli'),
+          ('gzip;q=1, br;q=0', 'gzip', 'gzip'),
+          ('deflate', None, 'var a = 1;'))
+    def test_encoding(self, value):
+        accept_encoding, encoding, content = value
+        body = self._get('monitorrent.js', {'Accept-Encoding': accept_encoding})
+
+        self.assertEqual(content, body)
+        self.assertEqual(encoding, self.srmock.headers_dict.get('content-encoding'))
+        self.assertEqual(mimetypes.guess_type('monitorrent.js')[0], self.srmock.headers_dict['content-type'])
+
+    def test_encoding_etag(self):
+        self._get('monitorrent.js')
+        etag = self.srmock.headers_dict['etag']
+        self._get('monitorrent.js', {'Accept-Encoding': 'gzip'})
+        gzip_etag = self.srmock.headers_dict['etag']
+
+        self.assertNotEqual(etag, gzip_etag)
+
+        self._get('monitorrent.js', {'Accept-Encoding': 'gzip', 'If-None-Match': etag})
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+
+    def test_without_encoded(self):
+        self._get('monitorrent.3f2a9c1d.css')
+
+        self.assertEqual('no-cache', self.srmock.headers_dict['cache-control'])
+        self.assertNotIn('vary', self.srmock.headers_dict)
+
+    def test_file_changed_after_build(self):
+        self._get('monitorrent.js')
+        etag = self.srmock.headers_dict['etag']
+        self._write('monitorrent.js', 'var a = 2; // changed')
+        self._write('monitorrent.js.gz', 'gzip changed')
+
+        body = self._get('monitorrent.js', {'If-None-Match': etag})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('var a = 2; // changed', body)
+        self.assertEqual(str(len(body)), self.srmock.headers_dict['content-length'])
+        self.assertNotEqual(etag, self.srmock.headers_dict['etag'])
+
+        body = self._get('monitorrent.js', {'Accept-Encoding': 'gzip'})
+
+        self.assertEqual('gzip changed', body)
+        self.assertEqual(str(len(body)), self.srmock.headers_dict['content-length'])
+
+    def test_stale_encoded_after_build(self):
+        self._get('monitorrent.js')
+        path = os.path.join(self.folder, 'monitorrent.js')
+        self._write('monitorrent.js', 'var a = 2;')
+        # siblings of the same size weren't compressed again after change
+        modified_time = os.path.getmtime(path) + 10
+        os.utime(path, (modified_time, modified_time))
+
+        body = self._get('monitorrent.js', {'Accept-Encoding': 'gzip, br'})
+
+        self.assertEqual('var a = 2;', body)
+        self.assertNotIn('content-encoding', self.srmock.headers_dict)
+
+    def test_file_removed_after_build(self):
+        os.remove(os.path.join(self.folder, 'monitorrent.3f2a9c1d.css'))
+
+        self._get('monitorrent.3f2a9c1d.css')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_NOT_FOUND)
+
+    def test_not_found(self):
+        self._get('other.js')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_NOT_FOUND)
+
+    def test_file_added_after_build(self):
+        self._write('other.js', 'var b = 2;')
+
+        body = self._get('other.js')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('var b = 2;', body)
+
+
+class TestStaticFilesSink(RestTestBase):
+    def setUp(self, disable_auth=False):
+        super(TestStaticFilesSink, self).setUp(disable_auth)
+        self.folder = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.folder, 'scripts'))
+        os.mkdir(os.path.join(self.folder, 'styles'))
+        self._write('login.html', '<HTML>Login</HTML>')
+        self._write('index.html', '<HTML>Index</HTML>')
+        self._write('scripts/monitorrent.js', 'var a = 1;')
+        self._write('styles/monitorrent.css', 'body {}')
+        self.index = StaticFilesIndex(self.folder)
+        self.index.load_or_build()
+        self.api.add_sink(StaticFilesSink(self.index, public=['login.html', 'styles/*']), '/')
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+        super(TestStaticFilesSink, self).tearDown()
+
+    def _write(self, filename, content):
+        with open(os.path.join(self.folder, filename), 'wb') as f:
+            f.write(content)
+
+    def test_public(self):
+        body = self.simulate_request('/login.html')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('<HTML>Login</HTML>', ''.join(body))
+
+    def test_private(self):
+        body = self.simulate_request('/scripts/monitorrent.js', headers={'Cookie': self.get_cookie()})
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('var a = 1;', ''.join(body))
+
+    def test_private_redirect_to_login(self):
+        self.simulate_request('/scripts/monitorrent.js')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_FOUND)
+        self.assertEqual('/login', self.srmock.headers_dict['location'])
+
+    def test_public_pattern_bypass(self):
+        for path in ['/styles/../index.html', '/styles/../scripts/monitorrent.js']:
+            body = self.simulate_request(path)
+
+            self.assertEqual(self.srmock.status, falcon.HTTP_NOT_FOUND)
+            self.assertNotIn('Index', ''.join(body))
+
+        body = self.simulate_request('/styles//monitorrent.css')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_OK)
+        self.assertEqual('body {}', ''.join(body))
+
+    def test_not_found(self):
+        for path in ['/scripts/other.js', '/../' + os.path.basename(self.folder) + '/login.html', '/../etc/passwd',
+                     '/' + StaticFilesIndex.manifest_name]:
+            self.simulate_request(path, headers={'Cookie': self.get_cookie()})
+
+            self.assertEqual(self.srmock.status, falcon.HTTP_NOT_FOUND)
+
+    def test_method_not_allowed(self):
+        self.simulate_request('/login.html', method='POST')
+
+        self.assertEqual(self.srmock.status, falcon.HTTP_METHOD_NOT_ALLOWED)
+
+    def test_manifest(self):
+        manifest_path = os.path.join(self.folder, StaticFilesIndex.manifest_name)
+        self.assertTrue(os.path.isfile(manifest_path))
+        etag = self.index.get('scripts/monitorrent.js').etag
+        self._write('scripts/monitorrent.js', 'var a = 2; // changed')
+
+        index = StaticFilesIndex(self.folder)
+        with patch('monitorrent.rest.static_file.StaticFileInfo.read', wraps=StaticFileInfo.read) as read:
+            index.load_or_build()
+
+        # only changed file is read again
+        read.assert_called_once_with(os.path.join(index.folder, 'scripts', 'monitorrent.js'))
+        self.assertEqual(self.index.get('login.html').etag, index.get('login.html').etag)
+        self.assertNotEqual(etag, index.get('scripts/monitorrent.js').etag)
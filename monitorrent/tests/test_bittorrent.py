@@ -0,0 +1,72 @@
+import hashlib
+from unittest import TestCase
+from ddt import ddt, data
+from monitorrent.utils.bittorrent import Torrent, bencode, bdecode
+
+
+@ddt
+class BDecodeTest(TestCase):
+    def test_bdecode(self):
+        text = bencode({'announce': 'http://tracker/announce', 'announce-list': [['http://tracker1'], []],
+                        'info': {'name': u'\u0442\u043e\u0440\u0440\u0435\u043d\u0442'.encode('utf-8'),
+                                 'piece length': 1, 'pieces': '\xff' * 20,
+                                 'files': [{'length': -1, 'path': ['dir', 'file']}]}})
+        data = bdecode(text)
+
+        self.assertEqual(u'\u0442\u043e\u0440\u0440\u0435\u043d\u0442', data['info']['name'])
+        self.assertEqual('\xff' * 20, data['info']['pieces'])
+        self.assertEqual([{'length': -1, 'path': ['dir', 'file']}], data['info']['files'])
+        self.assertEqual([['http://tracker1'], []], data['announce-list'])
+        self.assertEqual(bdecode(text), bdecode(memoryview(text)))
+
+    @data('', 'd', 'i1', 'ie', 'd1:ae', 'l1:ae1', '5:abc', 'x', 'le1:a', 'di1e1:ae', 'dle1:ae')
+    def test_bdecode_error(self, text):
+        with self.assertRaises(SyntaxError):
+            bdecode(text)
+
+    def test_bdecode_spans(self):
+        spans = dict()
+        data = bdecode(b'd1:ali1ei2ee1:bd1:ci3eee', spans)
+
+        self.assertEqual({'a': [1, 2], 'b': {'c': 3}}, data)
+        self.assertEqual({'a': (4, 12), 'b': (15, 23)}, spans)
+
+
+class TorrentTest(TestCase):
+    info = {'name': 'torrent', 'length': 1, 'piece length': 1, 'pieces': '\xff' * 20}
+
+    def test_info_hash(self):
+        torrent = Torrent(bencode({'announce': 'http://tracker/announce', 'info': self.info}))
+
+        self.assertEqual(hashlib.sha1(bencode(self.info)).hexdigest().upper(), torrent.info_hash)
+
+    def test_info_hash_of_raw_info(self):
+        # keys aren't sorted, so re-encoded info dict differs from original one
+        raw_info = b'd4:name7:torrent6:lengthi1e12:piece lengthi1e6:pieces20:' + b'\xff' * 20 + b'e'
+        torrent = Torrent(b'd8:announce23:http://tracker/announce4:info' + raw_info + b'e')
+
+        self.assertEqual(hashlib.sha1(raw_info).hexdigest().upper(), torrent.info_hash)
+
+    def test_lazy(self):
+        content = bencode({'announce': 'http://tracker/announce', 'comment': 'comment', 'info': self.info})
+        torrent = Torrent(content, lazy=True)
+
+        self.assertIsNone(torrent._content)
+        self.assertEqual(Torrent(content).info_hash, torrent.info_hash)
+        self.assertIsNone(torrent._content)
+        self.assertEqual('comment', torrent.comment)
+        self.assertEqual(1, torrent.size)
+
+    def test_whitespace(self):
+        content = bencode({'announce': 'http://tracker/announce', 'info': self.info})
+
+        for lazy in (False, True):
+            torrent = Torrent(b' \r\n' + content + b'\r\n', lazy=lazy)
+
+            self.assertEqual(content, torrent.raw_content)
+            self.assertEqual(Torrent(content).info_hash, torrent.info_hash)
+            self.assertEqual(1, torrent.size)
+
+    def test_lazy_invalid(self):
+        with self.assertRaises(SyntaxError):
+            Torrent(b'<html></html>', lazy=True)
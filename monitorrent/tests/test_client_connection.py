@@ -0,0 +1,80 @@
+import socket
+from unittest import TestCase
+from mock import Mock, patch
+from monitorrent.plugins.clients import ClientConnection
+
+
+class ClientConnectionTest(TestCase):
+    def setUp(self):
+        self.load_credentials = Mock(return_value={'host': 'localhost'})
+        self.connect = Mock(side_effect=lambda cred: Mock())
+        self.connection = ClientConnection(self.load_credentials, self.connect)
+
+    def test_reuse_connection(self):
+        client = self.connection.get()
+
+        self.assertIs(client, self.connection.get())
+        self.assertEqual(1, self.connect.call_count)
+        self.assertEqual(1, self.load_credentials.call_count)
+
+    def test_not_configured(self):
+        self.load_credentials.return_value = None
+
+        self.assertFalse(self.connection.execute(lambda c: True))
+        self.assertFalse(self.connect.called)
+
+    def test_reconnect_broken_connection(self):
+        broken = self.connection.get()
+        action = Mock(side_effect=lambda c: c is not broken or self._raise(socket.error('Connection reset')))
+
+        self.assertTrue(self.connection.execute(action))
+        self.assertEqual(2, action.call_count)
+        self.assertEqual(2, self.connect.call_count)
+
+    def test_not_retry_client_error(self):
+        client = self.connection.get()
+        action = Mock(side_effect=ValueError('Invalid torrent'))
+
+        with self.assertRaises(ValueError):
+            self.connection.execute(action)
+
+        self.assertEqual(1, action.call_count)
+        # connection isn't broken by client error
+        self.assertIs(client, self.connection.get())
+        self.assertEqual(1, self.connect.call_count)
+
+    def test_fail_on_fresh_connection(self):
+        with self.assertRaises(socket.error):
+            self.connection.execute(lambda c: self._raise(socket.error('Connection refused')))
+        self.assertEqual(1, self.connect.call_count)
+
+    @patch('monitorrent.plugins.clients.time.time')
+    def test_backoff(self, time_mock):
+        time_mock.return_value = 1000
+        self.connect.side_effect = Exception('Connection refused')
+
+        self.assertIsNone(self.connection.get())
+        self.assertIsNone(self.connection.get())
+        self.assertEqual(1, self.connect.call_count)
+
+        time_mock.return_value = 1001
+        self.assertIsNone(self.connection.get())
+        self.assertEqual(2, self.connect.call_count)
+
+        # backoff is doubled after every failed connect
+        time_mock.return_value = 1002
+        self.assertIsNone(self.connection.get())
+        self.assertEqual(2, self.connect.call_count)
+
+    def test_reset(self):
+        client = self.connection.get()
+
+        self.connection.reset()
+
+        self.assertIsNot(client, self.connection.get())
+        self.assertEqual(2, self.load_credentials.call_count)
+
+
+    @staticmethod
+    def _raise(e):
+        raise e
@@ -1,5 +1,6 @@
-from sqlalchemy import Column, String, Integer, Table, MetaData
+from sqlalchemy import Column, String, Integer, DateTime, Table, MetaData, select
 from monitorrent.db import core_upgrade, DBSession
+from monitorrent.plugins import Topic
 from monitorrent.tests import UpgradeTestCase
 
 
@@ -36,3 +37,47 @@ class CoreUpgradeTest(UpgradeTestCase):
             db.execute(versions.insert(), {'plugin': 'rutor', 'version': 2})
 
         self._upgrade()
+
+    def test_topics_new_columns_upgrade(self):
+        m = MetaData()
+        topics = Table('topics', m,
+                       Column('id', Integer, primary_key=True),
+                       Column('display_name', String, unique=True, nullable=False),
+                       Column('url', String, nullable=False, unique=True),
+                       Column('last_update', DateTime, nullable=True),
+                       Column('type', String))
+
+        m.create_all(self.engine)
+
+        with DBSession() as db:
+            db.execute(topics.insert(), {'display_name': '1', 'url': 'http://1', 'type': 'rutor.org'})
+
+        self._upgrade()
+
+        self.assertTable(Topic.__table__)
+
+    def test_topics_next_check_spread_upgrade(self):
+        m = MetaData()
+        topics = Table('topics', m,
+                       Column('id', Integer, primary_key=True),
+                       Column('display_name', String, unique=True, nullable=False),
+                       Column('url', String, nullable=False, unique=True),
+                       Column('last_update', DateTime, nullable=True),
+                       Column('type', String))
+
+        m.create_all(self.engine)
+
+        with DBSession() as db:
+            for i in range(4):
+                db.execute(topics.insert(), {'display_name': str(i), 'url': 'http://%d' % i, 'type': 'rutor.org'})
+
+        self._upgrade()
+
+        with DBSession() as db:
+            table = Topic.__table__
+            next_checks = [next_check for next_check, in
+                           db.execute(select([table.c.next_check]).order_by(table.c.id))]
+        self.assertTrue(all(next_check is not None for next_check in next_checks))
+        # topics aren't due at once, but spread over default interval of 2 hours
+        self.assertEqual([0, 1800, 3600, 5400],
+                         [int(round((c - next_checks[0]).total_seconds())) for c in next_checks])
@@ -0,0 +1,114 @@
+import os
+import shutil
+import tempfile
+from datetime import datetime
+from unittest import TestCase
+from mock import patch
+from sqlalchemy import event
+from monitorrent.db import DBSession, UpdateBuffer, init_db_engine, close_db, get_engine, performance_profile
+from monitorrent.plugins.trackers.rutor import RutorOrgTopic
+from monitorrent.tests import DbTestCase
+
+
+class UpdateBufferTest(DbTestCase):
+    def setUp(self):
+        super(UpdateBufferTest, self).setUp()
+        with DBSession() as db:
+            for i in range(1, 4):
+                db.add(RutorOrgTopic(id=i, url='http://rutor.org/torrent/%d' % i, display_name=str(i)))
+
+    def _get_topics(self):
+        with DBSession() as db:
+            return {t.id: (t.hash, t.last_update) for t in db.query(RutorOrgTopic)}
+
+    def test_update(self):
+        last_update = datetime(2015, 11, 1)
+        with UpdateBuffer() as update_buffer:
+            update_buffer.update(RutorOrgTopic, 1, {'hash': 'A1', 'last_update': last_update})
+            update_buffer.update(RutorOrgTopic, 2, {'hash': 'A2'})
+            update_buffer.update(RutorOrgTopic, 2, {'last_update': last_update})
+            update_buffer.update(RutorOrgTopic, 3, {'hash': 'A3'})
+
+            self.assertEqual((None, None), self._get_topics()[1])
+
+        self.assertEqual({1: ('A1', last_update), 2: ('A2', last_update), 3: ('A3', None)}, self._get_topics())
+
+    def test_flush_by_size(self):
+        update_buffer = UpdateBuffer(max_size=2)
+
+        update_buffer.update(RutorOrgTopic, 1, {'hash': 'A1'})
+        self.assertEqual(1, len(update_buffer))
+        update_buffer.update(RutorOrgTopic, 2, {'hash': 'A2'})
+
+        self.assertEqual(0, len(update_buffer))
+        self.assertEqual('A2', self._get_topics()[2][0])
+
+    @patch('monitorrent.db.time.time')
+    def test_flush_by_time(self, time_mock):
+        time_mock.return_value = 1000
+        update_buffer = UpdateBuffer(max_delay=10)
+
+        update_buffer.update(RutorOrgTopic, 1, {'hash': 'A1'})
+        time_mock.return_value = 1010
+        update_buffer.update(RutorOrgTopic, 2, {'hash': 'A2'})
+
+        self.assertEqual(0, len(update_buffer))
+        self.assertEqual({1: ('A1', None), 2: ('A2', None), 3: (None, None)}, self._get_topics())
+
+    @patch('monitorrent.db.time.time')
+    def test_flush_expired(self, time_mock):
+        time_mock.return_value = 1000
+        update_buffer = UpdateBuffer(max_delay=10)
+
+        update_buffer.update(RutorOrgTopic, 1, {'hash': 'A1'})
+        update_buffer.flush_expired()
+        self.assertEqual(1, len(update_buffer))
+
+        time_mock.return_value = 1010
+        update_buffer.flush_expired()
+
+        self.assertEqual(0, len(update_buffer))
+        self.assertEqual('A1', self._get_topics()[1][0])
+
+    def test_exit_by_error(self):
+        with self.assertRaises(ValueError):
+            with UpdateBuffer() as update_buffer:
+                update_buffer.update(RutorOrgTopic, 1, {'hash': 'A1'})
+                # update of missing column fails on flush
+                update_buffer.update(RutorOrgTopic, 2, {'hash': 'A2'})
+                update_buffer._updates[RutorOrgTopic.__table__][2]['missing'] = None
+                raise ValueError('Failed')
+
+
+class PerformanceProfileTest(TestCase):
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        init_db_engine('sqlite:///' + os.path.join(self.dir, 'monitorrent.db'), profile=performance_profile)
+        self.statements = []
+        event.listen(get_engine(), 'before_cursor_execute',
+                     lambda conn, cursor, statement, *args: self.statements.append(statement))
+
+    def tearDown(self):
+        close_db()
+        shutil.rmtree(self.dir)
+
+    def test_pragmas(self):
+        with DBSession() as db:
+            self.assertEqual('wal', db.execute('PRAGMA journal_mode').scalar())
+            self.assertEqual(1, db.execute('PRAGMA synchronous').scalar())
+            self.assertEqual(10000, db.execute('PRAGMA busy_timeout').scalar())
+            self.assertEqual(-16 * 1024, db.execute('PRAGMA cache_size').scalar())
+
+    def test_begin(self):
+        with DBSession() as db:
+            db.execute('SELECT 1')
+        with DBSession(immediate=True) as db:
+            db.execute('SELECT 1')
+
+        self.assertEqual(['BEGIN', 'SELECT 1', 'BEGIN IMMEDIATE', 'SELECT 1'], self.statements)
+
+    def test_default(self):
+        close_db()
+        init_db_engine('sqlite:///' + os.path.join(self.dir, 'default.db'))
+        with DBSession(immediate=True) as db:
+            self.assertEqual('delete', db.execute('PRAGMA journal_mode').scalar())
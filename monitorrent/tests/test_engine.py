@@ -0,0 +1,115 @@
+import threading
+from datetime import datetime, timedelta
+from unittest import TestCase
+from mock import Mock, ANY, patch
+from monitorrent.engine import Engine, EngineRunner, DBEngineRunner, Logger, BufferedLogger
+from monitorrent.utils.sessions import sessions
+
+
+class EngineRunnerTest(TestCase):
+    def setUp(self):
+        self.executed = threading.Event()
+        self.trackers_manager = Mock()
+        self.trackers_manager.execute = Mock(side_effect=lambda *args: self.executed.set())
+        self.engine_runner = EngineRunner(Logger(), self.trackers_manager, Mock())
+
+    def tearDown(self):
+        self.engine_runner.stop()
+        self.engine_runner.join(1)
+
+    def test_execute(self):
+        self.engine_runner.execute()
+
+        self.assertTrue(self.executed.wait(1))
+        self.trackers_manager.execute.assert_called_once_with(ANY)
+        self.assertIsNotNone(self.engine_runner.last_execute)
+
+    def test_execute_targeted(self):
+        self.engine_runner.execute(ids=[1, 2])
+
+        self.assertTrue(self.executed.wait(1))
+        self.trackers_manager.execute.assert_called_once_with(ANY, [1, 2], [])
+
+    def test_execute_closes_own_sessions(self):
+        self.addCleanup(sessions.close)
+        # session opened by concurrent request
+        session = sessions.get('rutor.org')
+        self.trackers_manager.execute = Mock(side_effect=lambda *args: sessions.get('unionpeer.org'))
+
+        self.engine_runner._execute()
+
+        self.assertEqual(['rutor.org'], sessions.names())
+        self.assertIs(session, sessions.get('rutor.org'))
+        self.assertIsNone(self.engine_runner.last_execute)
+
+
+class DBEngineRunnerSettingsTest(TestCase):
+    def setUp(self):
+        self.settings_execute = Mock(interval=3600, last_execute=None)
+        get_patcher = patch.object(DBEngineRunner, '_get_settings_execute', return_value=self.settings_execute)
+        set_patcher = patch.object(DBEngineRunner, '_set_settings_execute')
+        self.get_settings_execute = get_patcher.start()
+        self.set_settings_execute = set_patcher.start()
+        self.addCleanup(patch.stopall)
+        scheduler = Mock()
+        scheduler.get_next_check = Mock(return_value=None)
+        self.engine_runner = DBEngineRunner(Logger(), Mock(), Mock(), scheduler)
+
+    def tearDown(self):
+        self.engine_runner.stop()
+        self.engine_runner.join(1)
+
+    def test_interval_cached(self):
+        self.assertEqual(3600, self.engine_runner.interval)
+        self.assertEqual(3600, self.engine_runner.interval)
+
+        self.assertEqual(1, self.get_settings_execute.call_count)
+
+    def test_set_interval(self):
+        self.engine_runner.interval = 600
+
+        self.assertEqual(600, self.engine_runner.interval)
+        self.set_settings_execute.assert_called_once_with(interval=600)
+
+    def test_wait_timeout_limited_by_interval(self):
+        self.engine_runner.scheduler.get_next_check.return_value = datetime.now() + timedelta(days=7)
+
+        self.assertEqual(3600, self.engine_runner._get_wait_timeout())
+
+
+class EngineTest(TestCase):
+    def test_add_torrents_logs_topic(self):
+        logger = Mock(Logger)
+        clients_manager = Mock()
+        clients_manager.add_torrents.return_value = [
+            {'exists': False, 'added': True, 'removed': True, 'torrent': None, 'old_torrent': {'name': 'Old'}},
+            {'exists': True, 'added': False, 'removed': False, 'torrent': None, 'old_torrent': None},
+        ]
+        engine = Engine(logger, clients_manager)
+
+        engine.add_torrents([('1.torrent', Mock(), 'OLD', 1), ('2.torrent', Mock(), None, 2)])
+
+        self.assertEqual([1, 1, 2], [kwargs['topic_id'] for _, kwargs in logger.info.call_args_list])
+
+
+class BufferedLoggerTest(TestCase):
+    def test_flush_by_topic(self):
+        logger = Mock(Logger)
+        buffered_logger = BufferedLogger(logger)
+
+        buffered_logger.info('Start')
+        buffered_logger.info('Check 1', topic_id=1)
+        buffered_logger.downloaded('Downloaded 1', '1234', topic_id=1)
+        self.assertFalse(logger.info.called)
+
+        buffered_logger.info('Check 2', topic_id=2)
+        self.assertEqual(2, logger.info.call_count)
+        logger.downloaded.assert_called_once_with('Downloaded 1', '1234', topic_id=1)
+
+        buffered_logger.failed('Failed 2', topic_id=2)
+        buffered_logger.info('End')
+        self.assertEqual(3, logger.info.call_count)
+        logger.failed.assert_called_once_with('Failed 2', topic_id=2)
+
+        buffered_logger.flush()
+        self.assertEqual(4, logger.info.call_count)
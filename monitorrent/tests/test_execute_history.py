@@ -0,0 +1,75 @@
+from datetime import datetime
+from monitorrent.execute_history import ExecuteHistory
+from monitorrent.tests import DbTestCase
+
+
+class ExecuteHistoryTest(DbTestCase):
+    def _execute(self, history, failed_topic_id=None, exception=None):
+        history.started()
+        history.info('Check for changes', topic_id=1)
+        history.downloaded('Downloaded', '1234', topic_id=1)
+        if failed_topic_id is not None:
+            history.failed('Failed update', topic_id=failed_topic_id)
+        history.finished(datetime.now(), exception)
+
+    def test_store(self):
+        history = ExecuteHistory(batch_size=2)
+
+        self._execute(history, failed_topic_id=2, exception=Exception('Some error'))
+
+        count, runs = history.get_runs()
+        self.assertEqual(1, count)
+        self.assertEqual('Some error', runs[0]['exception'])
+        self.assertEqual(1, runs[0]['failed'])
+        self.assertEqual(1, runs[0]['downloaded'])
+
+        count, events = history.get_events(run_id=runs[0]['id'])
+        self.assertEqual(3, count)
+        self.assertEqual(['failed', 'downloaded', 'info'], [e['level'] for e in events])
+        self.assertEqual([2, 1, 1], [e['topic_id'] for e in events])
+
+    def test_filter(self):
+        history = ExecuteHistory()
+        for topic_id in [2, None, 3, 2]:
+            self._execute(history, failed_topic_id=topic_id)
+
+        count, events = history.get_events(level='failed', runs=3)
+        self.assertEqual(2, count)
+        self.assertEqual([2, 3], [e['topic_id'] for e in events])
+
+        count, events = history.get_events(topic_id=2, offset=1, limit=10)
+        self.assertEqual(2, count)
+        self.assertEqual(1, len(events))
+
+    def test_retention(self):
+        history = ExecuteHistory(max_runs=3, compact_runs=1)
+        for _ in range(5):
+            self._execute(history, failed_topic_id=2)
+
+        count, runs = history.get_runs()
+        self.assertEqual(3, count)
+        # info events are kept only for last run
+        count, events = history.get_events(level='info')
+        self.assertEqual(1, count)
+        self.assertEqual(runs[0]['id'], events[0]['run_id'])
+        count, events = history.get_events(level='failed')
+        self.assertEqual(3, count)
+
+    def test_event_time(self):
+        history = ExecuteHistory()
+        start_time = datetime(2015, 11, 1, 12, 0, 0)
+
+        history.started(event_time=start_time)
+        history.log('info', 'Info', event_time=datetime(2015, 11, 1, 12, 0, 1))
+        history.finished(datetime.now(), None)
+
+        self.assertEqual(start_time, history.get_runs()[1][0]['start_time'])
+        self.assertEqual(datetime(2015, 11, 1, 12, 0, 1), history.get_events()[1][0]['time'])
+
+    def test_log_without_run(self):
+        history = ExecuteHistory()
+
+        history.info('Info')
+        history.finished(datetime.now(), None)
+
+        self.assertEqual((0, []), history.get_events())
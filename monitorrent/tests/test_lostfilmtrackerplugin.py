@@ -1,8 +1,12 @@
 # coding=utf-8
-from monitorrent.plugins.trackers.lostfilm import LostFilmPlugin
+from feedparser import FeedParserDict
+from mock import Mock, patch
+from monitorrent.db import DBSession
+from monitorrent.plugins.trackers.lostfilm import LostFilmPlugin, LostFilmTVSeries
 from monitorrent.plugins.trackers import LoginResult
 from monitorrent.tests import use_vcr, DbTestCase
 from monitorrent.tests.lostfilmtracker_helper import LostFilmTrackerHelper
+from monitorrent.tests.test_trackerpluginbase import create_torrent
 from monitorrent.engine import Logger
 import datetime
 
@@ -12,7 +16,7 @@ helper = LostFilmTrackerHelper()
 class EngineMock(object):
     log = Logger()
 
-    def add_torrent(self, filename, torrent, old_hash):
+    def add_torrent(self, filename, torrent, old_hash, topic_id=None):
         return datetime.datetime.now()
 
 
@@ -91,3 +95,118 @@ class LostFilmTrackerPluginTest(DbTestCase):
 
         self.assertEqual(topic2['season'], 1)
         self.assertEqual(topic2['episode'], 6)
+
+
+class LostFilmTrackerPluginRssTest(DbTestCase):
+    def setUp(self):
+        super(LostFilmTrackerPluginRssTest, self).setUp()
+        with DBSession() as db:
+            db.add(LostFilmTVSeries(url='http://www.lostfilm.tv/browse.php?cat=245', display_name='Mr. Robot',
+                                    search_name='Mr. Robot', season=1, episode=1, quality='SD'))
+        self.plugin = LostFilmPlugin()
+        self.plugin._execute_login = Mock(return_value=True)
+        self.plugin.tracker = Mock()
+        self.plugin.tracker.parse_rss_title = Mock(side_effect=self.parse_rss_title)
+        self.entries = [FeedParserDict(id='2', title='Mr. Robot 2', link='http://lostfilm/2'),
+                        FeedParserDict(id='1', title='Mr. Robot 1', link='http://lostfilm/1')]
+        self.feed = FeedParserDict(status=200, etag='"1"', modified=None, entries=self.entries)
+
+    @staticmethod
+    def parse_rss_title(title):
+        episode = int(title[-1])
+        return {'original_name': 'Mr. Robot', 'season': 1, 'episode': episode, 'quality': 'SD',
+                'episode_info': 'E%02d' % episode}
+
+    def parse(self, url, etag=None, modified=None):
+        if etag == self.feed.etag:
+            return FeedParserDict(status=304, entries=[])
+        return self.feed
+
+    @patch('monitorrent.plugins.trackers.lostfilm.download')
+    @patch('monitorrent.plugins.trackers.lostfilm.feedparser.parse')
+    def test_execute_not_modified(self, parse, download):
+        parse.side_effect = self.parse
+        download.return_value = (create_torrent('torrent'), None)
+
+        self.plugin.execute(None, EngineMock())
+        self.plugin.execute(None, EngineMock())
+
+        self.assertEqual(2, self.plugin.tracker.parse_rss_title.call_count)
+        self.assertEqual(1, download.call_count)
+        self.assertEqual(2, self.plugin.get_topic(1)['episode'])
+
+    @patch('monitorrent.plugins.trackers.lostfilm.download')
+    @patch('monitorrent.plugins.trackers.lostfilm.feedparser.parse')
+    def test_execute_skip_seen_entries(self, parse, download):
+        parse.side_effect = self.parse
+        download.side_effect = Exception('Service unavailable')
+
+        self.plugin.execute(None, EngineMock())
+        self.entries.insert(0, FeedParserDict(id='3', title='Mr. Robot 3', link='http://lostfilm/3'))
+        self.feed.etag = '"2"'
+        download.side_effect = None
+        download.return_value = (create_torrent('torrent'), None)
+        self.plugin.execute(None, EngineMock())
+
+        # first entry is seen, failed second one is processed again
+        self.assertEqual(['Mr. Robot 2', 'Mr. Robot 1', 'Mr. Robot 3', 'Mr. Robot 2'],
+                         [args[0] for args, _ in self.plugin.tracker.parse_rss_title.call_args_list])
+        self.assertEqual(['http://lostfilm/2', 'http://lostfilm/3', 'http://lostfilm/2'],
+                         [args[0] for args, _ in download.call_args_list])
+
+    @patch('monitorrent.plugins.trackers.lostfilm.download')
+    @patch('monitorrent.plugins.trackers.lostfilm.feedparser.parse')
+    def test_execute_after_update_topic(self, parse, download):
+        parse.side_effect = self.parse
+
+        self.plugin.execute(None, EngineMock())
+        self.plugin.update_topic(1, {'display_name': 'Mr. Robot', 'season': 1, 'episode': 0})
+        self.plugin.execute(None, EngineMock())
+
+        self.assertEqual(4, self.plugin.tracker.parse_rss_title.call_count)
+
+    @patch('monitorrent.plugins.trackers.lostfilm.download')
+    @patch('monitorrent.plugins.trackers.lostfilm.feedparser.parse')
+    def test_execute_state_is_persisted(self, parse, download):
+        parse.side_effect = self.parse
+        download.return_value = (create_torrent('torrent'), None)
+
+        self.plugin.execute(None, EngineMock())
+        plugin = LostFilmPlugin()
+        plugin._execute_login = Mock(return_value=True)
+        plugin.tracker = self.plugin.tracker
+        plugin.execute([1], EngineMock())
+
+        # feed isn't processed again after restart and by scheduled execute
+        self.assertEqual(2, self.plugin.tracker.parse_rss_title.call_count)
+        self.assertEqual(1, download.call_count)
+
+    @patch('monitorrent.plugins.trackers.lostfilm.download')
+    @patch('monitorrent.plugins.trackers.lostfilm.feedparser.parse')
+    def test_execute_requested_series(self, parse, download):
+        with DBSession() as db:
+            db.add(LostFilmTVSeries(url='http://www.lostfilm.tv/browse.php?cat=251', display_name='Scream',
+                                    search_name='Scream', season=1, episode=1, quality='SD'))
+        self.entries.insert(0, FeedParserDict(id='3', title='Scream 2', link='http://lostfilm/3'))
+        self.plugin.tracker.parse_rss_title.side_effect = \
+            lambda title: dict(self.parse_rss_title(title), original_name=title[:-2])
+        parse.side_effect = self.parse
+        download.return_value = (create_torrent('torrent'), None)
+
+        self.plugin.execute([1], EngineMock())
+
+        # entry of not requested series is left for its own execute
+        self.assertEqual(['http://lostfilm/2'], [args[0] for args, _ in download.call_args_list])
+        self.assertEqual(1, self.plugin.get_topic(2)['episode'])
+
+        self.plugin.execute([2], EngineMock())
+
+        # feed isn't fully processed yet, so it is downloaded again, but processed entries are skipped
+        self.assertEqual(['http://lostfilm/2', 'http://lostfilm/3'], [args[0] for args, _ in download.call_args_list])
+        self.assertEqual(['Scream 2', 'Mr. Robot 2', 'Mr. Robot 1', 'Scream 2'],
+                         [args[0] for args, _ in self.plugin.tracker.parse_rss_title.call_args_list])
+        self.assertEqual(2, self.plugin.get_topic(2)['episode'])
+
+        self.plugin.execute(None, EngineMock())
+
+        self.assertEqual(4, self.plugin.tracker.parse_rss_title.call_count)
@@ -0,0 +1,45 @@
+from unittest import TestCase
+from mock import Mock
+from monitorrent.utils.lru_cache import LRUCache
+
+
+class LRUCacheTest(TestCase):
+    def setUp(self):
+        self.timer = Mock(return_value=1000)
+        self.cache = LRUCache(max_size=2, ttl=60, timer=self.timer)
+
+    def test_get(self):
+        self.cache.set('a', True)
+        self.cache.set('b', False)
+
+        self.assertTrue(self.cache.get('a'))
+        self.assertFalse(self.cache.get('b'))
+        self.assertIsNone(self.cache.get('c'))
+
+    def test_max_size(self):
+        self.cache.set('a', 1)
+        self.cache.set('b', 2)
+        # a becomes most recently used
+        self.cache.get('a')
+        self.cache.set('c', 3)
+
+        self.assertEqual(2, len(self.cache))
+        self.assertEqual(1, self.cache.get('a'))
+        self.assertIsNone(self.cache.get('b'))
+        self.assertEqual(3, self.cache.get('c'))
+
+    def test_ttl(self):
+        self.cache.set('a', 1)
+        self.timer.return_value = 1059
+        self.assertEqual(1, self.cache.get('a'))
+
+        self.timer.return_value = 1060
+        self.assertIsNone(self.cache.get('a'))
+        self.assertEqual(0, len(self.cache))
+
+    def test_clear(self):
+        self.cache.set('a', 1)
+
+        self.cache.clear()
+
+        self.assertIsNone(self.cache.get('a'))
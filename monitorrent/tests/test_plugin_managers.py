@@ -0,0 +1,359 @@
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from unittest import TestCase
+from mock import Mock, ANY, patch
+from monitorrent.db import DBSession
+from monitorrent.engine import Logger, Engine
+from monitorrent.plugin_managers import TrackersManager, ClientsManager, CircuitBreaker
+from monitorrent.plugins.trackers.lostfilm import LostFilmPlugin, LostFilmTVSeries
+from monitorrent.plugins.trackers.rutor import RutorOrgPlugin, RutorOrgTopic
+from monitorrent.plugins.trackers.unionpeer import UnionpeerOrgTopic
+from monitorrent.tests import DbTestCase
+
+
+class ListLogger(Logger):
+    def __init__(self):
+        self.messages = []
+        self.lock = threading.Lock()
+
+    def info(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    def failed(self, message):
+        with self.lock:
+            self.messages.append(message)
+
+    def downloaded(self, message, torrent):
+        with self.lock:
+            self.messages.append(message)
+
+
+class TrackersManagerExecuteTest(TestCase):
+    class Tracker(object):
+        def __init__(self, name, wait_for=None, done=None):
+            self.name = name
+            self.wait_for = wait_for
+            self.done = done or threading.Event()
+
+        def execute(self, ids, engine):
+            engine.log.info(self.name + ' 1')
+            if self.wait_for is not None:
+                if not self.wait_for.wait(5):
+                    raise Exception('timeout')
+            engine.log.info(self.name + ' 2')
+            self.done.set()
+
+    def test_serial_execute(self):
+        trackers = {'tracker1': self.Tracker('tracker1'), 'tracker2': self.Tracker('tracker2')}
+        logger = ListLogger()
+        trackers_manager = TrackersManager(trackers)
+
+        trackers_manager.execute(Engine(logger, Mock()))
+
+        self.assertEqual(8, len(logger.messages))
+        self.assertTrue(all(t.done.is_set() for t in trackers.values()))
+
+    def test_concurrent_execute(self):
+        # slow tracker waits for fast one, so it can finish only if they are executed concurrently
+        fast = self.Tracker('fast')
+        slow = self.Tracker('slow', wait_for=fast.done)
+        logger = ListLogger()
+        trackers_manager = TrackersManager({'slow': slow, 'fast': fast}, max_workers=2)
+
+        trackers_manager.execute(Engine(logger, Mock()))
+
+        self.assertTrue(slow.done.is_set())
+        self.assertEqual(8, len(logger.messages))
+        # messages of each tracker are not interleaved
+        self.assertEqual(['fast', 'fast', 'fast', 'fast', 'slow', 'slow', 'slow', 'slow'],
+                         ['slow' if 'slow' in m else 'fast' for m in logger.messages])
+
+    def test_execute_failed_tracker(self):
+        failed = Mock()
+        failed.execute = Mock(side_effect=Exception('Some error'))
+        tracker = self.Tracker('tracker')
+        logger = ListLogger()
+        trackers_manager = TrackersManager({'failed': failed, 'tracker': tracker}, max_workers=2)
+
+        trackers_manager.execute(Engine(logger, Mock()))
+
+        self.assertTrue(tracker.done.is_set())
+        self.assertTrue(any('Some error' in m for m in logger.messages))
+
+    def test_verify_ttl(self):
+        lostfilm = LostFilmPlugin()
+        TrackersManager({'lostfilm.tv': lostfilm, 'rutor.org': RutorOrgPlugin()}, verify_ttl=86400)
+
+        self.assertEqual(86400, lostfilm.verify_ttl)
+
+
+class TrackersManagerTargetedExecuteTest(DbTestCase):
+    def setUp(self):
+        super(TrackersManagerTargetedExecuteTest, self).setUp()
+        with DBSession() as db:
+            db.add(RutorOrgTopic(id=1, url='http://rutor.org/torrent/1', display_name='1'))
+            db.add(RutorOrgTopic(id=2, url='http://rutor.org/torrent/2', display_name='2'))
+            db.add(UnionpeerOrgTopic(id=3, url='http://unionpeer.org/topic/3', display_name='3'))
+        self.trackers = {'rutor.org': Mock(), 'unionpeer.org': Mock(), 'lostfilm.tv': Mock()}
+        self.trackers_manager = TrackersManager(self.trackers)
+
+    def test_execute_all(self):
+        self.trackers_manager.execute(Engine(Logger(), Mock()))
+
+        for tracker in self.trackers.values():
+            tracker.execute.assert_called_once_with(None, ANY)
+
+    def test_execute_ids(self):
+        self.trackers_manager.execute(Engine(Logger(), Mock()), ids=[2, 3])
+
+        self.trackers['rutor.org'].execute.assert_called_once_with([2], ANY)
+        self.trackers['unionpeer.org'].execute.assert_called_once_with([3], ANY)
+        self.assertFalse(self.trackers['lostfilm.tv'].execute.called)
+
+    def test_execute_trackers(self):
+        self.trackers_manager.execute(Engine(Logger(), Mock()), ids=[1], trackers=['unionpeer.org'])
+
+        self.trackers['rutor.org'].execute.assert_called_once_with([1], ANY)
+        self.trackers['unionpeer.org'].execute.assert_called_once_with(None, ANY)
+        self.assertFalse(self.trackers['lostfilm.tv'].execute.called)
+
+
+class RutorOrgHashPlugin(RutorOrgPlugin):
+    def get_topic_info(self, topic):
+        return topic.hash
+
+
+class TrackersManagerWatchingTorrentsTest(DbTestCase):
+    def setUp(self):
+        super(TrackersManagerWatchingTorrentsTest, self).setUp()
+        self.last_update = datetime(2015, 11, 1)
+        with DBSession() as db:
+            db.add(RutorOrgTopic(id=1, url='http://rutor.org/torrent/1', display_name='1',
+                                 last_update=self.last_update))
+            db.add(LostFilmTVSeries(id=2, url='http://www.lostfilm.tv/browse.php?cat=2', display_name='2',
+                                    search_name='2', season=1, episode=5))
+            db.add(LostFilmTVSeries(id=3, url='http://www.lostfilm.tv/browse.php?cat=3', display_name='3',
+                                    search_name='3', season=2))
+            db.add(UnionpeerOrgTopic(id=4, url='http://unionpeer.org/topic/4', display_name='4'))
+        self.trackers_manager = TrackersManager({'rutor.org': RutorOrgPlugin(), 'lostfilm.tv': LostFilmPlugin()})
+
+    def test_get_watching_torrents(self):
+        topics = sorted(self.trackers_manager.get_watching_torrents(), key=lambda t: t['id'])
+
+        self.assertEqual([
+            {'id': 1, 'url': 'http://rutor.org/torrent/1', 'display_name': '1', 'last_update': self.last_update,
+             'info': None, 'tracker': 'rutor.org'},
+            {'id': 2, 'url': 'http://www.lostfilm.tv/browse.php?cat=2', 'display_name': '2', 'last_update': None,
+             'info': 'S01E05', 'tracker': 'lostfilm.tv'},
+            {'id': 3, 'url': 'http://www.lostfilm.tv/browse.php?cat=3', 'display_name': '3', 'last_update': None,
+             'info': 'S02', 'tracker': 'lostfilm.tv'},
+        ], topics)
+
+    def test_get_watching_torrents_orm_topic_info(self):
+        with DBSession() as db:
+            db.query(RutorOrgTopic).filter(RutorOrgTopic.id == 1).first().hash = 'ABCDEF'
+        self.trackers_manager.trackers['rutor.org'] = RutorOrgHashPlugin()
+
+        topics = sorted(self.trackers_manager.get_watching_torrents(), key=lambda t: t['id'])
+
+        # tracker without topic_info_columns gets ORM object in get_topic_info
+        self.assertEqual(['ABCDEF', 'S01E05', 'S02'], [t['info'] for t in topics])
+
+
+class ClientsManagerIndexTest(TestCase):
+    def setUp(self):
+        self.torrent = {'name': 'torrent', 'date_added': datetime(2015, 11, 1)}
+        self.client = Mock()
+        self.client.get_torrents = Mock(return_value={'abcdef': self.torrent})
+        self.client.find_torrent = Mock(return_value=self.torrent)
+        self.clients_manager = ClientsManager({'client': self.client})
+
+    def test_find_torrent_without_index(self):
+        self.assertEqual(self.torrent, self.clients_manager.find_torrent('ABCDEF'))
+        self.client.find_torrent.assert_called_once_with('ABCDEF')
+        self.assertFalse(self.client.get_torrents.called)
+
+    def test_find_torrent(self):
+        self.clients_manager.start_execute()
+
+        self.assertEqual(self.torrent, self.clients_manager.find_torrent('ABCDEF'))
+        self.assertFalse(self.clients_manager.find_torrent('123456'))
+        self.assertEqual(1, self.client.get_torrents.call_count)
+        self.assertFalse(self.client.find_torrent.called)
+
+        self.clients_manager.finish_execute()
+        self.client.disconnect.assert_called_once_with()
+
+    def test_find_torrent_index_not_available(self):
+        self.client.get_torrents.side_effect = Exception('Not connected')
+        self.clients_manager.start_execute()
+
+        self.assertEqual(self.torrent, self.clients_manager.find_torrent('ABCDEF'))
+        self.client.find_torrent.assert_called_once_with('ABCDEF')
+
+    def test_add_remove_torrent(self):
+        self.client.get_torrents.return_value = dict()
+        self.clients_manager.start_execute()
+
+        self.assertFalse(self.clients_manager.find_torrent('ABCDEF'))
+        self.assertTrue(self.clients_manager.add_torrent('torrent', 'ABCDEF'))
+        # added torrent is indexed without asking client for it
+        self.assertTrue(self.clients_manager.find_torrent('ABCDEF'))
+        self.assertFalse(self.client.find_torrent.called)
+
+        self.assertTrue(self.clients_manager.remove_torrent('ABCDEF'))
+        self.assertFalse(self.clients_manager.find_torrent('ABCDEF'))
+        self.assertEqual(1, self.client.get_torrents.call_count)
+
+
+class ClientsManagerBatchTest(TestCase):
+    def setUp(self):
+        self.old_torrent = {'name': 'old', 'date_added': datetime(2015, 10, 1)}
+        self.torrent = {'name': 'torrent', 'date_added': datetime(2015, 11, 1)}
+        self.torrents = {'OLD': self.old_torrent, 'EXISTS': self.torrent}
+        self.client = Mock()
+        self.client.find_torrent = Mock(side_effect=lambda h: self.torrents.get(h, False))
+        self.client.add_torrents = Mock(side_effect=self.add_torrents)
+        self.client.remove_torrents = Mock(side_effect=lambda hashes: [self.torrents.pop(h, None) is not None
+                                                                       for h in hashes])
+        self.clients_manager = ClientsManager({'client': self.client})
+
+    def add_torrents(self, torrents):
+        for torrent in torrents:
+            if torrent != 'invalid':
+                self.torrents[torrent.upper()] = self.torrent
+        return [torrent != 'invalid' for torrent in torrents]
+
+    def test_add_torrents(self):
+        results = self.clients_manager.add_torrents([('exists', 'EXISTS', None),
+                                                     ('new', 'NEW', None),
+                                                     ('updated', 'UPDATED', 'OLD'),
+                                                     ('invalid', 'INVALID', None)])
+
+        self.client.add_torrents.assert_called_once_with(['new', 'updated', 'invalid'])
+        self.client.remove_torrents.assert_called_once_with(['OLD'])
+        self.assertEqual([True, False, False, False], [r['exists'] for r in results])
+        self.assertEqual([False, True, True, False], [r['added'] for r in results])
+        self.assertEqual([False, False, self.old_torrent, False], [r['old_torrent'] for r in results])
+        self.assertEqual([False, False, True, False], [r['removed'] for r in results])
+        self.assertEqual([self.torrent, self.torrent, self.torrent, False], [r['torrent'] for r in results])
+
+    def test_add_torrents_fallback(self):
+        self.client.add_torrents.side_effect = Exception('Unknown method')
+        self.client.add_torrent = Mock(return_value=True)
+
+        results = self.clients_manager.add_torrents([('new', 'NEW', None), ('updated', 'UPDATED', None)])
+
+        self.assertEqual(2, self.client.add_torrent.call_count)
+        self.assertEqual([True, True], [r['added'] for r in results])
+
+
+class ClientsManagerFanOutTest(TestCase):
+    def setUp(self):
+        self.torrent = {'name': 'torrent', 'date_added': datetime(2015, 11, 1)}
+        self.released = threading.Event()
+        self.slow = Mock()
+        self.slow.find_torrent = Mock(side_effect=lambda h: self.released.wait(5))
+        self.fast = Mock()
+        self.fast.find_torrent = Mock(return_value=self.torrent)
+        self.failed = Mock()
+        self.failed.find_torrent = Mock(side_effect=Exception('Connection refused'))
+
+    def tearDown(self):
+        self.released.set()
+
+    def test_find_torrent_first_success(self):
+        clients_manager = ClientsManager({'slow': self.slow, 'fast': self.fast}, timeout=5)
+
+        self.assertEqual(self.torrent, clients_manager.find_torrent('ABCDEF'))
+
+    def test_find_torrent_timeout(self):
+        self.fast.find_torrent.return_value = False
+        clients_manager = ClientsManager({'slow': self.slow, 'fast': self.fast}, timeout=0.1, failure_threshold=2)
+
+        # not answered client is a miss
+        for _ in range(3):
+            self.assertFalse(clients_manager.find_torrent('ABCDEF'))
+
+        # next call of slow client waits for hung one in its worker, and client is skipped after failures
+        self.assertEqual(1, self.slow.find_torrent.call_count)
+        self.assertEqual(3, self.fast.find_torrent.call_count)
+
+    def test_find_torrent_single_client_timeout(self):
+        clients_manager = ClientsManager({'slow': self.slow}, timeout=0.1)
+
+        with self.assertRaises(Exception):
+            clients_manager.find_torrent('ABCDEF')
+
+    def test_find_torrent_failed_client(self):
+        clients_manager = ClientsManager({'failed': self.failed, 'fast': self.fast})
+
+        self.assertEqual(self.torrent, clients_manager.find_torrent('ABCDEF'))
+
+    def test_find_torrent_all_clients_failed(self):
+        clients_manager = ClientsManager({'failed': self.failed})
+
+        with self.assertRaises(Exception):
+            clients_manager.find_torrent('ABCDEF')
+
+    def test_add_torrent_failed_client(self):
+        self.failed.add_torrent = Mock(side_effect=Exception('Connection refused'))
+        self.fast.add_torrent = Mock(return_value=True)
+        clients_manager = ClientsManager(OrderedDict([('failed', self.failed), ('fast', self.fast)]))
+
+        self.assertTrue(clients_manager.add_torrent('torrent'))
+        self.fast.add_torrent.assert_called_once_with('torrent')
+
+    def test_add_torrents_timeout(self):
+        self.slow.add_torrents = Mock(side_effect=lambda torrents: self.released.wait(5))
+        self.slow.remove_torrents = Mock(side_effect=lambda hashes: self.released.wait(5))
+        self.slow.find_torrent = Mock(return_value=False)
+        self.fast.find_torrent.return_value = False
+        self.fast.add_torrents = Mock(return_value=[True])
+        self.fast.remove_torrents = Mock(return_value=[False])
+        clients_manager = ClientsManager(OrderedDict([('slow', self.slow), ('fast', self.fast)]),
+                                         timeout=0.1, failure_threshold=2)
+        clients_manager._get_breaker('slow').failure()
+
+        # not answered client is a miss, so torrent is added to next one
+        results = clients_manager.add_torrents([('torrent', 'ABCDEF', None)])
+        self.assertTrue(results[0]['added'])
+        self.fast.add_torrents.assert_called_once_with(['torrent'])
+
+        # slow client is skipped after failure of batch call
+        self.assertEqual([False], clients_manager.remove_torrents(['ABCDEF']))
+        self.assertFalse(self.slow.remove_torrents.called)
+
+    def test_add_torrents_failed_client(self):
+        self.failed.add_torrent = Mock(side_effect=Exception('Connection refused'))
+        self.failed.add_torrents = Mock(side_effect=Exception('Connection refused'))
+        clients_manager = ClientsManager({'failed': self.failed}, failure_threshold=1)
+        self.failed.find_torrent.side_effect = None
+        self.failed.find_torrent.return_value = False
+
+        results = clients_manager.add_torrents([('torrent', 'ABCDEF', None)])
+
+        self.assertFalse(results[0]['added'])
+        self.assertFalse(clients_manager._get_breaker('failed').allow())
+
+
+class CircuitBreakerTest(TestCase):
+    @patch('monitorrent.plugin_managers.time.time')
+    def test_breaker(self, time_mock):
+        time_mock.return_value = 1000
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10)
+
+        breaker.failure()
+        self.assertTrue(breaker.allow())
+        breaker.failure()
+        self.assertFalse(breaker.allow())
+
+        time_mock.return_value = 1010
+        # only one trial call is allowed
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+
+        breaker.success()
+        self.assertTrue(breaker.allow())
@@ -0,0 +1,59 @@
+from datetime import datetime, timedelta
+from monitorrent.db import DBSession
+from monitorrent.plugins.trackers.rutor import RutorOrgTopic
+from monitorrent.plugins.trackers.unionpeer import UnionpeerOrgTopic
+from monitorrent.scheduler import TopicScheduler
+from monitorrent.tests import DbTestCase
+
+
+class TopicSchedulerTest(DbTestCase):
+    def setUp(self):
+        super(TopicSchedulerTest, self).setUp()
+        self.now = datetime(2015, 11, 10, 12, 0, 0)
+        with DBSession() as db:
+            # new topic
+            db.add(RutorOrgTopic(id=1, url='http://rutor.org/torrent/1', display_name='1'))
+            # changed yesterday
+            db.add(RutorOrgTopic(id=2, url='http://rutor.org/torrent/2', display_name='2',
+                                 last_update=self.now - timedelta(days=1)))
+            # not changed for half a year
+            db.add(UnionpeerOrgTopic(id=3, url='http://unionpeer.org/topic/3', display_name='3',
+                                     last_update=self.now - timedelta(days=180)))
+        self.scheduler = TopicScheduler()
+        self.min_interval = timedelta(hours=2)
+
+    def test_get_interval(self):
+        self.assertEqual(self.min_interval, self.scheduler.get_interval(None, self.min_interval, self.now))
+        self.assertEqual(self.scheduler.min_interval,
+                         self.scheduler.get_interval(self.now - timedelta(hours=1), self.min_interval, self.now))
+        self.assertEqual(timedelta(hours=1),
+                         self.scheduler.get_interval(self.now - timedelta(hours=10), self.min_interval, self.now))
+        self.assertEqual(timedelta(days=1),
+                         self.scheduler.get_interval(self.now - timedelta(days=10), self.min_interval, self.now))
+        self.assertEqual(self.scheduler.max_interval,
+                         self.scheduler.get_interval(self.now - timedelta(days=180), self.min_interval, self.now))
+
+    def test_new_topics_are_due(self):
+        self.scheduler.load()
+
+        self.assertEqual(datetime.min, self.scheduler.get_next_check())
+        self.assertEqual([1, 2, 3], sorted(self.scheduler.pop_due(self.now)))
+        self.assertIsNone(self.scheduler.get_next_check())
+
+    def test_reschedule(self):
+        self.scheduler.reschedule(self.min_interval, self.now)
+        self.scheduler.load()
+
+        self.assertEqual(self.now + self.min_interval, self.scheduler.get_next_check())
+        self.assertEqual([], self.scheduler.pop_due(self.now))
+        self.assertEqual([1], self.scheduler.pop_due(self.now + self.min_interval))
+        self.assertEqual([2], self.scheduler.pop_due(self.now + timedelta(hours=2, minutes=24)))
+        self.assertEqual([3], self.scheduler.pop_due(self.now + self.scheduler.max_interval))
+
+    def test_reschedule_targeted(self):
+        self.scheduler.reschedule(self.min_interval, self.now, ids=[1], trackers=['unionpeer.org'])
+        self.scheduler.load()
+
+        self.assertEqual([2], self.scheduler.pop_due(self.now))
+        self.assertEqual([1], self.scheduler.pop_due(self.now + self.min_interval))
+        self.assertEqual([3], self.scheduler.pop_due(self.now + self.scheduler.max_interval))
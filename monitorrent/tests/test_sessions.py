@@ -0,0 +1,32 @@
+from unittest import TestCase
+from monitorrent.utils.sessions import SessionRegistry
+
+
+class SessionRegistryTest(TestCase):
+    def setUp(self):
+        self.sessions = SessionRegistry(pool_size=4, timeout=10)
+
+    def tearDown(self):
+        self.sessions.close()
+
+    def test_get_same_session(self):
+        session = self.sessions.get('rutor.org')
+
+        self.assertIs(session, self.sessions.get('rutor.org'))
+        self.assertIsNot(session, self.sessions.get('unionpeer.org'))
+
+    def test_policy(self):
+        session = self.sessions.get('rutracker.org')
+        adapter = session.get_adapter('http://rutracker.org/forum/viewtopic.php?t=1')
+
+        self.assertEqual(10, session.timeout)
+        self.assertEqual(4, adapter._pool_maxsize)
+
+    def test_close(self):
+        session = self.sessions.get('rutor.org')
+        unionpeer_session = self.sessions.get('unionpeer.org')
+
+        self.sessions.close(['rutor.org'])
+
+        self.assertIsNot(session, self.sessions.get('rutor.org'))
+        self.assertIs(unionpeer_session, self.sessions.get('unionpeer.org'))
@@ -0,0 +1,68 @@
+from mock import Mock, patch
+from unittest import TestCase
+from monitorrent.db import DBSession
+from monitorrent.settings_manager import SettingsManager, Settings
+from monitorrent.tests import DbTestCase
+from monitorrent.utils.settings_cache import SettingsCache
+
+
+class SettingsCacheTest(TestCase):
+    def test_get(self):
+        cache = SettingsCache()
+        load = Mock(return_value=10)
+
+        self.assertEqual(10, cache.get('interval', load))
+        self.assertEqual(10, cache.get('interval', load))
+
+        load.assert_called_once_with()
+
+    def test_set(self):
+        cache = SettingsCache()
+        save = Mock()
+        load = Mock(return_value=10)
+
+        cache.set('interval', 20, save)
+
+        save.assert_called_once_with(20)
+        self.assertEqual(20, cache.get('interval', load))
+        self.assertFalse(load.called)
+
+    def test_set_failed(self):
+        cache = SettingsCache()
+        cache.get('interval', lambda: 10)
+
+        with self.assertRaises(Exception):
+            cache.set('interval', 20, Mock(side_effect=Exception('Database error')))
+
+        self.assertEqual(10, cache.get('interval', lambda: 30))
+
+
+class SettingsManagerTest(DbTestCase):
+    def test_password(self):
+        settings_manager = SettingsManager()
+
+        self.assertEqual('monitorrent', settings_manager.get_password())
+        settings_manager.set_password('password')
+
+        self.assertEqual('password', settings_manager.get_password())
+        self.assertEqual('password', SettingsManager().get_password())
+
+    def test_is_authentication_enabled(self):
+        settings_manager = SettingsManager()
+
+        self.assertTrue(settings_manager.get_is_authentication_enabled())
+        settings_manager.set_is_authentication_enabled(False)
+
+        self.assertFalse(settings_manager.get_is_authentication_enabled())
+        self.assertFalse(SettingsManager().get_is_authentication_enabled())
+
+    def test_get_password_cached(self):
+        settings_manager = SettingsManager()
+        settings_manager.get_password()
+
+        with patch('monitorrent.settings_manager.DBSession') as db_session:
+            self.assertEqual('monitorrent', settings_manager.get_password())
+
+        self.assertFalse(db_session.called)
+        with DBSession() as db:
+            self.assertEqual(1, db.query(Settings).count())
@@ -0,0 +1,44 @@
+from monitorrent.plugins.trackers.tapochek import upgrade, TapochekNetTopic
+from sqlalchemy import Column, Integer, String, MetaData, Table, ForeignKey
+from monitorrent.tests import UpgradeTestCase
+from monitorrent.plugins.trackers import Topic, get_download_url_version
+
+
+class TapochekTrackerUpgradeTest(UpgradeTestCase):
+    m0 = MetaData()
+    TopicsLast0 = UpgradeTestCase.copy(Topic.__table__, m0)
+    TapochekNetTopic0 = Table('tapochek_topics', m0,
+                              Column("id", Integer, ForeignKey('topics.id'), primary_key=True),
+                              Column("hash", String, nullable=True))
+
+    m1 = MetaData()
+    TopicsLast1 = UpgradeTestCase.copy(Topic.__table__, m1)
+    TapochekNetTopic1 = Table('tapochek_topics', m1,
+                              Column("id", Integer, ForeignKey('topics.id'), primary_key=True),
+                              Column("hash", String, nullable=True),
+                              Column("download_url", String, nullable=True))
+    versions = [
+        (TapochekNetTopic0, TopicsLast0),
+        (TapochekNetTopic1, TopicsLast1),
+    ]
+
+    def _upgrade(self):
+        return upgrade(self.engine, self.operation_factory)
+
+    def _get_current_version(self):
+        return get_download_url_version(self.engine, TapochekNetTopic)
+
+    def test_empty_db_test(self):
+        self._test_empty_db_test()
+
+    def test_updage_empty_from_version_0(self):
+        self._upgrade_from(None, 0)
+
+    def test_updage_filled_from_version_0(self):
+        topic1 = {'id': 1, 'display_name': '1', 'url': 'http://1', 'last_update': None}
+        topic2 = {'id': 2, 'display_name': '2', 'url': 'http://2', 'last_update': None}
+
+        tracker_topic1 = {'id': 1, 'hash': 'a1b'}
+        tracker_topic2 = {'id': 2, 'hash': None}
+
+        self._upgrade_from([[tracker_topic1, tracker_topic2], [topic1, topic2]], 0)
@@ -0,0 +1,222 @@
+from datetime import datetime
+from ddt import ddt, data
+from mock import patch, Mock, ANY
+from monitorrent.db import DBSession
+from monitorrent.engine import Logger
+from monitorrent.plugins.trackers import LoginResult
+from monitorrent.plugins.trackers.rutor import RutorOrgPlugin, RutorOrgTopic
+from monitorrent.plugins.trackers.rutracker import RutrackerPlugin, RutrackerTopic
+from monitorrent.plugins.trackers.tapochek import TapochekNetPlugin, TapochekNetTopic
+from monitorrent.tests import DbTestCase
+from monitorrent.utils.bittorrent import bencode, Torrent
+
+
+def create_torrent(name):
+    return bencode({'announce': 'http://tracker/announce',
+                    'info': {'name': name, 'length': 1, 'piece length': 1, 'pieces': '01234567890123456789'}})
+
+
+@ddt
+class TrackerPluginBaseExecuteTest(DbTestCase):
+    def setUp(self):
+        super(TrackerPluginBaseExecuteTest, self).setUp()
+        self.torrents = {'http://rutor.org/torrent/%d' % i: create_torrent('torrent %d' % i) for i in range(1, 5)}
+        with DBSession() as db:
+            for i, url in enumerate(sorted(self.torrents.keys())):
+                # first topic is already up to date
+                hash = Torrent(self.torrents[url]).info_hash if i == 0 else None
+                db.add(RutorOrgTopic(url=url, display_name='topic %d' % i, hash=hash))
+
+    def _download(self, url, etag, last_modified, session=None):
+        if url.endswith('/4'):
+            raise Exception('Not found')
+        if etag == url:
+            return None, None, {'etag': etag, 'last_modified': None, 'content_length': None}
+        return self.torrents[url], None, {'etag': url, 'last_modified': None, 'content_length': 10}
+
+    @data(1, 3)
+    def test_execute(self, fetch_workers):
+        plugin = RutorOrgPlugin()
+        plugin.fetch_workers = fetch_workers
+        plugin._prepare_request = lambda topic: topic.url
+        engine = Mock()
+        engine.log = Mock(Logger)
+        last_update = datetime(2015, 11, 1)
+        engine.add_torrents = Mock(side_effect=lambda torrents: [last_update] * len(torrents))
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=self._download):
+            plugin.execute(None, engine)
+
+        self.assertEqual(2, sum(len(args[0]) for args, _ in engine.add_torrents.call_args_list))
+        self.assertEqual(1, engine.log.failed.call_count)
+
+        with DBSession() as db:
+            topics = {t.url: (t.hash, t.last_update) for t in db.query(RutorOrgTopic).all()}
+        for url, content in self.torrents.items():
+            if url.endswith('/1'):
+                self.assertIsNone(topics[url][1])
+            elif url.endswith('/4'):
+                self.assertEqual((None, None), topics[url])
+            else:
+                self.assertEqual((Torrent(content).info_hash, last_update), topics[url])
+
+    def test_execute_batch(self):
+        plugin = RutorOrgPlugin()
+        plugin.fetch_workers = 1
+        plugin._prepare_request = lambda topic: topic.url
+        engine = Mock()
+        engine.log = Mock(Logger)
+        engine.add_torrents = Mock(side_effect=lambda torrents: [datetime(2015, 11, 1)] * len(torrents))
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=self._download):
+            plugin.execute(None, engine)
+
+        # changed torrents are added by one batch
+        engine.add_torrents.assert_called_once_with([(ANY, ANY, None, 2), (ANY, ANY, None, 3)])
+
+    def test_execute_not_modified(self):
+        plugin = RutorOrgPlugin()
+        plugin._prepare_request = lambda topic: topic.url
+        engine = Mock()
+        engine.log = Mock(Logger)
+        engine.add_torrents = Mock(side_effect=lambda torrents: [datetime(2015, 11, 1)] * len(torrents))
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=self._download) as download:
+            plugin.execute(None, engine)
+            self.assertEqual(3, engine.log.downloaded.call_count)
+
+            # all validators were stored, so torrents aren't downloaded again
+            plugin.execute(None, engine)
+            self.assertEqual(3, engine.log.downloaded.call_count)
+            self.assertEqual(2, sum(len(args[0]) for args, _ in engine.add_torrents.call_args_list))
+            self.assertEqual(8, download.call_count)
+
+        with DBSession() as db:
+            topics = {t.url: (t.http_etag, t.http_content_length) for t in db.query(RutorOrgTopic).all()}
+        self.assertEqual(('http://rutor.org/torrent/1', 10), topics['http://rutor.org/torrent/1'])
+
+
+@ddt
+class TrackerPluginWithCredentialsBaseTest(DbTestCase):
+    def setUp(self):
+        super(TrackerPluginWithCredentialsBaseTest, self).setUp()
+        self.plugin = RutrackerPlugin()
+        self.plugin.verify = Mock(return_value=True)
+        self.plugin.login = Mock(return_value=LoginResult.Ok)
+        self.engine = Mock()
+        self.engine.log = Mock(Logger)
+
+    def test_execute_login_cached(self):
+        self.assertTrue(self.plugin._execute_login(self.engine))
+        self.assertTrue(self.plugin._execute_login(self.engine))
+
+        self.assertEqual(1, self.plugin.verify.call_count)
+
+        self.plugin.update_credentials({'username': 'username', 'password': 'password'})
+        self.assertTrue(self.plugin._execute_login(self.engine))
+
+        self.assertEqual(2, self.plugin.verify.call_count)
+
+    def test_execute_login_expired(self):
+        self.plugin.verify_ttl = 0
+
+        self.assertTrue(self.plugin._execute_login(self.engine))
+        self.assertTrue(self.plugin._execute_login(self.engine))
+
+        self.assertEqual(2, self.plugin.verify.call_count)
+
+    def test_execute_login_failed(self):
+        self.plugin.verify.return_value = False
+        self.plugin.login.return_value = LoginResult.IncorrentLoginPassword
+
+        self.assertFalse(self.plugin._execute_login(self.engine))
+        self.assertFalse(self.plugin._execute_login(self.engine))
+
+        self.assertEqual(2, self.plugin.login.call_count)
+
+    def test_download_login_page(self):
+        topic = RutrackerTopic(url='http://rutracker.org/forum/viewtopic.php?t=1', display_name='topic')
+        self.plugin._prepare_request = lambda t: t.url
+        self.plugin._execute_login(self.engine)
+        torrent = create_torrent('torrent')
+        login_page = '<html><form><input type="password" name="login_password"></form></html>'
+        responses = [(login_page, None, {}), (torrent, None, {})]
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=lambda *a, **kw: responses.pop(0)):
+            torrent_content, _, _ = self.plugin._download_topic(topic)
+
+        self.assertEqual(torrent, torrent_content)
+        self.plugin.login.assert_called_once_with()
+
+    @data(True, False)
+    def test_download_not_torrent(self, verified):
+        topic = RutrackerTopic(url='http://rutracker.org/forum/viewtopic.php?t=1', display_name='topic')
+        self.plugin._prepare_request = lambda t: t.url
+        self.plugin._execute_login(self.engine)
+        self.plugin.verify.return_value = verified
+        torrent = create_torrent('torrent')
+        responses = [('<html>Not found</html>', None, {}), (torrent, None, {})]
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=lambda *a, **kw: responses.pop(0)):
+            torrent_content, _, _ = self.plugin._download_topic(topic)
+
+        # login again only if credentials are not valid anymore
+        self.assertEqual(torrent if not verified else '<html>Not found</html>', torrent_content)
+        self.assertEqual(0 if verified else 1, self.plugin.login.call_count)
+
+    def test_login_lock_per_instance(self):
+        self.assertIsNot(self.plugin._login_lock, RutrackerPlugin()._login_lock)
+
+
+class TapochekDownloadUrlTest(DbTestCase):
+    def setUp(self):
+        super(TapochekDownloadUrlTest, self).setUp()
+        self.plugin = TapochekNetPlugin()
+        self.plugin.verify = Mock(return_value=True)
+        self.plugin.login = Mock(return_value=LoginResult.Ok)
+        self.plugin.fetch_workers = 1
+        self.plugin.tracker = Mock()
+        self.plugin.tracker.get_download_url = Mock(return_value='http://tapochek.net/download.php?id=2')
+        self.plugin._prepare_request = lambda topic: topic.download_url
+        self.torrent = create_torrent('torrent')
+        self.engine = Mock()
+        self.engine.log = Mock(Logger)
+        self.engine.add_torrents = Mock(side_effect=lambda torrents: [datetime(2015, 11, 1)] * len(torrents))
+        with DBSession() as db:
+            db.add(TapochekNetTopic(url='http://tapochek.net/viewtopic.php?t=1', display_name='topic'))
+
+    def _download(self, url, etag, last_modified, session=None):
+        if url != 'http://tapochek.net/download.php?id=2':
+            return '<html>Not found</html>', None, {}
+        if etag:
+            return None, None, {'etag': etag, 'last_modified': None, 'content_length': None}
+        return self.torrent, None, {'etag': '1', 'last_modified': None, 'content_length': None}
+
+    def test_execute(self):
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=self._download):
+            self.plugin.execute(None, self.engine)
+            self.plugin.execute(None, self.engine)
+
+        # download url is resolved only once
+        self.assertEqual(1, self.plugin.tracker.get_download_url.call_count)
+        with DBSession() as db:
+            topic = db.query(TapochekNetTopic).first()
+            self.assertEqual('http://tapochek.net/download.php?id=2', topic.download_url)
+
+    def test_execute_resolve_changed_url(self):
+        with DBSession() as db:
+            topic = db.query(TapochekNetTopic).first()
+            topic.download_url = 'http://tapochek.net/download.php?id=1'
+            topic.http_etag = 'old'
+
+        with patch('monitorrent.plugins.trackers.download_if_modified', side_effect=self._download):
+            self.plugin.execute(None, self.engine)
+
+        self.assertEqual(1, self.plugin.tracker.get_download_url.call_count)
+        # etag of old url isn't sent for new one, so torrent is downloaded
+        self.assertEqual(1, self.engine.add_torrents.call_count)
+        # failed probe of old url doesn't login again
+        self.assertFalse(self.plugin.login.called)
+        with DBSession() as db:
+            topic = db.query(TapochekNetTopic).first()
+            self.assertEqual('http://tapochek.net/download.php?id=2', topic.download_url)
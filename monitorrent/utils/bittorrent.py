@@ -86,58 +86,156 @@ def is_torrent_file(metafilepath):
     return bool(magic_marker)
 
 
-def tokenize(text, match=re.compile("([idel])|(\d+):|(-?\d+)").match):
-    i = 0
-    while i < len(text):
-        m = match(text, i)
-        s = m.group(m.lastindex)
-        i = m.end()
-        if m.lastindex == 2:
-            yield b"s"
-            yield text[i:i + int(s)]
-            i += int(s)
+# marks dictionary waiting for key on decoding stack
+_NO_KEY = object()
+
+
+def decode(text, spans=None, start=0, end=None):
+    """
+    Index based non-recursive decoder
+
+    :param text: bencoded data
+    :type text: str | memoryview | bytearray
+    :param spans: if dict is passed, byte spans (start, end) of top level dictionary values are stored in it
+    :type spans: dict | None
+    :param start: offset of bencoded data in text
+    :param end: offset right after bencoded data in text
+    """
+    if not isinstance(text, basestring):
+        text = bytes(text) if isinstance(text, bytearray) else text.tobytes()
+    length = len(text) if end is None else end
+    index = text.index
+    pos = start
+    # open containers and keys waiting for values (None for lists)
+    containers = []
+    keys = []
+    value_start = None
+    while pos < length:
+        c = text[pos]
+        if c == b"i":
+            value_end = index(b"e", pos + 1, length)
+            value = int(text[pos + 1:value_end])
+            pos = value_end + 1
+        elif b"0" <= c <= b"9":
+            colon = index(b":", pos, length)
+            string_start = colon + 1
+            pos = string_start + int(text[pos:colon])
+            if pos > length:
+                raise ValueError("string is out of data")
+            value = text[string_start:pos]
+            # Strings in torrent file are defined as utf-8 encoded
+            try:
+                value = value.decode('utf-8')
+            except UnicodeDecodeError:
+                # The pieces field is a byte string, and should be left as such.
+                pass
+        elif c == b"l":
+            containers.append([])
+            keys.append(None)
+            pos += 1
+            continue
+        elif c == b"d":
+            containers.append(dict())
+            keys.append(_NO_KEY)
+            pos += 1
+            continue
+        elif c == b"e" and containers:
+            if keys.pop() not in (None, _NO_KEY):
+                raise ValueError("dictionary key without value")
+            value = containers.pop()
+            pos += 1
+        else:
+            raise ValueError("unexpected %r at %d" % (c, pos))
+
+        if not containers:
+            if pos != length:
+                raise SyntaxError("trailing junk")
+            return value
+        container = containers[-1]
+        key = keys[-1]
+        if key is None:
+            container.append(value)
+        elif key is _NO_KEY:
+            if not isinstance(value, basestring):
+                raise ValueError("dictionary key must be string")
+            keys[-1] = value
+            if len(containers) == 1:
+                value_start = pos
+        else:
+            container[key] = value
+            keys[-1] = _NO_KEY
+            if spans is not None and len(containers) == 1:
+                spans[key] = (value_start, pos)
+    raise ValueError("unexpected end of data")
+
+
+def _skip_item(text, pos):
+    """
+    :return: offset right after bencoded item started at pos
+    """
+    index = text.index
+    depth = 0
+    while True:
+        c = text[pos]
+        if c == b"i":
+            pos = index(b"e", pos + 1) + 1
+        elif b"0" <= c <= b"9":
+            colon = index(b":", pos)
+            pos = colon + 1 + int(text[pos:colon])
+        elif c == b"l" or c == b"d":
+            depth += 1
+            pos += 1
+            continue
+        elif c == b"e" and depth > 0:
+            depth -= 1
+            pos += 1
         else:
-            yield s
-
-
-def decode_item(next, token):
-    if token == b"i":
-        # integer: "i" value "e"
-        data = int(next())
-        if next() != b"e":
-            raise ValueError
-    elif token == b"s":
-        # string: "s" value (virtual tokens)
-        data = next()
-        # Strings in torrent file are defined as utf-8 encoded
-        try:
-            data = data.decode('utf-8')
-        except UnicodeDecodeError as e:
-            # The pieces field is a byte string, and should be left as such.
-            pass
-    elif token == b"l" or token == b"d":
-        # container: "l" (or "d") values "e"
-        data = []
-        tok = next()
-        while tok != b"e":
-            data.append(decode_item(next, tok))
-            tok = next()
-        if token == b"d":
-            data = dict(zip(data[0::2], data[1::2]))
-    else:
-        raise ValueError
-    return data
-
-
-def bdecode(text):
+            raise ValueError("unexpected %r at %d" % (c, pos))
+        if depth == 0:
+            return pos
+
+
+def locate(text, start=0, end=None):
+    """
+    Finds byte spans (start, end) of top level dictionary values without decoding them
+
+    :type text: str
+    :param start: offset of bencoded data in text
+    :param end: offset right after bencoded data in text
+    :rtype: dict
+    """
+    try:
+        if text[start:start + 1] != b"d":
+            raise ValueError("dictionary expected")
+        length = len(text) if end is None else end
+        spans = dict()
+        pos = start + 1
+        while text[pos] != b"e":
+            colon = text.index(b":", pos, length)
+            value_start = colon + 1 + int(text[pos:colon])
+            key = text[colon + 1:value_start]
+            pos = _skip_item(text, value_start)
+            if pos > length:
+                raise ValueError("unexpected end of data")
+            spans[key] = (value_start, pos)
+        if pos + 1 != length:
+            raise ValueError("trailing junk")
+    except (ValueError, IndexError) as e:
+        raise SyntaxError("syntax error: %s" % e)
+    return spans
+
+
+def bdecode(text, spans=None, start=0, end=None):
+    """
+    :param spans: if dict is passed, byte spans (start, end) of top level dictionary values are stored in it
+    :type spans: dict | None
+    :param start: offset of bencoded data in text
+    :param end: offset right after bencoded data in text
+    """
     try:
-        src = tokenize(text)
-        data = decode_item(src.next, src.next()) # pylint:disable=E1101
-        for token in src: # look for more tokens
-            raise SyntaxError("trailing junk")
-    except (AttributeError, ValueError, StopIteration) as e:
+        return decode(text, spans, start, end)
+    except (ValueError, TypeError) as e:
         raise SyntaxError("syntax error: %s" % e)
-    return data
 
 
 # encoding implementation by d0b
@@ -195,15 +293,54 @@ class Torrent(object):
         with open(filename, 'rb') as handle:
             return cls(handle.read())
 
-    def __init__(self, content):
-        """Accepts torrent file as string"""
+    def __init__(self, content, lazy=False):
+        """
+        Accepts torrent file as string
+
+        :param lazy: only locate info dict for info_hash, torrent is decoded on first access to its content
+        :type lazy: bool
+        """
         # Make sure there is no trailing whitespace. see #1592
-        content = content.strip()
-        self.raw_content = content
-        # decoded torrent structure
-        self.content = bdecode(content)
+        # whitespace is skipped by offsets, so content isn't copied
+        start, end = 0, len(content)
+        while start < end and content[start].isspace():
+            start += 1
+        while end > start and content[end - 1].isspace():
+            end -= 1
+        self._data = content
+        self._data_span = (start, end)
+        self._raw_content = content if end - start == len(content) else None
+        if lazy:
+            self._content = None
+            spans = locate(content, start, end)
+        else:
+            spans = dict()
+            self._content = bdecode(content, spans, start, end)
+        # info dict is hashed as is, so keep where it is in content
+        self._info_span = spans.get('info')
+        self._info_hash = None
         self.modified = False
 
+    @property
+    def raw_content(self):
+        """torrent file content without surrounding whitespace"""
+        if self._raw_content is None:
+            start, end = self._data_span
+            self._raw_content = self._data[start:end]
+        return self._raw_content
+
+    @property
+    def content(self):
+        """decoded torrent structure"""
+        if self._content is None:
+            start, end = self._data_span
+            self._content = bdecode(self._data, None, start, end)
+        return self._content
+
+    @content.setter
+    def content(self, value):
+        self._content = value
+
     def __repr__(self):
         return "%s(%s, %s)" % (self.__class__.__name__,
             ", ".join("%s=%r" % (key, self.content["info"].get(key))
@@ -280,11 +417,15 @@ class Torrent(object):
     @property
     def info_hash(self):
         """Return Torrent info hash"""
-        import hashlib
-        hash = hashlib.sha1()
-        info_data = encode_dictionary(self.content['info'])
-        hash.update(info_data)
-        return hash.hexdigest().upper()
+        if self._info_hash is None:
+            import hashlib
+            if self._info_span is not None:
+                start, end = self._info_span
+                info_data = memoryview(self._data)[start:end]
+            else:
+                info_data = encode_dictionary(self.content['info'])
+            self._info_hash = hashlib.sha1(info_data).hexdigest().upper()
+        return self._info_hash
 
     @property
     def comment(self):
@@ -2,16 +2,69 @@ import cgi
 import requests
 
 
-def download(request, **kwargs):
+def download(request, session=None, **kwargs):
+    """
+    :param session: session used for download, new one is used if not specified
+    :type session: requests.Session | None
+    """
+    response = _send(request, session, **kwargs)
+    return response.content, _get_filename(response)
+
+
+def download_if_modified(request, etag=None, last_modified=None, session=None, **kwargs):
+    """
+    Downloads content only if it was modified since previous download
+
+    :param etag: ETag header of previous download
+    :type etag: str | None
+    :param last_modified: Last-Modified header of previous download
+    :type last_modified: str | None
+    :param session: session used for download, new one is used if not specified
+    :type session: requests.Session | None
+    :return: content (None if content wasn't modified), filename and validators of downloaded content:
+             dict with 'etag', 'last_modified' and 'content_length' keys
+    :rtype: (str | None, str | None, dict)
+    """
+    headers = dict()
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
     if isinstance(request, requests.PreparedRequest):
-        response = requests.session().send(request, **kwargs)
-    else:
-        response = requests.get(request, **kwargs)
-    filename = None
+        request.headers.update(headers)
+    elif headers:
+        headers.update(kwargs.pop('headers', None) or {})
+        kwargs['headers'] = headers
+
+    response = _send(request, session, **kwargs)
+    if response.status_code == 304:
+        return None, None, {'etag': etag, 'last_modified': last_modified, 'content_length': None}
+
+    content_length = response.headers.get('content-length', None)
+    validators = {
+        'etag': response.headers.get('etag', None),
+        'last_modified': response.headers.get('last-modified', None),
+        'content_length': int(content_length) if content_length and content_length.isdigit() else None
+    }
+    return response.content, _get_filename(response), validators
+
+
+def _send(request, session=None, **kwargs):
+    if isinstance(request, requests.PreparedRequest):
+        if session is None:
+            session = requests.session()
+        if getattr(session, 'timeout', None) is not None:
+            kwargs.setdefault('timeout', session.timeout)
+        return session.send(request, **kwargs)
+    if session is not None:
+        return session.get(request, **kwargs)
+    return requests.get(request, **kwargs)
+
+
+def _get_filename(response):
     if 'content-disposition' in response.headers:
         content_disposition = response.headers['content-disposition']
         t, params = cgi.parse_header(content_disposition)
         if t == 'attachment' and 'filename' in params:
-            filename = params['filename']
-
-    return response.content, filename
+            return params['filename']
+    return None
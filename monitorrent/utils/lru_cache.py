@@ -0,0 +1,45 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Bounded cache which forgets least recently used values and values older than ttl
+    """
+    def __init__(self, max_size=256, ttl=60, timer=time.time):
+        """
+        :param max_size: max count of cached values
+        :type max_size: int
+        :param ttl: seconds value is kept in cache
+        :type ttl: float
+        :param timer: returns current time in seconds
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self._timer = timer
+        # key -> (value, expiration time) ordered from least to most recently used
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._values.pop(key, None)
+            if item is None or item[1] <= self._timer():
+                return default
+            self._values[key] = item
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = (value, self._timer() + self.ttl)
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def __len__(self):
+        return len(self._values)
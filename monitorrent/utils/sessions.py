@@ -0,0 +1,81 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.util.retry import Retry
+
+
+class TrackerSession(requests.Session):
+    """:class:`requests.Session` with default timeout for every request"""
+    def __init__(self, timeout=None):
+        super(TrackerSession, self).__init__()
+        self.timeout = timeout
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault('timeout', self.timeout)
+        return super(TrackerSession, self).request(method, url, **kwargs)
+
+
+class SessionRegistry(object):
+    """
+    Keeps one keep-alive session with own connection pool and cookie jar per tracker
+    """
+    def __init__(self, pool_size=10, max_retries=2, backoff_factor=0.5, timeout=30):
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.timeout = timeout
+        self._sessions = dict()
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        """
+        :param name: tracker name
+        :rtype: TrackerSession
+        """
+        with self._lock:
+            session = self._sessions.get(name)
+            if session is None:
+                session = self._create_session()
+                self._sessions[name] = session
+            return session
+
+    def names(self):
+        """
+        :return: names of trackers with opened sessions
+        :rtype: list[str]
+        """
+        with self._lock:
+            return self._sessions.keys()
+
+    def close(self, names=None):
+        """
+        Closes sessions of trackers or all sessions if names aren't specified
+
+        :type names: list[str] | None
+        """
+        with self._lock:
+            if names is None:
+                names = self._sessions.keys()
+            for name in names:
+                session = self._sessions.pop(name, None)
+                if session is not None:
+                    session.close()
+
+    def _create_session(self):
+        session = TrackerSession(self.timeout)
+        retries = Retry(total=self.max_retries, backoff_factor=self.backoff_factor)
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=retries)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+
+sessions = SessionRegistry()
+
+
+def get_session(name):
+    """
+    :param name: tracker name
+    :rtype: TrackerSession
+    """
+    return sessions.get(name)
@@ -0,0 +1,33 @@
+import threading
+
+
+class SettingsCache(object):
+    """
+    In-process write-through cache of settings stored in database.
+
+    Setting is loaded from database on first access only,
+    new value is saved to database and then replaces cached one.
+    """
+    def __init__(self):
+        self._values = dict()
+        self._lock = threading.RLock()
+
+    def get(self, name, load):
+        """
+        :param name: setting name
+        :param load: reads setting value from database
+        """
+        with self._lock:
+            if name not in self._values:
+                self._values[name] = load()
+            return self._values[name]
+
+    def set(self, name, value, save):
+        """
+        :param name: setting name
+        :param value: new setting value
+        :param save: writes setting value to database, cache isn't changed if it raises
+        """
+        with self._lock:
+            save(value)
+            self._values[name] = value
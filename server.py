@@ -3,11 +3,11 @@ import random
 import string
 from cherrypy import wsgiserver
 from monitorrent.engine import DBEngineRunner
-from monitorrent.db import init_db_engine, create_db, upgrade
+from monitorrent.db import init_db_engine, create_db, upgrade, performance_profile
 from monitorrent.plugin_managers import load_plugins, get_all_plugins, upgrades, TrackersManager, ClientsManager
 from monitorrent.settings_manager import SettingsManager
 from monitorrent.rest import create_api, AuthMiddleware
-from monitorrent.rest.static_file import StaticFiles
+from monitorrent.rest.static_file import StaticFiles, StaticFilesIndex, StaticFilesSink
 from monitorrent.rest.login import Login, Logout
 from monitorrent.rest.topics import TopicCollection, TopicParse, Topic
 from monitorrent.rest.trackers import TrackerCollection, Tracker, TrackerCheck
@@ -15,22 +15,28 @@ from monitorrent.rest.clients import ClientCollection, Client, ClientCheck
 from monitorrent.rest.settings_authentication import SettingsAuthentication
 from monitorrent.rest.settings_password import SettingsPassword
 from monitorrent.rest.settings_execute import SettingsExecute
-from monitorrent.rest.execute import ExecuteLog, ExecuteCall, EngineRunnerLogger
+from monitorrent.rest.execute import ExecuteLog, ExecuteRuns, ExecuteEvents, ExecuteCall, EngineRunnerLogger
+from monitorrent.execute_history import ExecuteHistory
 
 debug = True
+# how many trackers are checked at the same time
+trackers_max_workers = 4
+# seconds while login to tracker is trusted without verify,
+# longer than execute interval so login is verified only once per several executions
+trackers_verify_ttl = 24 * 60 * 60
+# sqlite settings, None uses sqlite defaults,
+# set performance_profile to use WAL, pragmas and BEGIN IMMEDIATE for writers
+db_profile = None
 
 
 def add_static_route(api, files_dir):
     file_dir = os.path.dirname(os.path.realpath(__file__))
     static_dir = os.path.join(file_dir, files_dir)
-    api.add_route('/', StaticFiles(static_dir, 'index.html'))
-    api.add_route('/favicon.ico', StaticFiles(static_dir, 'favicon.ico', False))
-    api.add_route('/styles/monitorrent.css', StaticFiles(os.path.join(static_dir, 'styles'), 'monitorrent.css', False))
-    api.add_route('/login', StaticFiles(static_dir, 'login.html', False))
-    for d, dirnames, files in os.walk(static_dir):
-        parts = d[len(file_dir)+1:].split(os.path.sep)
-        url = '/' + '/'.join(parts[1:] + ['{filename}'])
-        api.add_route(url, StaticFiles(d))
+    index = StaticFilesIndex(static_dir)
+    index.load_or_build()
+    api.add_route('/', StaticFiles(static_dir, 'index.html', index=index))
+    api.add_route('/login', StaticFiles(static_dir, 'login.html', False, index=index))
+    api.add_sink(StaticFilesSink(index), '/')
 
 
 def create_app(secret_key, token, tracker_manager, clients_manager, settings_manager,
@@ -52,22 +58,24 @@ def create_app(secret_key, token, tracker_manager, clients_manager, settings_man
     app.add_route('/api/settings/authentication', SettingsAuthentication(settings_manager))
     app.add_route('/api/settings/password', SettingsPassword(settings_manager))
     app.add_route('/api/settings/execute', SettingsExecute(engine_runner))
-    app.add_route('/api/execute/logs', ExecuteLog(engine_runner_logger))
+    app.add_route('/api/execute/logs', ExecuteLog(engine_runner_logger, history=engine_runner_logger.history))
+    app.add_route('/api/execute/runs', ExecuteRuns(engine_runner_logger.history))
+    app.add_route('/api/execute/events', ExecuteEvents(engine_runner_logger))
     app.add_route('/api/execute/call', ExecuteCall(engine_runner))
     return app
 
 
 def main():
-    init_db_engine("sqlite:///monitorrent.db", False)
+    init_db_engine("sqlite:///monitorrent.db", False, db_profile)
     load_plugins()
     upgrade(get_all_plugins(), upgrades)
     create_db()
 
-    tracker_manager = TrackersManager()
+    tracker_manager = TrackersManager(max_workers=trackers_max_workers, verify_ttl=trackers_verify_ttl)
     clients_manager = ClientsManager()
     settings_manager = SettingsManager()
 
-    engine_runner_logger = EngineRunnerLogger()
+    engine_runner_logger = EngineRunnerLogger(history=ExecuteHistory())
     engine_runner = DBEngineRunner(engine_runner_logger, tracker_manager, clients_manager)
 
     if debug:
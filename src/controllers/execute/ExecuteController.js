@@ -13,27 +13,28 @@ app.controller('ExecuteController', function ($scope, $mdToast, ExecuteService)
         $scope.messages.push(message);
     };
 
-    var destroyed = false;
+    // stream was too slow and skipped oldest messages of execution, they are kept in execute history only
+    var dropped = function (message) {
+        $scope.messages.push({level: 'info', message: message.count + ' messages were skipped, see execute history'});
+    };
+
+    var events = null;
 
+    // browser reconnects by itself and resumes stream from last received event
     var executeListener = function () {
-        oboe('/api/execute/logs')
-            .node('!.*', function(evt){
-                $scope.$apply(function() {
-                    if (evt.event == 'started') {
-                        started();
-                    } else if (evt.event == 'log') {
-                        log(evt.data);
-                    } else if (evt.event == 'finished') {
-                        finished(evt.data);
-                    }
+        events = new EventSource('/api/execute/events');
+        var listen = function (name, handler) {
+            events.addEventListener(name, function (evt) {
+                var data = JSON.parse(evt.data);
+                $scope.$apply(function () {
+                    handler(data);
                 });
-                return oboe.drop;
-            })
-            .done(function() {
-                if (!destroyed) {
-                    executeListener();
-                }
             });
+        };
+        listen('started', started);
+        listen('log', log);
+        listen('finished', finished);
+        listen('dropped', dropped);
     };
 
     $scope.execute = function () {
@@ -57,6 +58,8 @@ app.controller('ExecuteController', function ($scope, $mdToast, ExecuteService)
     });
 
     $scope.$on('$destroy', function() {
-        destroyed = true;
+        if (events) {
+            events.close();
+        }
     });
 });
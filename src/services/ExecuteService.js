@@ -8,8 +8,11 @@ app.factory('ExecuteService', function ($http) {
         save: function (interval) {
             return $http.put(api_execute_path, {'interval': interval});
         },
-        execute: function () {
-            return $http.post('/api/execute/call');
+        execute: function (ids, trackers) {
+            if (!ids && !trackers) {
+                return $http.post('/api/execute/call');
+            }
+            return $http.post('/api/execute/call', {'ids': ids, 'trackers': trackers});
         }
     };
 